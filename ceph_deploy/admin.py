@@ -1,8 +1,10 @@
+import functools
 import logging
 from ceph_deploy import exc
 from ceph_deploy import conf
 from ceph_deploy.cliutil import priority
 from ceph_deploy import hosts
+from ceph_deploy.util import files, parallel
 
 LOG = logging.getLogger(__name__)
 
@@ -17,29 +19,38 @@ def admin(args):
         raise RuntimeError('%s.client.admin.keyring not found' %
                            args.cluster)
 
-    errors = 0
-    for hostname in args.client:
-        LOG.debug('Pushing admin keys and conf to %s', hostname)
-        try:
-            distro = hosts.get(hostname, username=args.username)
+    changed = []
 
-            distro.conn.remote_module.write_conf(
-                args.cluster,
-                conf_data,
-                args.overwrite_conf,
-            )
+    def push_admin(hostname):
+        LOG.debug('Pushing admin keys and conf to %s', hostname)
+        distro = hosts.get(hostname, username=args.username)
 
-            distro.conn.remote_module.write_file(
+        if files.push(distro.conn, [
+            files.conf_file(args.cluster, conf_data, args.overwrite_conf),
+            files.plain_file(
                 '/etc/ceph/%s.client.admin.keyring' % args.cluster,
                 keyring,
                 0o600,
-            )
+            ),
+        ]):
+            changed.append(hostname)
+        else:
+            LOG.debug('admin keys and conf on %s are up to date', hostname)
+
+        distro.conn.exit()
 
-            distro.conn.exit()
+    coroutine = None
+    if args.asyncio:
+        from ceph_deploy.aio import commands
+        coroutine = functools.partial(commands.push_admin, args, conf_data, keyring, changed)
 
-        except RuntimeError as e:
-            LOG.error(e)
-            errors += 1
+    errors = parallel.execute(
+        push_admin, args.client, args.jobs, logger=LOG, coroutine=coroutine,
+    )
+    LOG.info(
+        'admin keys and conf changed on %d hosts, unchanged on %d',
+        len(changed), len(args.client) - len(changed) - errors,
+    )
 
     if errors:
         raise exc.GenericError('Failed to configure %d admin hosts' % errors)
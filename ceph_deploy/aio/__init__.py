@@ -0,0 +1,14 @@
+"""
+An ``asyncio`` based alternative to working on hosts with a thread each, see
+:mod:`ceph_deploy.aio.core`. Subcommands opt in by giving
+``ceph_deploy.util.parallel.execute`` a coroutine for their per-host work
+(from :mod:`ceph_deploy.aio.commands`), which is used when ``--asyncio`` is
+passed.
+
+It needs Python 3.5 or newer, ``available`` tells whether it can be used.
+Its modules are not imported here, ``asyncio`` is slow to import and only
+needed with ``--asyncio``.
+"""
+import sys
+
+available = sys.version_info >= (3, 5)
@@ -0,0 +1,51 @@
+"""
+Coroutine variants of the per-host work of subcommands, used instead of the
+blocking ones with ``--asyncio``. Each one takes what its blocking
+counterpart gets from the subcommand, followed by the hostname.
+"""
+import logging
+
+from ceph_deploy.aio import core
+from ceph_deploy.util import files
+
+LOG = logging.getLogger(__name__)
+
+
+async def push(conn, files_to_push):
+    """
+    Like :func:`ceph_deploy.util.files.push`, over a session.
+    """
+    digests = await conn.remote_module.run_batch(files.digest_calls(files_to_push))
+    writes = files.write_calls(files_to_push, digests)
+    if writes:
+        await conn.remote_module.run_batch(writes)
+    return bool(writes)
+
+
+async def push_config(args, conf_data, changed, hostname):
+    LOG.debug('Pushing config to %s', hostname)
+    distro = await core.get(hostname, username=args.username)
+    async with distro.conn:
+        if await push(distro.conn, [
+            files.conf_file(args.cluster, conf_data, args.overwrite_conf),
+        ]):
+            changed.append(hostname)
+        else:
+            LOG.debug('config on %s is up to date', hostname)
+
+
+async def push_admin(args, conf_data, keyring, changed, hostname):
+    LOG.debug('Pushing admin keys and conf to %s', hostname)
+    distro = await core.get(hostname, username=args.username)
+    async with distro.conn:
+        if await push(distro.conn, [
+            files.conf_file(args.cluster, conf_data, args.overwrite_conf),
+            files.plain_file(
+                '/etc/ceph/%s.client.admin.keyring' % args.cluster,
+                keyring,
+                0o600,
+            ),
+        ]):
+            changed.append(hostname)
+        else:
+            LOG.debug('admin keys and conf on %s are up to date', hostname)
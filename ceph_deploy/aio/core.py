@@ -0,0 +1,498 @@
+"""
+Work on hosts with ``asyncio`` instead of a thread per host.
+
+A :class:`Session` is an ``ssh`` subprocess (or a local one, for the current
+host) running a small Python server (:mod:`ceph_deploy.aio.server`) with the
+functions of ``ceph_deploy.hosts.remotes``. Calls to those functions and
+commands are requests over its standard input and output, so a session costs
+a couple of file descriptors and no thread, and a single event loop can keep
+hundreds of them busy at the same time.
+
+:func:`get` is the counterpart of ``ceph_deploy.hosts.get``, and
+:func:`execute` the counterpart of ``ceph_deploy.util.parallel.execute`` for
+per-host coroutines::
+
+    async def push(hostname):
+        distro = await core.get(hostname)
+        try:
+            await distro.conn.remote_module.write_conf(cluster, conf, False)
+        finally:
+            await distro.conn.close()
+
+    errors = core.execute(push, hostnames, jobs=100)
+"""
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import shlex
+import sys
+import time
+
+from ceph_deploy import connection, hosts
+from ceph_deploy.aio import server
+from ceph_deploy.hosts import remotes
+from ceph_deploy.lib import remoto
+from ceph_deploy.util import facts, stream, trace
+
+LOG = logging.getLogger(__name__)
+
+# Longest reply read from a host, in bytes
+LIMIT = 2 ** 24
+
+# What the remote interpreter runs: the first line it reads has the source of
+# the server and of the module it serves
+BOOTSTRAP = (
+    "import sys, json; "
+    "m = json.loads(sys.stdin.readline()); "
+    "ns = {'__name__': 'ceph_deploy_server'}; "
+    "exec(m['server'], ns); "
+    "ns['serve'](m['module'])"
+)
+
+# Remote interpreters in order of preference, like remoto picks them
+PYTHONS = ['python3', 'python', 'python2.7']
+
+
+class Session(object):
+    """
+    A connection to ``hostname`` that runs remote functions and commands as
+    coroutines. Like the connections of ``ceph_deploy.connection`` it
+    detects whether ``sudo`` is needed, in which case the remote server runs
+    with it.
+
+    Requests on the same session run one at a time, in order.
+    """
+
+    def __init__(self, hostname, username=None, logger=None, detect_sudo=True,
+                 timeout=300, module=remotes):
+        self.hostname = hostname
+        self.username = username
+        self.logger = logger or logging.getLogger(hostname)
+        self.detect_sudo = detect_sudo
+        self.global_timeout = timeout
+        self.module = module
+        self.sudo = False
+        self.process = None
+        self.lock = None
+        self.request_id = 0
+        self.remote_module = RemoteModule(self)
+
+    @property
+    def target(self):
+        if self.username:
+            return '%s@%s' % (self.username, self.hostname)
+        return self.hostname
+
+    def command(self, sudo=False):
+        """
+        The command that starts the remote server, with the first Python
+        interpreter found on the remote host.
+        """
+        script = (
+            'for python in %s; do '
+            'if command -v $python >/dev/null 2>&1; then exec $python -c %s; fi; '
+            'done; '
+            'echo "no python interpreter found" >&2; exit 127'
+        ) % (' '.join(PYTHONS), shlex.quote(BOOTSTRAP))
+        interpreter = ['sh', '-c', script]
+        if sudo:
+            interpreter.insert(0, 'sudo')
+        if not remoto.connection.needs_ssh(self.hostname):
+            return interpreter
+        return (
+            ['ssh', '-C', '-T'] +
+            shlex.split(connection.ssh_options()) +
+            [self.target, ' '.join(shlex.quote(part) for part in interpreter)]
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+        return False
+
+    async def open(self):
+        """
+        Start the remote server, again with ``sudo`` if it turns out to be
+        needed. Returns the session itself.
+        """
+        started = time.time()
+        self.lock = asyncio.Lock()
+        try:
+            uid = await self._spawn()
+            if uid != 0 and self.detect_sudo:
+                self.logger.debug('connection detected need for sudo')
+                await self.close()
+                await self._spawn(sudo=True)
+                self.sudo = True
+        except (OSError, RuntimeError, asyncio.TimeoutError) as error:
+            await self.close()
+            raise RuntimeError('connecting to host: %s resulted in errors: %s %s' % (
+                self.target, error.__class__.__name__, error))
+        trace.record(self.target, 'connection', 'connect', started)
+        self.logger.debug('connected to host: %s ', self.target)
+        return self
+
+    async def _spawn(self, sudo=False):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command(sudo),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=LIMIT
+        )
+        asyncio.ensure_future(self._log_stderr(self.process))
+        sources = {
+            'server': inspect.getsource(server),
+            'module': inspect.getsource(self.module),
+        }
+        self.process.stdin.write(json.dumps(sources).encode('utf-8') + b'\n')
+        await self.process.stdin.drain()
+        # the server says hello with its effective user id
+        return server.decode((await self._read())['result'])
+
+    async def _log_stderr(self, process):
+        # ssh and the remote interpreter complain here, don't let it fill up
+        while True:
+            line = await process.stderr.readline()
+            if not line:
+                return
+            self.logger.warning(line.decode('utf-8', 'replace').rstrip())
+
+    async def _read(self):
+        try:
+            line = await asyncio.wait_for(
+                self.process.stdout.readline(),
+                self.global_timeout,
+            )
+        except asyncio.TimeoutError:
+            # a late reply would be mistaken for the next one
+            self.logger.warning(
+                'No data was received after %s seconds, disconnecting...' % self.global_timeout
+            )
+            await self.close()
+            raise RuntimeError('timed out waiting for %s' % self.target)
+        if not line:
+            raise RuntimeError('connection to %s was closed' % self.target)
+        return json.loads(line.decode('utf-8'))
+
+    async def request(self, message, on_line=None):
+        """
+        Send ``message`` to the server and return the result it replies
+        with. Lines of output that come before the reply go to
+        ``on_line(source, line)``.
+        """
+        if self.process is None:
+            raise RuntimeError('connection to %s is not open' % self.target)
+        async with self.lock:
+            self.request_id += 1
+            message['id'] = self.request_id
+            self.process.stdin.write(json.dumps(message).encode('utf-8') + b'\n')
+            await self.process.stdin.drain()
+            while True:
+                reply = await self._read()
+                if 'line' in reply:
+                    on_line(reply['source'], server.decode(reply['line']))
+                    continue
+                if 'error' in reply:
+                    raise RuntimeError(stream._remote_error(reply['error']))
+                return server.decode(reply['result'])
+
+    async def call(self, name, *args):
+        """
+        Call the function ``name`` of the remote module with ``args``.
+        """
+        started = time.time()
+        result = None
+        try:
+            result = await self.request({
+                'op': 'call',
+                'name': name,
+                'args': server.encode(list(args)),
+            })
+            return result
+        finally:
+            trace.record(
+                self.target, 'remote_module', name, started,
+                sent=len(name) + len(repr(args)),
+                received=len(repr(result)),
+            )
+
+    async def check(self, command, env=None):
+        """
+        Run ``command`` and return its output and exit status like
+        ``remoto.process.check`` does: ``(stdout, stderr, returncode)``, with
+        the output as lists of lines (byte strings).
+        """
+        out = {'stdout': [], 'stderr': []}
+
+        def on_line(source, line):
+            out[source].append(line)
+
+        started = time.time()
+        try:
+            code = await self.request({'op': 'run', 'cmd': command, 'env': env}, on_line)
+        finally:
+            trace.record(
+                self.target, 'process.check', trace.command_name(command), started,
+                sent=len(repr(command)),
+                received=sum(len(line) for lines in out.values() for line in lines),
+                command=' '.join(command),
+            )
+        return out['stdout'], out['stderr'], code
+
+    async def run(self, command, stop_on_nonzero=True, env=None):
+        """
+        Run ``command`` logging its output as it comes, like
+        ``ceph_deploy.util.stream.run`` does. Returns its exit status.
+        """
+        logger = self.logger
+        logger.info('Running command: %s' % stream.command_line(self, command))
+        received = [0]
+
+        def on_line(source, line):
+            received[0] += len(line)
+            line = line.decode('utf-8', 'replace').rstrip('\r')
+            if source == 'stdout':
+                logger.debug(line)
+            else:
+                logger.warning(line)
+
+        started = time.time()
+        try:
+            returncode = await self.request({'op': 'run', 'cmd': command, 'env': env}, on_line)
+        finally:
+            trace.record(
+                self.target, 'process.run', trace.command_name(command), started,
+                sent=len(repr(command)),
+                received=received[0],
+                command=' '.join(command),
+            )
+        if returncode != 0:
+            if stop_on_nonzero:
+                logger.error('command returned non-zero exit status: %s' % returncode)
+                raise RuntimeError('Failed to execute command: %s' % ' '.join(command))
+            logger.warning('command returned non-zero exit status: %s' % returncode)
+        return returncode
+
+    def batch(self):
+        """
+        Start a ``RemoteBatch``, its ``execute()`` has to be awaited.
+        """
+        return connection.RemoteBatch(self)
+
+    async def close(self):
+        process, self.process = self.process, None
+        if process is None or process.returncode is not None:
+            return
+        process.stdin.close()
+        try:
+            await asyncio.wait_for(process.wait(), 5)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+
+
+class RemoteModule(object):
+    """
+    The functions of the module served by a :class:`Session`, as coroutines.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def __getattr__(self, name):
+        if name.startswith('_') or not hasattr(self.session.module, name):
+            raise AttributeError(
+                'module %s does not have attribute %s' % (self.session.module, name)
+            )
+        return functools.partial(self.session.call, name)
+
+
+class BlockingConnection(object):
+    """
+    Lets blocking code written for remoto connections, like the
+    ``choose_init`` of the distro modules, use a :class:`Session` from a thread
+    other than the one running the event loop: remote module calls and
+    ``remoto.process`` commands are sent to the session and waited for.
+    """
+
+    def __init__(self, session, loop):
+        self.session = session
+        self.loop = loop
+        self.hostname = session.target
+        self.logger = session.logger
+        self.sudo = session.sudo
+        self.global_timeout = session.global_timeout
+        self.remote_module = _BlockingModule(self)
+        # remoto asks the gateway for the remote environment
+        self.gateway = self
+
+    def wait(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def cmd(self, command):
+        return command
+
+    def remote_exec(self, source, **kw):
+        return _Replies([{}])
+
+    def execute(self, function, **kw):
+        out, err, code = self.wait(self.session.check(list(kw['cmd']), kw.get('env')))
+        name = function.__name__
+        if name == '_remote_check':
+            return _Replies([(out, err, code)])
+        if name == '_remote_run':
+            return _Replies(
+                [{'debug': line} for line in out] + [{'warning': line} for line in err]
+            )
+        replies = [('stdout', line) for line in out] + [('stderr', line) for line in err]
+        return _Replies(replies + [('exit', code)])
+
+
+class _BlockingModule(object):
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        function = getattr(self.conn.session.remote_module, name)
+        return lambda *args: self.conn.wait(function(*args))
+
+
+class _Replies(object):
+    """
+    A channel that already has all of its replies.
+    """
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    def receive(self, timeout=None):
+        if not self.replies:
+            raise EOFError('channel is closed')
+        return self.replies.pop(0)
+
+    def send(self, item):
+        pass
+
+    def close(self):
+        pass
+
+
+async def connect(hostname, username=None, logger=None, detect_sudo=True):
+    """
+    Open a :class:`Session` to ``hostname``.
+    """
+    session = Session(
+        hostname,
+        username=username,
+        logger=logger or logging.getLogger(hostname),
+        detect_sudo=detect_sudo,
+    )
+    return await session.open()
+
+
+async def get(hostname, username=None, detect_sudo=True, use_rhceph=False):
+    """
+    Like ``ceph_deploy.hosts.get``, but the ``conn`` of the distro module it
+    returns is a :class:`Session`. Facts come from the same cache, and when
+    they have to be gathered it only takes one round trip (plus what the
+    distro needs to detect its init system).
+    """
+    session = await connect(hostname, username=username, detect_sudo=detect_sudo)
+    try:
+        host_facts = facts.load(hostname)
+        if host_facts is None:
+            batch = session.batch()
+            batch.platform_information()
+            batch.machine_type()
+            (distro_name, release, codename), machine_type = await batch.execute()
+            hosts.check_platform(distro_name, release, codename)
+        else:
+            distro_name = host_facts['name']
+            release = host_facts['release']
+            codename = host_facts['codename']
+            machine_type = host_facts['machine_type']
+
+        module = hosts.build(
+            session, distro_name, release, codename, machine_type,
+            use_rhceph=use_rhceph,
+        )
+        if host_facts is None:
+            # the distro modules detect their init system with blocking
+            # calls, they get to run them in a thread
+            module.conn = BlockingConnection(session, asyncio.get_event_loop())
+            module.init = await asyncio.get_event_loop().run_in_executor(
+                None, module.choose_init, module
+            )
+            module.conn = session
+            facts.save(hostname, {
+                'name': distro_name,
+                'release': release,
+                'codename': codename,
+                'machine_type': machine_type,
+                'init': module.init,
+            })
+        else:
+            module.init = host_facts['init']
+    except Exception:
+        await session.close()
+        raise
+    return module
+
+
+def new_event_loop():
+    """
+    A new event loop, made the current one so that it can run subprocesses.
+    Before Python 3.8 the child watcher has to be attached to it too.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    if sys.version_info < (3, 8):
+        asyncio.get_child_watcher().attach_loop(loop)
+    return loop
+
+
+def execute(func, items, jobs=1, logger=None, catch=RuntimeError):
+    """
+    Await ``func(item)`` for every item in ``items``, at most ``jobs`` at the
+    same time, on a new event loop. Errors are handled like
+    ``ceph_deploy.util.parallel.execute`` does: those matching ``catch`` are
+    logged and counted and the count is returned, any other stops new items
+    from starting and is raised once the ones in progress are done.
+    """
+    loop = new_event_loop()
+    try:
+        return loop.run_until_complete(
+            _execute(func, list(items), max(1, int(jobs or 1)), logger or LOG, catch)
+        )
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+async def _execute(func, items, jobs, logger, catch):
+    semaphore = asyncio.Semaphore(jobs)
+    state = {'errors': 0, 'failure': None}
+
+    async def one(item):
+        async with semaphore:
+            if state['failure'] is not None:
+                return
+            try:
+                await func(item)
+            except catch as e:
+                logger.error(e)
+                state['errors'] += 1
+            except Exception as e:
+                if state['failure'] is None:
+                    state['failure'] = e
+
+    await asyncio.gather(*[one(item) for item in items])
+    if state['failure'] is not None:
+        raise state['failure']
+    return state['errors']
@@ -0,0 +1,113 @@
+"""
+The remote end of a :class:`ceph_deploy.aio.core.Session`.
+
+This module is not imported locally, its source is sent to the remote Python
+interpreter (like ``ceph_deploy.hosts.remotes`` is) which then runs
+:func:`serve`. Requests and replies are JSON documents, one per line, on the
+standard input and output of the remote interpreter. It must only rely on the
+standard library.
+"""
+import base64
+import json
+import os
+import subprocess
+import sys
+import traceback
+from select import select
+
+
+def encode(obj):
+    """
+    Make ``obj`` fit in JSON: byte strings are tagged and base64 encoded,
+    tuples become lists.
+    """
+    if isinstance(obj, bytes):
+        return {'__bytes__': base64.b64encode(obj).decode('ascii')}
+    if isinstance(obj, (list, tuple)):
+        return [encode(item) for item in obj]
+    if isinstance(obj, dict):
+        return dict((key, encode(value)) for key, value in obj.items())
+    return obj
+
+
+def decode(obj):
+    if isinstance(obj, dict):
+        if '__bytes__' in obj:
+            return base64.b64decode(obj['__bytes__'].encode('ascii'))
+        return dict((key, decode(value)) for key, value in obj.items())
+    if isinstance(obj, list):
+        return [decode(item) for item in obj]
+    return obj
+
+
+def send(out, message):
+    out.write((json.dumps(message) + '\n').encode('utf-8'))
+    out.flush()
+
+
+def run(out, request_id, cmd, env=None):
+    """
+    Run ``cmd``, sending every line of its output as it comes, and return its
+    exit status.
+    """
+    environ = os.environ.copy()
+    environ['PATH'] = environ.get('PATH', '') + ':/usr/local/bin:/bin:/usr/bin:/usr/local/sbin:/usr/sbin:/sbin'
+    environ.update(env or {})
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=open(os.devnull),
+        close_fds=True,
+        env=environ,
+    )
+    sources = {
+        process.stdout.fileno(): 'stdout',
+        process.stderr.fileno(): 'stderr',
+    }
+    pending = dict((fd, b'') for fd in sources)
+    while sources:
+        reads, _, _ = select(list(sources), [], [])
+        for fd in reads:
+            source = sources[fd]
+            data = os.read(fd, 65536)
+            if data:
+                lines = (pending[fd] + data).split(b'\n')
+                pending[fd] = lines.pop()
+            else:
+                lines = [pending[fd]] if pending[fd] else []
+                del sources[fd]
+            for line in lines:
+                send(out, {
+                    'id': request_id,
+                    'source': source,
+                    'line': encode(line),
+                })
+    return process.wait()
+
+
+def serve(source):
+    """
+    Load the remote module ``source`` and answer requests until the other end
+    goes away.
+    """
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    namespace = {'__name__': 'ceph_deploy_remote'}
+    exec(compile(source, 'remotes', 'exec'), namespace)
+    send(out, {'id': 0, 'result': encode(os.geteuid())})
+
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            return
+        request = json.loads(line)
+        request_id = request['id']
+        try:
+            if request['op'] == 'call':
+                result = namespace[request['name']](*decode(request['args']))
+            else:
+                result = run(out, request_id, request['cmd'], request.get('env'))
+            reply = {'id': request_id, 'result': encode(result)}
+        except Exception:
+            reply = {'id': request_id, 'error': traceback.format_exc()}
+        send(out, reply)
@@ -1,5 +1,5 @@
-import pkg_resources
 import argparse
+import importlib
 import logging
 import textwrap
 import os
@@ -7,7 +7,8 @@ import sys
 
 import ceph_deploy
 from ceph_deploy import exc
-from ceph_deploy.util import log
+from ceph_deploy.conf import cephdeploy
+from ceph_deploy.util import facts, log, trace
 from ceph_deploy.util.decorators import catches
 
 LOG = logging.getLogger(__name__)
@@ -26,6 +27,97 @@ Full documentation can be found at: http://ceph.com/ceph-deploy/docs
 """ % ceph_deploy.__version__)
 
 
+# The subcommands that come with ceph-deploy, in the order they are listed, as
+# (name, 'module:function', help). Only the module of the subcommand being run
+# gets imported. Other packages can add subcommands with ``ceph_deploy.cli``
+# entry points.
+COMMANDS = [
+    ('new', 'ceph_deploy.new:make',
+     'Start deploying a new cluster, and write a CLUSTER.conf and keyring for it.'),
+    ('install', 'ceph_deploy.install:make', 'Install Ceph packages on remote hosts.'),
+    ('mds', 'ceph_deploy.mds:make', 'Ceph MDS daemon management'),
+    ('mgr', 'ceph_deploy.mgr:make', 'Ceph MGR daemon management'),
+    ('mon', 'ceph_deploy.mon:make', 'Ceph MON Daemon management'),
+    ('rgw', 'ceph_deploy.rgw:make', 'Ceph RGW daemon management'),
+    ('gatherkeys', 'ceph_deploy.gatherkeys:make',
+     'Gather authentication keys for provisioning new nodes.'),
+    ('disk', 'ceph_deploy.osd:make_disk', 'Manage disks on a remote host.'),
+    ('osd', 'ceph_deploy.osd:make', 'Prepare a data disk on remote host.'),
+    ('admin', 'ceph_deploy.admin:make',
+     'Push configuration and client.admin key to a remote host.'),
+    ('config', 'ceph_deploy.config:make', 'Copy ceph.conf to/from remote host(s)'),
+    ('repo', 'ceph_deploy.repo:make', 'Repo definition management'),
+    ('purge', 'ceph_deploy.install:make_purge',
+     'Remove Ceph packages from remote hosts and purge all data.'),
+    ('purgedata', 'ceph_deploy.install:make_purge_data',
+     'Purge (delete, destroy, discard, shred) any Ceph data from /var/lib/ceph'),
+    ('uninstall', 'ceph_deploy.install:make_uninstall', 'Remove Ceph packages from remote hosts.'),
+    ('calamari', 'ceph_deploy.calamari:make',
+     'Install and configure Calamari nodes. Assumes that a repository with '
+     'Calamari packages is already configured. Refer to the docs for examples '
+     '(http://ceph.com/ceph-deploy/docs/conf.html)'),
+    ('forgetkeys', 'ceph_deploy.forgetkeys:make',
+     'Remove authentication keys from the local directory.'),
+    ('pkg', 'ceph_deploy.pkg:make', 'Manage packages on remote hosts.'),
+]
+
+
+def load_command(target):
+    """
+    Import the function that sets up a subcommand, from its
+    ``'module:function'`` in :data:`COMMANDS`
+    """
+    module_name, function = target.split(':')
+    return getattr(importlib.import_module(module_name), function)
+
+
+def plugin_commands():
+    """
+    The ``(name, load)`` pairs of the subcommands added by other packages
+    through ``ceph_deploy.cli`` entry points, where ``load()`` imports the
+    function that sets them up.
+    """
+    try:
+        from importlib import metadata
+    except ImportError:
+        # much slower, but the only option before Python 3.8
+        import pkg_resources
+        entry_points = pkg_resources.iter_entry_points('ceph_deploy.cli')
+    else:
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, 'select'):
+            entry_points = entry_points.select(group='ceph_deploy.cli')
+        else:
+            entry_points = entry_points.get('ceph_deploy.cli', [])
+
+    builtin = set(name for name, _, _ in COMMANDS)
+    plugins = {}
+    for entry_point in entry_points:
+        if entry_point.name not in builtin:
+            plugins[entry_point.name] = entry_point.load
+    return sorted(plugins.items())
+
+
+def find_command(parser, argv):
+    """
+    The subcommand that ``argv`` runs: the first argument that is neither a
+    global flag nor the value of one. ``None`` when there is none, like for
+    ``--help``.
+    """
+    argv = list(argv)
+    while argv:
+        arg = argv.pop(0)
+        if arg == '--':
+            return argv[0] if argv else None
+        if not arg.startswith('-'):
+            return arg
+        action = parser._option_string_actions.get(arg)
+        if action is not None and action.nargs != 0:
+            # the value of the flag is the next argument
+            argv[:1] = []
+    return None
+
+
 def log_flags(args, logger=None):
     logger = logger or LOG
     logger.info('ceph-deploy options:')
@@ -36,7 +128,10 @@ def log_flags(args, logger=None):
         logger.info(' %-30s: %s' % (k, v))
 
 
-def get_parser():
+def base_parser():
+    """
+    The parser for the global flags, without any subcommand
+    """
     parser = argparse.ArgumentParser(
         prog='ceph-deploy',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -73,27 +168,83 @@ def get_parser():
         dest='ceph_conf',
         help='use (or reuse) a given ceph.conf file',
     )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help='operate on up to N hosts concurrently (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--facts-ttl',
+        type=int,
+        default=3600,
+        metavar='SECONDS',
+        help='reuse the facts cached for a host (distro, release, init system) '
+             'for up to SECONDS, 0 disables the cache (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--refresh-facts',
+        action='store_true',
+        help='gather the facts of every host again instead of using the cache',
+    )
+    parser.add_argument(
+        '--asyncio',
+        action='store_true',
+        help='work on hosts with asyncio instead of a thread per host, for the '
+             'subcommands that support it (needs Python 3.5 or newer)',
+    )
+    parser.add_argument(
+        '--trace',
+        metavar='FILE',
+        help='write every remote call to FILE as a trace in the Chrome trace '
+             'format (for chrome://tracing or Perfetto)',
+    )
+    return parser
+
+
+def get_parser(commands=None):
+    """
+    The parser for every subcommand. Only the subcommands named in
+    ``commands`` get their arguments set up (which imports their modules),
+    the rest are only listed. All of them are set up by default.
+    """
+    parser = base_parser()
     sub = parser.add_subparsers(
         title='commands',
         metavar='COMMAND',
         help='description',
         )
     sub.required = True
+
     entry_points = [
-        (ep.name, ep.load())
-        for ep in pkg_resources.iter_entry_points('ceph_deploy.cli')
+        (name, (lambda target=target: load_command(target)), help)
+        for name, target, help in COMMANDS
         ]
-    entry_points.sort(
-        key=lambda name_fn: getattr(name_fn[1], 'priority', 100),
-        )
-    for (name, fn) in entry_points:
+    # other packages are only looked for when they are needed, their
+    # subcommands are listed after the ones of ceph-deploy
+    if not commands or not set(commands).issubset(name for name, _, _ in COMMANDS):
+        plugins = [(name, load()) for name, load in plugin_commands()]
+        plugins.sort(key=lambda name_fn: getattr(name_fn[1], 'priority', 100))
+        entry_points.extend(
+            (name, (lambda fn=fn: fn), fn.__doc__) for name, fn in plugins
+            )
+
+    cd_conf = None
+    for (name, load, help) in entry_points:
+        if commands is not None and name not in commands:
+            sub.add_parser(name, help=help)
+            continue
+        fn = load()
         p = sub.add_parser(
             name,
             description=fn.__doc__,
             help=fn.__doc__,
             )
         if not os.environ.get('CEPH_DEPLOY_TEST'):
-            p.set_defaults(cd_conf=ceph_deploy.conf.cephdeploy.load())
+            # read once, for all of them
+            cd_conf = cd_conf or cephdeploy.load()
+            p.set_defaults(cd_conf=cd_conf)
 
         # flag if the default release is being used
         p.set_defaults(default_release=False)
@@ -106,6 +257,16 @@ def get_parser():
     return parser
 
 
+def aio_available():
+    # importing it is slow, only done for --asyncio
+    try:
+        from ceph_deploy import aio
+    except ImportError:
+        # not installed with Pythons older than 3.5
+        return False
+    return aio.available
+
+
 @catches((KeyboardInterrupt, RuntimeError, exc.DeployError,), handle_all=True)
 def _main(args=None, namespace=None):
     # Set console logging first with some defaults, to prevent having exceptions
@@ -125,7 +286,9 @@ def _main(args=None, namespace=None):
     root_logger.setLevel(logging.DEBUG)
     root_logger.addHandler(sh)
 
-    parser = get_parser()
+    argv = sys.argv[1:] if args is None else args
+    command = find_command(base_parser(), argv)
+    parser = get_parser(commands=[command] if command else [])
     if len(sys.argv) < 2:
         parser.print_help()
         sys.exit()
@@ -153,7 +316,11 @@ def _main(args=None, namespace=None):
     # the one flag that will never work regardless of the config settings is
     # logging because we cannot set it before hand since the logging config is
     # not ready yet. This is the earliest we can do.
-    args = ceph_deploy.conf.cephdeploy.set_overrides(args)
+    args = cephdeploy.set_overrides(args, _conf=getattr(args, 'cd_conf', None))
+    if args.asyncio and not aio_available():
+        raise RuntimeError('--asyncio needs Python 3.5 or newer')
+    if not os.environ.get('CEPH_DEPLOY_TEST'):
+        facts.configure(ttl=args.facts_ttl, refresh=args.refresh_facts)
 
     LOG.info("Invoked (%s): %s" % (
         ceph_deploy.__version__,
@@ -161,13 +328,26 @@ def _main(args=None, namespace=None):
     )
     log_flags(args)
 
-    return args.func(args)
+    trace.start(keep_events=bool(args.trace))
+    try:
+        return args.func(args)
+    finally:
+        trace.report()
+        if args.trace:
+            trace.write(args.trace)
 
 
 def main(args=None, namespace=None):
     try:
         _main(args=args, namespace=namespace)
     finally:
+        # Connections are kept open for reuse while subcommands run, close
+        # them all now that nothing else will need them. There are none if
+        # the module was never imported.
+        connection = sys.modules.get('ceph_deploy.connection')
+        if connection is not None:
+            connection.close_all()
+
         # This block is crucial to avoid having issues with
         # Python spitting non-sense thread exceptions. We have already
         # handled what we could, so close stderr and stdout.
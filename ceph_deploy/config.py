@@ -1,3 +1,4 @@
+import functools
 import logging
 import os.path
 
@@ -5,30 +6,40 @@ from ceph_deploy import exc
 from ceph_deploy import conf
 from ceph_deploy.cliutil import priority
 from ceph_deploy import hosts
+from ceph_deploy.util import files, parallel
 
 LOG = logging.getLogger(__name__)
 
 
 def config_push(args):
     conf_data = conf.ceph.load_raw(args)
+    changed = []
 
-    errors = 0
-    for hostname in args.client:
+    def push_config(hostname):
         LOG.debug('Pushing config to %s', hostname)
-        try:
-            distro = hosts.get(hostname, username=args.username)
-
-            distro.conn.remote_module.write_conf(
-                args.cluster,
-                conf_data,
-                args.overwrite_conf,
-            )
-
-            distro.conn.exit()
-
-        except RuntimeError as e:
-            LOG.error(e)
-            errors += 1
+        distro = hosts.get(hostname, username=args.username)
+
+        if files.push(distro.conn, [
+            files.conf_file(args.cluster, conf_data, args.overwrite_conf),
+        ]):
+            changed.append(hostname)
+        else:
+            LOG.debug('config on %s is up to date', hostname)
+
+        distro.conn.exit()
+
+    coroutine = None
+    if args.asyncio:
+        from ceph_deploy.aio import commands
+        coroutine = functools.partial(commands.push_config, args, conf_data, changed)
+
+    errors = parallel.execute(
+        push_config, args.client, args.jobs, logger=LOG, coroutine=coroutine,
+    )
+    LOG.info(
+        'config changed on %d hosts, unchanged on %d',
+        len(changed), len(args.client) - len(changed) - errors,
+    )
 
     if errors:
         raise exc.GenericError('Failed to config %d hosts' % errors)
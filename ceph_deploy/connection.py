@@ -1,25 +1,259 @@
+import os
 import socket
+import threading
+import time
 from ceph_deploy.lib import remoto
+from ceph_deploy.util import paths, trace
+
+
+# Seconds OpenSSH keeps a master connection open after the last session that
+# used it is gone. Setting it to ``None`` disables connection multiplexing.
+control_persist = 600
+
+# How the functions that run commands remotely are recorded by ``trace``: the
+# category of the call, and how to tell its last reply
+_traced_functions = {
+    '_remote_check': ('process.check', lambda reply: True),
+    '_remote_run': ('process.run', lambda reply: False),
+    '_remote_stream': ('stream', lambda reply: reply[0] == 'exit'),
+}
+
+# Connections that callers are done with, ready to be handed out again. Keyed
+# by ``(username, hostname, detect_sudo)``.
+_pool = {}
+_pool_lock = threading.Lock()
+
+
+class Connection(remoto.Connection):
+    """
+    A remoto connection that goes back to the pool when the caller is done
+    with it (calling ``exit()`` or leaving a ``with`` block), so that the next
+    ``get_connection`` to the same host skips both the SSH handshake and the
+    bootstrap of the remote interpreter. It is only really closed with
+    :meth:`close`, usually from :func:`close_all` when ceph-deploy is done.
+
+    SSH connections are opened through an OpenSSH ControlMaster socket, so
+    that other sessions to the same host (like the one used to detect the need
+    for ``sudo``, or a later ceph-deploy run) reuse the same transport.
+    """
+
+    def __init__(self, hostname, *args, **kw):
+        self.pool_key = kw.pop('pool_key', None)
+        self.imported = None
+        remoto.Connection.__init__(self, hostname, *args, **kw)
+
+    def _make_connection_string(self, hostname, _needs_ssh=None, use_sudo=None):
+        connection_string = remoto.Connection._make_connection_string(
+            self,
+            hostname,
+            _needs_ssh=_needs_ssh,
+            use_sudo=use_sudo,
+        )
+        if connection_string.startswith('ssh='):
+            options = ssh_options()
+            if options:
+                connection_string = 'ssh=%s %s' % (options, connection_string[len('ssh='):])
+        return connection_string
+
+    def import_module(self, module):
+        """
+        Import ``module`` on the remote end, unless a previous user of this
+        connection already did and its channel is still usable.
+        """
+        remote_module = self.remote_module
+        if self.imported is module and remote_module is not None:
+            if not remote_module.channel.isclosed():
+                return remote_module
+        remoto.Connection.import_module(self, module)
+        self.remote_module = trace.TracedModule(self.remote_module, self.hostname)
+        self.imported = module
+        return self.remote_module
+
+    def execute(self, function, **kw):
+        """
+        Run ``function`` remotely, recording how long it takes with
+        :mod:`ceph_deploy.util.trace`.
+        """
+        channel = remoto.Connection.execute(self, function, **kw)
+        name = getattr(function, '__name__', 'execute')
+        category, last_reply = _traced_functions.get(name, (name, lambda reply: True))
+        return trace.TracedChannel(
+            channel,
+            self.hostname,
+            category,
+            kw.get('cmd') or [name],
+            last_reply,
+        )
+
+    def batch(self):
+        """
+        Start a :class:`RemoteBatch` for this connection.
+        """
+        return RemoteBatch(self)
+
+    def is_alive(self):
+        try:
+            return self.gateway.hasreceiver()
+        except Exception:
+            return False
+
+    def exit(self):
+        release(self)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        release(self)
+        return False
+
+    def close(self):
+        remoto.Connection.exit(self)
+
+
+class RemoteBatch(object):
+    """
+    Queue calls to the functions of the imported remote module and run all of
+    them in a single round trip, instead of waiting for every one of them over
+    the wire::
+
+        batch = conn.batch()
+        batch.shortname()
+        batch.path_getuid('/var/lib/ceph')
+        hostname, uid = batch.execute()
+
+    Calls run remotely in the order they were queued. If one of them raises,
+    the rest are not run and the error is raised by :meth:`execute`, just like
+    it would for a single call. A batch can be reused after it is executed.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def queue(*args):
+            self.calls.append((name, args))
+        return queue
+
+    def __len__(self):
+        return len(self.calls)
+
+    def execute(self):
+        """
+        Run every queued call and return their results, in order.
+        """
+        calls, self.calls = self.calls, []
+        if not calls:
+            return []
+        return self.conn.remote_module.run_batch(calls)
+
+
+def ssh_options():
+    """
+    The OpenSSH options that make connections to the same host share a single
+    master connection. Returns an empty string when multiplexing is disabled
+    or the directory for the control sockets is not usable.
+    """
+    if not control_persist:
+        return ''
+    control_dir = paths.local.ssh_control()
+    # execnet splits the ssh specification on whitespace
+    if len(control_dir.split()) != 1:
+        return ''
+    if not os.path.isdir(control_dir):
+        try:
+            os.makedirs(control_dir, 0o700)
+        except OSError:
+            # another thread might have just created it
+            if not os.path.isdir(control_dir):
+                return ''
+    return '-o ControlMaster=auto -o ControlPersist=%ds -o ControlPath=%s' % (
+        control_persist,
+        os.path.join(control_dir, '%C'),
+    )
+
+
+def release(conn):
+    """
+    Hand ``conn`` back to the pool, or close it if it can't be reused.
+    """
+    if conn.pool_key is None or not conn.is_alive():
+        conn.close()
+        return
+    with _pool_lock:
+        idle = _pool.setdefault(conn.pool_key, [])
+        if conn not in idle:
+            idle.append(conn)
+
+
+def _checkout(key):
+    """
+    Take a live connection for ``key`` out of the pool, if there is one.
+    """
+    dead = []
+    conn = None
+    with _pool_lock:
+        idle = _pool.get(key, [])
+        while idle:
+            candidate = idle.pop()
+            if candidate.is_alive():
+                conn = candidate
+                break
+            dead.append(candidate)
+    for candidate in dead:
+        candidate.close()
+    return conn
+
+
+def close_all():
+    """
+    Close every pooled connection. Connections still in use are left alone.
+    """
+    with _pool_lock:
+        connections = [conn for idle in _pool.values() for conn in idle]
+        _pool.clear()
+    for conn in connections:
+        conn.close()
 
 
 def get_connection(hostname, username, logger, threads=5, use_sudo=None, detect_sudo=True):
     """
     A very simple helper, meant to return a connection
     that will know about the need to use sudo.
+
+    Connections are reused: if an earlier connection to the same host (and as
+    the same user) has been exited it is handed out again instead of opening
+    a new one.
     """
+    key = (username, hostname, detect_sudo)
     if username:
         hostname = "%s@%s" % (username, hostname)
+
+    started = time.time()
+    conn = _checkout(key)
+    if conn is not None:
+        trace.record(hostname, 'connection', 'connect (reused)', started)
+        conn.logger = logger
+        if conn.remote_module is not None:
+            conn.remote_module.logger = logger
+        conn.global_timeout = 300
+        logger.debug("reusing connection to host: %s " % hostname)
+        return conn
+
     try:
-        conn = remoto.Connection(
+        conn = Connection(
             hostname,
             logger=logger,
             threads=threads,
             detect_sudo=detect_sudo,
+            pool_key=key,
         )
 
         # Set a timeout value in seconds to disconnect and move on
         # if no data is sent back.
         conn.global_timeout = 300
+        trace.record(hostname, 'connection', 'connect', started)
         logger.debug("connected to host: %s " % hostname)
         return conn
 
@@ -9,10 +9,14 @@ import time
 from ceph_deploy import hosts
 from ceph_deploy.cliutil import priority
 from ceph_deploy.lib import remoto
+from ceph_deploy.util import parallel
 import ceph_deploy.util.paths.mon
 
 LOG = logging.getLogger(__name__)
 
+# Seconds a ``ceph`` command waits for the cluster before giving up
+CONNECT_TIMEOUT = 25
+
 
 def _keyring_equivalent(keyring_one, keyring_two):
     """
@@ -97,14 +101,14 @@ def keytype_capabilities(keytype):
     return cap_dict.get(keytype, None)
 
 
-def gatherkeys_missing(args, distro, rlogger, keypath, keytype, dest_dir):
+def mon_auth_command(args, keypath):
     """
-    Get or create the keyring from the mon using the mon keyring by keytype and
-    copy to dest_dir
+    The start of a ``ceph`` command that authenticates with the mon keyring
+    at ``keypath``
     """
-    args_prefix = [
+    return [
         '/usr/bin/ceph',
-        '--connect-timeout=25',
+        '--connect-timeout=%d' % CONNECT_TIMEOUT,
         '--cluster={cluster}'.format(
             cluster=args.cluster),
         '--name', 'mon.',
@@ -112,6 +116,63 @@ def gatherkeys_missing(args, distro, rlogger, keypath, keytype, dest_dir):
             keypath=keypath),
         ]
 
+
+def write_key(args, keytype, dest_dir, lines):
+    """
+    Write the keyring ``lines`` (as returned by ``remoto``) for a keytype
+    in dest_dir
+    """
+    keyring_name_local = keytype_path_to(args, keytype)
+    keyring_path_local = os.path.join(dest_dir, keyring_name_local)
+    with open(keyring_path_local, 'wb') as f:
+        for line in lines:
+            f.write(line + b'\n')
+
+
+def split_keyring(lines):
+    """
+    Split the lines of a keyring with many entities in it, like the output of
+    ``ceph auth export``, into the lines of each one by entity name (like
+    ``client.admin``).
+    """
+    entities = {}
+    entity = None
+    for line in lines:
+        content = line.strip()
+        if content.startswith(b'[') and content.endswith(b']'):
+            entity = content[1:-1].decode('utf-8', 'replace')
+            entities[entity] = []
+        if entity is not None:
+            entities[entity].append(line)
+    return entities
+
+
+def export_keys(args, distro, rlogger, keypath):
+    """
+    Get every key the mons have with a single ``ceph auth export``, instead
+    of starting ``ceph`` (and authenticating with the mons) for each keytype.
+    Returns the lines of each key by entity name, nothing if the export
+    failed.
+    """
+    out, err, code = remoto.process.check(
+        distro.conn,
+        mon_auth_command(args, keypath) + ['auth', 'export']
+        )
+    if code != 0:
+        rlogger.warning('"ceph auth export" returned %s, getting keys one by one', code)
+        for line in err:
+            rlogger.debug(line)
+        return {}
+    return split_keyring(out)
+
+
+def gatherkeys_missing(args, distro, rlogger, keypath, keytype, dest_dir):
+    """
+    Get or create the keyring from the mon using the mon keyring by keytype and
+    copy to dest_dir
+    """
+    args_prefix = mon_auth_command(args, keypath)
+
     identity = keytype_identity(keytype)
     if identity is None:
         raise RuntimeError('Could not find identity for keytype:%s' % keytype)
@@ -139,85 +200,105 @@ def gatherkeys_missing(args, distro, rlogger, keypath, keytype, dest_dir):
         for line in err:
             rlogger.debug(line)
         return False
-    keyring_name_local = keytype_path_to(args, keytype)
-    keyring_path_local = os.path.join(dest_dir, keyring_name_local)
-    with open(keyring_path_local, 'wb') as f:
-        for line in out:
-            f.write(line + b'\n')
+    write_key(args, keytype, dest_dir, out)
     return True
 
 
-def gatherkeys_with_mon(args, host, dest_dir):
+def gatherkeys_with_mon(args, host, dest_dir, cancelled=None):
     """
     Connect to mon and gather keys if mon is in quorum.
+
+    ``cancelled`` is an optional ``threading.Event``, once it is set (keys
+    came from another mon) this stops at the next step and returns False.
     """
+    def stop():
+        return cancelled is not None and cancelled.is_set()
+
     distro = hosts.get(host, username=args.username)
-    remote_hostname = distro.conn.remote_module.shortname()
-    dir_keytype_mon = ceph_deploy.util.paths.mon.path(args.cluster, remote_hostname)
-    path_keytype_mon = "%s/keyring" % (dir_keytype_mon)
-    mon_key = distro.conn.remote_module.get_file(path_keytype_mon)
-    if mon_key is None:
-        LOG.warning("No mon key found in host: %s", host)
-        return False
-    mon_name_local = keytype_path_to(args, "mon")
-    mon_path_local = os.path.join(dest_dir, mon_name_local)
-    with open(mon_path_local, 'wb') as f:
-        f.write(mon_key)
-    rlogger = logging.getLogger(host)
-    path_asok = ceph_deploy.util.paths.mon.asok(args.cluster, remote_hostname)
-    out, err, code = remoto.process.check(
-        distro.conn,
-            [
-                "/usr/bin/ceph",
-                "--connect-timeout=25",
-                "--cluster={cluster}".format(
-                    cluster=args.cluster),
-                "--admin-daemon={asok}".format(
-                    asok=path_asok),
-                "mon_status"
-            ]
-        )
-    if code != 0:
-        rlogger.error('"ceph mon_status %s" returned %s', host, code)
-        for line in err:
-            rlogger.debug(line)
-        return False
     try:
-        mon_status = json.loads(b''.join(out).decode('utf-8'))
-    except ValueError:
-        rlogger.error('"ceph mon_status %s" output was not json', host)
-        for line in out:
-            rlogger.error(line)
-        return False
-    mon_number = None
-    mon_map = mon_status.get('monmap')
-    if mon_map is None:
-        rlogger.error("could not find mon map for mons on '%s'", host)
-        return False
-    mon_quorum = mon_status.get('quorum')
-    if mon_quorum is None:
-        rlogger.error("could not find quorum for mons on '%s'" , host)
-        return False
-    mon_map_mons = mon_map.get('mons')
-    if mon_map_mons is None:
-        rlogger.error("could not find mons in monmap on '%s'", host)
-        return False
-    for mon in mon_map_mons:
-        if mon.get('name') == remote_hostname:
-           mon_number = mon.get('rank')
-           break
-    if mon_number is None:
-        rlogger.error("could not find '%s' in monmap", remote_hostname)
-        return False
-    if not mon_number in mon_quorum:
-        rlogger.error("Not yet quorum for '%s'", host)
-        return False
-    for keytype in ["admin", "mds", "mgr", "osd", "rgw"]:
-        if not gatherkeys_missing(args, distro, rlogger, path_keytype_mon, keytype, dest_dir):
-            # We will return failure if we fail to gather any key
-            rlogger.error("Failed to return '%s' key from host %s", keytype, host)
+        if stop():
             return False
-    return True
+        remote_hostname = distro.conn.remote_module.shortname()
+        dir_keytype_mon = ceph_deploy.util.paths.mon.path(args.cluster, remote_hostname)
+        path_keytype_mon = "%s/keyring" % (dir_keytype_mon)
+        mon_key = distro.conn.remote_module.get_file(path_keytype_mon)
+        if mon_key is None:
+            LOG.warning("No mon key found in host: %s", host)
+            return False
+        if stop():
+            return False
+        mon_name_local = keytype_path_to(args, "mon")
+        mon_path_local = os.path.join(dest_dir, mon_name_local)
+        with open(mon_path_local, 'wb') as f:
+            f.write(mon_key)
+        rlogger = logging.getLogger(host)
+        path_asok = ceph_deploy.util.paths.mon.asok(args.cluster, remote_hostname)
+        out, err, code = remoto.process.check(
+            distro.conn,
+                [
+                    "/usr/bin/ceph",
+                    "--connect-timeout=%d" % CONNECT_TIMEOUT,
+                    "--cluster={cluster}".format(
+                        cluster=args.cluster),
+                    "--admin-daemon={asok}".format(
+                        asok=path_asok),
+                    "mon_status"
+                ]
+            )
+        if stop():
+            return False
+        if code != 0:
+            rlogger.error('"ceph mon_status %s" returned %s', host, code)
+            for line in err:
+                rlogger.debug(line)
+            return False
+        try:
+            mon_status = json.loads(b''.join(out).decode('utf-8'))
+        except ValueError:
+            rlogger.error('"ceph mon_status %s" output was not json', host)
+            for line in out:
+                rlogger.error(line)
+            return False
+        mon_number = None
+        mon_map = mon_status.get('monmap')
+        if mon_map is None:
+            rlogger.error("could not find mon map for mons on '%s'", host)
+            return False
+        mon_quorum = mon_status.get('quorum')
+        if mon_quorum is None:
+            rlogger.error("could not find quorum for mons on '%s'" , host)
+            return False
+        mon_map_mons = mon_map.get('mons')
+        if mon_map_mons is None:
+            rlogger.error("could not find mons in monmap on '%s'", host)
+            return False
+        for mon in mon_map_mons:
+            if mon.get('name') == remote_hostname:
+               mon_number = mon.get('rank')
+               break
+        if mon_number is None:
+            rlogger.error("could not find '%s' in monmap", remote_hostname)
+            return False
+        if not mon_number in mon_quorum:
+            rlogger.error("Not yet quorum for '%s'", host)
+            return False
+        # all the keys that exist already in one go, the rest get created
+        exported = export_keys(args, distro, rlogger, path_keytype_mon)
+        for keytype in ["admin", "mds", "mgr", "osd", "rgw"]:
+            if stop():
+                return False
+            exported_key = exported.get(keytype_identity(keytype))
+            if exported_key:
+                write_key(args, keytype, dest_dir, exported_key)
+                continue
+            if not gatherkeys_missing(args, distro, rlogger, path_keytype_mon, keytype, dest_dir):
+                # We will return failure if we fail to gather any key
+                rlogger.error("Failed to return '%s' key from host %s", keytype, host)
+                return False
+        return True
+    finally:
+        # hand the connection back so later steps can reuse it
+        distro.conn.exit()
 
 
 def gatherkeys(args):
@@ -231,19 +312,34 @@ def gatherkeys(args):
         try:
             tmpd = tempfile.mkdtemp()
             LOG.info("Storing keys in temp directory %s", tmpd)
-            sucess = False
+            # a directory per mon, as the ones that lose the race below
+            # might still be writing theirs
+            mon_dirs = {}
+            mons = []
             for host in args.mon:
-                sucess = gatherkeys_with_mon(args, host, tmpd)
-                if sucess:
-                    break
-            if not sucess:
+                if host not in mon_dirs:
+                    mon_dirs[host] = tempfile.mkdtemp(dir=tmpd)
+                    mons.append(host)
+
+            def gather(host, cancelled):
+                return gatherkeys_with_mon(args, host, mon_dirs[host], cancelled=cancelled)
+
+            # ask every mon at once, and take the keys from the first one
+            # that is in quorum and has all of them, instead of waiting for
+            # each one that is down to time out. The others are waited for
+            # until their current ``ceph`` call times out, so they are done
+            # writing before the temp directory goes away
+            mon = parallel.race(gather, mons, logger=LOG, grace=CONNECT_TIMEOUT + 5)
+            if mon is None:
                 LOG.error("Failed to connect to host:%s" ,', '.join(args.mon))
                 raise RuntimeError('Failed to connect any mon')
+            LOG.info("Gathered keys from %s", mon)
+            keys_dir = mon_dirs[mon]
             had_error = False
             date_string = time.strftime("%Y%m%d%H%M%S")
             for keytype in ["admin", "mds", "mgr", "mon", "osd", "rgw"]:
                 filename = keytype_path_to(args, keytype)
-                tmp_path = os.path.join(tmpd, filename)
+                tmp_path = os.path.join(keys_dir, filename)
                 if not os.path.exists(tmp_path):
                     LOG.error("No key retrived for '%s'" , keytype)
                     had_error = True
@@ -263,7 +359,8 @@ def gatherkeys(args):
                 raise RuntimeError('Failed to get all key types')
         finally:
             LOG.info("Destroy temp directory %s" %(tmpd))
-            shutil.rmtree(tmpd)
+            # a mon that outlived the grace period may still be writing
+            shutil.rmtree(tmpd, ignore_errors=True)
     finally:
         os.umask(oldmask)
 
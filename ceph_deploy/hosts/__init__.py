@@ -5,8 +5,9 @@ that remote host and set all the special cases for running commands depending
 on the type of distribution/version we are dealing with.
 """
 import logging
+import types
 from ceph_deploy import exc
-from ceph_deploy.util import versions
+from ceph_deploy.util import facts, versions
 from ceph_deploy.hosts import debian, centos, fedora, suse, remotes, rhel, arch
 from ceph_deploy.connection import get_connection
 
@@ -25,6 +26,10 @@ def get(hostname,
     information, then return the appropriate module and slap a few attributes
     to that module defining the information it found from the hostname.
 
+    When facts caching is enabled (see :mod:`ceph_deploy.util.facts`) the
+    information comes from the cache if it is fresh enough, and only the
+    connection is made.
+
     For example, if host ``node1.example.com`` is an Ubuntu server, the
     ``debian`` module would be returned and the following would be set::
 
@@ -53,15 +58,56 @@ def get(hostname,
     except IOError as error:
         if 'already closed' in getattr(error, 'message', ''):
             raise RuntimeError('remote connection got closed, ensure ``requiretty`` is disabled for %s' % hostname)
-    distro_name, release, codename = conn.remote_module.platform_information()
+    host_facts = facts.load(hostname)
+    if host_facts is None:
+        distro_name, release, codename = conn.remote_module.platform_information()
+        check_platform(distro_name, release, codename)
+        machine_type = conn.remote_module.machine_type()
+    else:
+        distro_name = host_facts['name']
+        release = host_facts['release']
+        codename = host_facts['codename']
+        machine_type = host_facts['machine_type']
+
+    module = build(conn, distro_name, release, codename, machine_type, use_rhceph=use_rhceph)
+    if host_facts is None:
+        module.init = module.choose_init(module)
+        facts.save(hostname, {
+            'name': distro_name,
+            'release': release,
+            'codename': codename,
+            'machine_type': machine_type,
+            'init': module.init,
+        })
+    else:
+        module.init = host_facts['init']
+    module.packager = module.get_packager(module)
+    # execute each callback if any
+    if callbacks:
+        for c in callbacks:
+            c(module)
+    return module
+
+
+def check_platform(distro_name, release, codename):
+    """
+    Raise ``UnsupportedPlatform`` if there is no distro module for what
+    ``platform_information`` found on a host.
+    """
     if not codename or not _get_distro(distro_name):
         raise exc.UnsupportedPlatform(
             distro=distro_name,
             codename=codename,
             release=release)
 
-    machine_type = conn.remote_module.machine_type()
-    module = _get_distro(distro_name, use_rhceph=use_rhceph)
+
+def build(conn, distro_name, release, codename, machine_type, use_rhceph=False):
+    """
+    Return the distro module for a host, with its connection and the
+    information found about it set, except for its init system and packager
+    which need to ask the host.
+    """
+    module = _host_module(_get_distro(distro_name, use_rhceph=use_rhceph))
     module.name = distro_name
     module.normalized_name = _normalized_distro_name(distro_name)
     module.normalized_release = _normalized_release(release)
@@ -75,15 +121,21 @@ def get(hostname,
     module.codename = codename
     module.conn = conn
     module.machine_type = machine_type
-    module.init = module.choose_init(module)
-    module.packager = module.get_packager(module)
-    # execute each callback if any
-    if callbacks:
-        for c in callbacks:
-            c(module)
     return module
 
 
+def _host_module(module):
+    """
+    Return a copy of a distro ``module`` that can hold the attributes of a
+    single host. Setting them on the shared module itself would make hosts
+    that are worked on concurrently overwrite each other's connection and
+    distro information.
+    """
+    host_module = types.ModuleType(module.__name__, module.__doc__)
+    host_module.__dict__.update(module.__dict__)
+    return host_module
+
+
 def _get_distro(distro, fallback=None, use_rhceph=False):
     if not distro:
         return
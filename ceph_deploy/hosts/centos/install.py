@@ -8,6 +8,9 @@ from ceph_deploy.util import net
 
 LOG = logging.getLogger(__name__)
 NON_SPLIT_PACKAGES = ['ceph-osd', 'ceph-mon', 'ceph-mds']
+# ids of the repos in ceph.repo, lowercase for Emperor and older
+CEPH_REPOS = ['Ceph*', 'ceph*']
+UPSTREAM = 'https://download.ceph.com/'
 
 
 def rpm_dist(distro):
@@ -41,6 +44,18 @@ def repository_url_part(distro):
     return 'el6'
 
 
+def expire_changed(distro, digest, repos=CEPH_REPOS, filename='ceph.repo'):
+    """
+    Instead of a ``clean all`` that makes every repo download its metadata
+    again (and drops packages fetched with ``install --prefetch``), only the
+    metadata of the ``repos`` written here is expired, and only when their
+    file is no longer the one with ``digest``.
+    """
+    if distro.packager.repo_digest(filename) != digest:
+        distro.conn.logger.info('%s changed, expiring its metadata', filename)
+        distro.packager.expire(repos)
+
+
 def install(distro, version_kind, version, adjust_repos, **kw):
     packages = map_components(
         NON_SPLIT_PACKAGES,
@@ -48,19 +63,18 @@ def install(distro, version_kind, version, adjust_repos, **kw):
     )
 
     gpgcheck = kw.pop('gpgcheck', 1)
+    # maps upstream urls to the ones of the package cache, see install --cache
+    cache_url = kw.pop('cache_url', None)
+    through_cache = cache_url or (lambda url: url)
     logger = distro.conn.logger
     machine = distro.machine_type
     repo_part = repository_url_part(distro)
     dist = rpm_dist(distro)
 
-    distro.packager.clean()
-
-    # Get EPEL installed before we continue:
+    # Get EPEL installed before we continue, along with the ceph-release
+    # package when there is one, all in a single transaction
     if adjust_repos:
-        distro.packager.install('epel-release')
-        distro.packager.install('yum-plugin-priorities')
-        distro.conn.remote_module.enable_yum_priority_obsoletes()
-        logger.warning('check_obsoletes has been enabled for Yum priorities plugin')
+        distro.packager.plan(['epel-release', 'yum-plugin-priorities'], repo=True)
     if version_kind in ['stable', 'testing']:
         key = 'release'
     else:
@@ -68,15 +82,17 @@ def install(distro, version_kind, version, adjust_repos, **kw):
 
     if adjust_repos:
         if version_kind in ['stable', 'testing']:
-            distro.packager.add_repo_gpg_key(gpg.url(key))
+            digest = distro.packager.repo_digest()
+            distro.packager.add_repo_gpg_key(through_cache(gpg.url(key)))
 
             if version_kind == 'stable':
-                url = 'https://download.ceph.com/rpm-{version}/{repo}/'.format(
+                url = '{upstream}rpm-{version}/{repo}/'.format(
+                    upstream=UPSTREAM,
                     version=version,
                     repo=repo_part,
                     )
             elif version_kind == 'testing':
-                url = 'https://download.ceph.com/rpm-testing/{repo}/'.format(repo=repo_part)
+                url = '{upstream}rpm-testing/{repo}/'.format(upstream=UPSTREAM, repo=repo_part)
 
             # remove any old ceph-release package from prevoius release
             remoto.process.run(
@@ -88,17 +104,25 @@ def install(distro, version_kind, version, adjust_repos, **kw):
                     'ceph-release'
                 ],
             )
-            remoto.process.run(
-                distro.conn,
-                [
-                    'yum',
-                    'install',
-                    '-y',
-                    '{url}noarch/ceph-release-1-0.{dist}.noarch.rpm'.format(url=url, dist=dist),
-                ],
+            distro.packager.plan(
+                through_cache('{url}noarch/ceph-release-1-0.{dist}.noarch.rpm'.format(url=url, dist=dist)),
+                repo=True,
             )
+            distro.packager.commit()
+            if cache_url:
+                # the repo file of ceph-release points upstream
+                distro.conn.remote_module.replace_in_file(
+                    '/etc/yum.repos.d/ceph.repo',
+                    UPSTREAM,
+                    cache_url(UPSTREAM),
+                )
+            distro.conn.remote_module.enable_yum_priority_obsoletes()
+            logger.warning('check_obsoletes has been enabled for Yum priorities plugin')
 
         elif version_kind in ['dev', 'dev_commit']:
+            distro.packager.commit()
+            distro.conn.remote_module.enable_yum_priority_obsoletes()
+            logger.warning('check_obsoletes has been enabled for Yum priorities plugin')
             logger.info('skipping install of ceph-release package')
             logger.info('repo file will be created manually')
             shaman_url = 'https://shaman.ceph.com/api/repos/ceph/{version}/{sha1}/{distro}/{distro_version}/repo/?arch={arch}'.format(
@@ -127,9 +151,13 @@ def install(distro, version_kind, version, adjust_repos, **kw):
         logger.warning('ensuring that /etc/yum.repos.d/ceph.repo contains a high priority')
         distro.conn.remote_module.set_repo_priority(['Ceph', 'Ceph-noarch', 'ceph-source'])
         logger.warning('altered ceph.repo priorities to contain: priority=1')
+        # mirror_install takes care of the repo file of dev builds
+        if version_kind in ['stable', 'testing']:
+            expire_changed(distro, digest)
 
     if packages:
-        distro.packager.install(packages)
+        distro.packager.plan(packages)
+    distro.packager.commit()
 
 
 def mirror_install(distro, repo_url, gpg_url, adjust_repos, extra_installs=True, **kw):
@@ -140,9 +168,8 @@ def mirror_install(distro, repo_url, gpg_url, adjust_repos, extra_installs=True,
     repo_url = repo_url.strip('/')  # Remove trailing slashes
     gpgcheck = kw.pop('gpgcheck', 1)
 
-    distro.packager.clean()
-
     if adjust_repos:
+        digest = distro.packager.repo_digest()
         if gpg_url:
             distro.packager.add_repo_gpg_key(gpg_url)
 
@@ -156,13 +183,15 @@ def mirror_install(distro, repo_url, gpg_url, adjust_repos, extra_installs=True,
         distro.conn.remote_module.write_yum_repo(content)
         # set the right priority
         if distro.packager.name == 'yum':
-            distro.packager.install('yum-plugin-priorities')
+            distro.packager.plan('yum-plugin-priorities', repo=True)
         distro.conn.remote_module.set_repo_priority(['Ceph', 'Ceph-noarch', 'ceph-source'])
         distro.conn.logger.warning('altered ceph.repo priorities to contain: priority=1')
+        expire_changed(distro, digest)
 
 
     if extra_installs and packages:
-        distro.packager.install(packages)
+        distro.packager.plan(packages)
+    distro.packager.commit()
 
 
 def repo_install(distro, reponame, baseurl, gpgkey, **kw):
@@ -179,8 +208,9 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
     proxy = kw.pop('proxy', '') # will get ignored if empty
     _type = 'repo-md'
     baseurl = baseurl.strip('/')  # Remove trailing slashes
+    repo_file = '%s.repo' % reponame
 
-    distro.packager.clean()
+    digest = distro.packager.repo_digest(repo_file)
 
     if gpgkey:
         distro.packager.add_repo_gpg_key(gpgkey)
@@ -199,7 +229,7 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
 
     distro.conn.remote_module.write_yum_repo(
         repo_content,
-        "%s.repo" % reponame
+        repo_file
     )
 
     repo_path = '/etc/yum.repos.d/{reponame}.repo'.format(reponame=reponame)
@@ -207,13 +237,15 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
     # set the right priority
     if kw.get('priority'):
         if distro.packager.name == 'yum':
-            distro.packager.install('yum-plugin-priorities')
+            distro.packager.plan('yum-plugin-priorities', repo=True)
 
         distro.conn.remote_module.set_repo_priority([reponame], repo_path)
         logger.warning('altered {reponame}.repo priorities to contain: priority=1'.format(
             reponame=reponame)
         )
+    expire_changed(distro, digest, [reponame], repo_file)
 
     # Some custom repos do not need to install ceph
     if install_ceph and packages:
-        distro.packager.install(packages)
+        distro.packager.plan(packages)
+    distro.packager.commit()
@@ -12,6 +12,8 @@ LOG = logging.getLogger(__name__)
 
 def install(distro, version_kind, version, adjust_repos, **kw):
     packages = kw.pop('components', [])
+    # maps upstream urls to the ones of the package cache, see install --cache
+    through_cache = kw.pop('cache_url', None) or (lambda url: url)
     codename = distro.codename
     machine = distro.machine_type
     extra_install_flags = []
@@ -22,7 +24,8 @@ def install(distro, version_kind, version, adjust_repos, **kw):
         key = 'autobuild'
 
     distro.packager.clean()
-    distro.packager.install(['ca-certificates', 'apt-transport-https'])
+    distro.packager.plan(['ca-certificates', 'apt-transport-https'], repo=True)
+    distro.packager.commit()
 
     if adjust_repos:
         # Wheezy does not like the download.ceph.com SSL cert
@@ -47,7 +50,7 @@ def install(distro, version_kind, version, adjust_repos, **kw):
             distro.conn.remote_module.write_sources_list_content(content)
             extra_install_flags = ['-o', 'Dpkg::Options::=--force-confnew', '--allow-unauthenticated']
         else:
-            distro.packager.add_repo_gpg_key(gpg.url(key, protocol=protocol))
+            distro.packager.add_repo_gpg_key(through_cache(gpg.url(key, protocol=protocol)))
             if version_kind == 'stable':
                 url = '{protocol}://download.ceph.com/debian-{version}/'.format(
                     protocol=protocol,
@@ -59,6 +62,7 @@ def install(distro, version_kind, version, adjust_repos, **kw):
                     )
             else:
                 raise RuntimeError('Unknown version kind: %r' % version_kind)
+            url = through_cache(url)
 
             # set the repo priority for the right domain
             fqdn = urlparse(url).hostname
@@ -1,5 +1,5 @@
 from ceph_deploy.lib import remoto
-from ceph_deploy.hosts.centos.install import repo_install, mirror_install  # noqa
+from ceph_deploy.hosts.centos.install import repo_install, mirror_install, UPSTREAM  # noqa
 from ceph_deploy.util.paths import gpg
 from ceph_deploy.hosts.common import map_components
 
@@ -13,6 +13,9 @@ def install(distro, version_kind, version, adjust_repos, **kw):
         kw.pop('components', [])
     )
     gpgcheck = kw.pop('gpgcheck', 1)
+    # maps upstream urls to the ones of the package cache, see install --cache
+    cache_url = kw.pop('cache_url', None)
+    through_cache = cache_url or (lambda url: url)
 
     logger = distro.conn.logger
     release = distro.release
@@ -25,21 +28,24 @@ def install(distro, version_kind, version, adjust_repos, **kw):
 
     if adjust_repos:
         if distro.packager.name == 'yum':
-            distro.packager.install('yum-plugin-priorities')
+            distro.packager.plan('yum-plugin-priorities', repo=True)
+            distro.packager.commit()
             # haven't been able to determine necessity of check_obsoletes with DNF
             distro.conn.remote_module.enable_yum_priority_obsoletes()
             logger.warning('check_obsoletes has been enabled for Yum priorities plugin')
 
         if version_kind in ['stable', 'testing']:
-            distro.packager.add_repo_gpg_key(gpg.url(key))
+            distro.packager.add_repo_gpg_key(through_cache(gpg.url(key)))
 
             if version_kind == 'stable':
-                url = 'https://download.ceph.com/rpm-{version}/fc{release}/'.format(
+                url = '{upstream}rpm-{version}/fc{release}/'.format(
+                    upstream=UPSTREAM,
                     version=version,
                     release=release,
                     )
             elif version_kind == 'testing':
-                url = 'https://download.ceph.com/rpm-testing/fc{release}'.format(
+                url = '{upstream}rpm-testing/fc{release}'.format(
+                    upstream=UPSTREAM,
                     release=release,
                     )
 
@@ -51,12 +57,19 @@ def install(distro, version_kind, version, adjust_repos, **kw):
                     '--replacepkgs',
                     '--force',
                     '--quiet',
-                    '{url}noarch/ceph-release-1-0.fc{release}.noarch.rpm'.format(
+                    through_cache('{url}noarch/ceph-release-1-0.fc{release}.noarch.rpm'.format(
                         url=url,
                         release=release,
-                        ),
+                        )),
                 ]
             )
+            if cache_url:
+                # the repo file of ceph-release points upstream
+                distro.conn.remote_module.replace_in_file(
+                    '/etc/yum.repos.d/ceph.repo',
+                    UPSTREAM,
+                    cache_url(UPSTREAM),
+                )
 
             # set the right priority
             logger.warning('ensuring that /etc/yum.repos.d/ceph.repo contains a high priority')
@@ -3,12 +3,17 @@ try:
 except ImportError:
     import ConfigParser as configparser
 import errno
+import glob
+import hashlib
+import json
 import socket
 import os
 import shutil
+import stat
 import tempfile
 import platform
 import re
+import subprocess
 
 
 def platform_information(_linux_distribution=None):
@@ -151,7 +156,6 @@ def set_repo_priority(sections, path='/etc/yum.repos.d/ceph.repo', priority='1')
 def write_conf(cluster, conf, overwrite):
     """ write cluster configuration to /etc/ceph/{cluster}.conf """
     path = '/etc/ceph/{cluster}.conf'.format(cluster=cluster)
-    tmp_file = tempfile.NamedTemporaryFile('w', dir='/etc/ceph', delete=False)
     err_msg = 'config file %s exists with different content; use --overwrite-conf to overwrite' % path
 
     if os.path.exists(path):
@@ -159,6 +163,10 @@ def write_conf(cluster, conf, overwrite):
             old = f.read()
             if old != conf and not overwrite:
                 raise RuntimeError(err_msg)
+        if old == conf:
+            # nothing changed, don't touch the file
+            return
+        tmp_file = tempfile.NamedTemporaryFile('w', dir='/etc/ceph', delete=False)
         tmp_file.write(conf)
         tmp_file.close()
         shutil.move(tmp_file.name, path)
@@ -214,6 +222,18 @@ def append_to_file(file_path, contents):
     with open(file_path, 'a') as f:
         f.write(contents)
 
+
+def replace_in_file(path, old, new):
+    """replace every occurrence of old with new in a file"""
+    with open(path) as f:
+        content = f.read()
+    if old not in content:
+        return False
+    with open(path, 'w') as f:
+        f.write(content.replace(old, new))
+    return True
+
+
 def path_getuid(path):
     return os.stat(path).st_uid
 
@@ -273,6 +293,17 @@ def write_file(path, content, mode=0o644, directory=None, uid=-1, gid=-1):
     os.chown(path, uid, gid)
 
 
+def file_digest(path, mode=None):
+    """sha256 digest of a file, None if it is missing or has another mode"""
+    try:
+        if mode is not None and os.stat(path).st_mode & 0o7777 != mode:
+            return None
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (IOError, OSError):
+        return None
+
+
 def touch_file(path):
     with open(path, 'wb') as f:  # noqa
         pass
@@ -405,6 +436,283 @@ def enable_yum_priority_obsoletes(path="/etc/yum/pluginconf.d/priorities.conf"):
         config.write(fout)
 
 
+def expand_devices(patterns):
+    """expand device glob patterns"""
+    # patterns without wildcards (like a vg/lv) are kept as-is, the rest are
+    # replaced with the existing paths they match, without duplicates
+    devices = []
+    for pattern in patterns:
+        if any(c in pattern for c in '*?['):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        for device in matches:
+            if device not in devices:
+                devices.append(device)
+    return devices
+
+
+def rotational(paths):
+    """tell which devices are rotational"""
+    # maps every path to True or False, or None when it is not a block
+    # device (like a vg/lv name) or the kernel does not say. Partitions get
+    # the value of the disk they are on
+    result = {}
+    for path in paths:
+        result[path] = None
+        try:
+            device = os.path.realpath(path)
+            if not stat.S_ISBLK(os.stat(device).st_mode):
+                continue
+            sys_path = os.path.realpath(
+                os.path.join('/sys/class/block', os.path.basename(device))
+            )
+            if os.path.exists(os.path.join(sys_path, 'partition')):
+                sys_path = os.path.dirname(sys_path)
+            with open(os.path.join(sys_path, 'queue', 'rotational')) as f:
+                result[path] = f.read().strip() == '1'
+        except (IOError, OSError):
+            pass
+    return result
+
+
+def holders(paths):
+    """tell what holds each device"""
+    # maps every path to the names of what holds it (device mapper or md
+    # devices, LVM volumes included) or any of its partitions, or to None
+    # when it is not a block device or the kernel does not say
+    result = {}
+    for path in paths:
+        result[path] = None
+        try:
+            device = os.path.realpath(path)
+            if not stat.S_ISBLK(os.stat(device).st_mode):
+                continue
+            sys_path = os.path.realpath(
+                os.path.join('/sys/class/block', os.path.basename(device))
+            )
+            sys_paths = [sys_path] + [
+                os.path.join(sys_path, name) for name in sorted(os.listdir(sys_path))
+                if os.path.exists(os.path.join(sys_path, name, 'partition'))
+            ]
+            found = []
+            for sys_path in sys_paths:
+                found.extend(sorted(os.listdir(os.path.join(sys_path, 'holders'))))
+            result[path] = found
+        except (IOError, OSError):
+            pass
+    return result
+
+
+def _mount_table(mountinfo='/proc/self/mountinfo', swaps='/proc/swaps'):
+    """where the block devices are mounted, as found in procfs"""
+    # maps both the major:minor number and the kernel name of every mounted
+    # device to its mount points, the number alone misses btrfs and the name
+    # alone misses /dev/root. Active swap shows up as [SWAP]
+    table = {}
+    with open(mountinfo) as f:
+        for line in f:
+            fields = line.split()
+            if '-' not in fields[6:]:
+                continue
+            source = fields[fields.index('-', 6) + 2]
+            mount_point = fields[4].replace('\\040', ' ')
+            table.setdefault(fields[2], []).append(mount_point)
+            if source.startswith('/dev/'):
+                name = os.path.basename(os.path.realpath(source))
+                table.setdefault(name, []).append(mount_point)
+    try:
+        with open(swaps) as f:
+            for line in f.readlines()[1:]:
+                fields = line.split()
+                if fields and fields[0].startswith('/dev/'):
+                    name = os.path.basename(os.path.realpath(fields[0]))
+                    table.setdefault(name, []).append('[SWAP]')
+    except (IOError, OSError):
+        pass
+    return table
+
+
+def mounts(paths):
+    """tell where each device is mounted"""
+    # maps every path to the mount points of it or any of its partitions, or
+    # to None when it is not a block device or the mounts can't be read
+    result = dict((path, None) for path in paths)
+    try:
+        table = _mount_table()
+    except (IOError, OSError):
+        return result
+    for path in paths:
+        try:
+            device = os.path.realpath(path)
+            if not stat.S_ISBLK(os.stat(device).st_mode):
+                continue
+            sys_path = os.path.realpath(
+                os.path.join('/sys/class/block', os.path.basename(device))
+            )
+            sys_paths = [sys_path] + [
+                os.path.join(sys_path, name) for name in sorted(os.listdir(sys_path))
+                if os.path.exists(os.path.join(sys_path, name, 'partition'))
+            ]
+            found = []
+            for sys_path in sys_paths:
+                with open(os.path.join(sys_path, 'dev')) as f:
+                    number = f.read().strip()
+                for key in (number, os.path.basename(sys_path)):
+                    for mount_point in table.get(key, []):
+                        if mount_point not in found:
+                            found.append(mount_point)
+            result[path] = found
+        except (IOError, OSError):
+            pass
+    return result
+
+
+def _ipv4_netmask(prefixlen):
+    """dotted netmask for an IPv4 prefix length"""
+    mask = (0xffffffff << (32 - int(prefixlen))) & 0xffffffff
+    return '.'.join(str((mask >> shift) & 0xff) for shift in (24, 16, 8, 0))
+
+
+def _sys_class_net(path='/sys/class/net'):
+    """link state of every interface, as found in sysfs"""
+    links = {}
+    for name in os.listdir(path):
+        link = {}
+        try:
+            with open(os.path.join(path, name, 'flags')) as f:
+                # IFF_UP
+                link['up'] = bool(int(f.read().strip(), 16) & 0x1)
+        except (IOError, OSError, ValueError):
+            pass
+        try:
+            with open(os.path.join(path, name, 'address')) as f:
+                hwaddr = f.read().strip()
+            if hwaddr:
+                link['hwaddr'] = hwaddr
+        except (IOError, OSError):
+            pass
+        links[name] = link
+    return links
+
+
+def _ip_json(entries, links):
+    """interfaces from the output of ``ip -json addr``, on top of ``links``"""
+    ifaces = {}
+    for entry in entries:
+        name = entry.get('ifname')
+        if not name:
+            continue
+        data = dict(links.get(name, {}))
+        if 'up' not in data:
+            data['up'] = 'UP' in entry.get('flags', [])
+        if 'hwaddr' not in data and entry.get('address'):
+            data['hwaddr'] = entry['address']
+        if entry.get('link'):
+            data['parent'] = entry['link']
+        for info in entry.get('addr_info', []):
+            family = info.get('family')
+            address = info.get('local')
+            if family not in ('inet', 'inet6') or not address:
+                continue
+            prefixlen = info.get('prefixlen', 32 if family == 'inet' else 128)
+            if info.get('secondary'):
+                data.setdefault('secondary', []).append({
+                    'type': family,
+                    'address': address,
+                    'netmask': _ipv4_netmask(prefixlen) if family == 'inet' else str(prefixlen),
+                    'broadcast': info.get('broadcast'),
+                    'label': info.get('label', name),
+                })
+            elif family == 'inet':
+                data.setdefault('inet', []).append({
+                    'address': address,
+                    'netmask': _ipv4_netmask(prefixlen),
+                    'broadcast': info.get('broadcast'),
+                    'label': info.get('label', name),
+                })
+            else:
+                data.setdefault('inet6', []).append({
+                    'address': address,
+                    'prefixlen': str(prefixlen),
+                })
+        ifaces[name] = data
+    return ifaces
+
+
+def _output(command):
+    """stdout of a command, None if it could not run or failed"""
+    try:
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        out, _ = process.communicate()
+    except OSError:
+        return None
+    if process.returncode != 0:
+        return None
+    return out.decode('utf-8', 'replace')
+
+
+def interfaces():
+    """describe the network interfaces"""
+    # returns a ``(format, result)`` tuple: ``('json', interfaces)`` when
+    # ``ip`` can output JSON, otherwise the text output of ``ip addr show``
+    # (or ``ifconfig -a``) for the caller to parse, and ``(None, None)``
+    # when neither is available
+    try:
+        links = _sys_class_net()
+    except OSError:
+        links = {}
+    ip_path = which('ip')
+    if ip_path:
+        out = _output([ip_path, '-json', 'addr', 'show'])
+        if out:
+            try:
+                return 'json', _ip_json(json.loads(out), links)
+            except ValueError:
+                pass
+        out = _output([ip_path, 'addr', 'show'])
+        if out is not None:
+            return 'ip', out
+    ifconfig_path = which('ifconfig')
+    if ifconfig_path:
+        out = _output([ifconfig_path, '-a'])
+        if out is not None:
+            return 'ifconfig', out
+    return None, None
+
+
+def inventory():
+    """describe the disks"""
+    # returns a ``(format, output)`` tuple: the JSON output of ``ceph-volume
+    # inventory`` when it is installed, otherwise the one of ``lsblk``, and
+    # ``(None, None)`` when neither could run
+    ceph_volume = which('ceph-volume')
+    if ceph_volume:
+        out = _output([ceph_volume, 'inventory', '--format', 'json'])
+        if out:
+            return 'ceph-volume', out
+    lsblk = which('lsblk')
+    if lsblk:
+        out = _output([
+            lsblk, '--json', '--bytes',
+            '--output', 'NAME,SIZE,ROTA,MODEL,TYPE,MOUNTPOINT,FSTYPE',
+        ])
+        if out:
+            return 'lsblk', out
+    return None, None
+
+
+def run_batch(calls):
+    """run a batch of remote calls"""
+    # every call is a ``(function name, arguments)`` tuple, results are sent
+    # back together and in order
+    return [globals()[name](*arguments) for name, arguments in calls]
+
+
 # remoto magic, needed to execute these functions remotely
 if __name__ == '__channelexec__':
     for item in channel:  # noqa
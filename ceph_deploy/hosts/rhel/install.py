@@ -1,9 +1,9 @@
 from ceph_deploy.util import templates
+from ceph_deploy.hosts.centos.install import expire_changed
 
 
 def install(distro, version_kind, version, adjust_repos, **kw):
     packages = kw.get('components', [])
-    distro.packager.clean()
     distro.packager.install(packages)
 
 
@@ -13,9 +13,8 @@ def mirror_install(distro, repo_url,
     repo_url = repo_url.strip('/')  # Remove trailing slashes
     gpgcheck = kw.pop('gpgcheck', 1)
 
-    distro.packager.clean()
-
     if adjust_repos:
+        digest = distro.packager.repo_digest()
         distro.packager.add_repo_gpg_key(gpg_url)
 
         ceph_repo_content = templates.ceph_repo.format(
@@ -25,6 +24,7 @@ def mirror_install(distro, repo_url,
         )
 
         distro.conn.remote_module.write_yum_repo(ceph_repo_content)
+        expire_changed(distro, digest)
 
     if extra_installs and packages:
         distro.packager.install(packages)
@@ -43,8 +43,9 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
     proxy = kw.pop('proxy', '') # will get ignored if empty
     _type = 'repo-md'
     baseurl = baseurl.strip('/')  # Remove trailing slashes
+    repo_file = '%s.repo' % reponame
 
-    distro.packager.clean()
+    digest = distro.packager.repo_digest(repo_file)
 
     if gpgkey:
         distro.packager.add_repo_gpg_key(gpgkey)
@@ -63,8 +64,9 @@ def repo_install(distro, reponame, baseurl, gpgkey, **kw):
 
     distro.conn.remote_module.write_yum_repo(
         repo_content,
-        "%s.repo" % reponame
+        repo_file
     )
+    expire_changed(distro, digest, [reponame], repo_file)
 
     # Some custom repos do not need to install ceph
     if install_ceph and packages:
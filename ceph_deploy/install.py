@@ -1,12 +1,16 @@
 import argparse
+import functools
 import logging
 import os
+import socket
 
-from ceph_deploy import hosts
+from ceph_deploy import exc, hosts
 from ceph_deploy.cliutil import priority
 from ceph_deploy.lib import remoto
+from ceph_deploy.util import cache, facts, mirror, packages, parallel
 from ceph_deploy.util.constants import default_components
 from ceph_deploy.util.paths import gpg
+from ceph_deploy.hosts.centos.install import repository_url_part
 
 LOG = logging.getLogger(__name__)
 
@@ -117,7 +121,21 @@ def install(args):
         ' '.join(args.host),
     )
 
-    for hostname in args.host:
+    package_cache = None
+    # the address of this node each host reaches the cache on
+    cache_addresses = {}
+    if args.cache and not args.local_mirror:
+        for hostname in args.host:
+            try:
+                cache_addresses[hostname] = cache.local_address(hostname)
+            except socket.error as error:
+                LOG.warning('not using the package cache for %s: %s', hostname, error)
+        package_cache = cache.Cache(
+            port=args.cache_port,
+            addresses=set(cache_addresses.values()),
+        )
+
+    def install_host(hostname):
         LOG.debug('Detecting platform for host %s ...', hostname)
         distro = hosts.get(
             hostname,
@@ -145,10 +163,25 @@ def install(args):
                 )
             )
             LOG.error('custom cluster names are not supported on sysvinit hosts')
-            continue
+            return
 
         rlogger = logging.getLogger(hostname)
-        rlogger.info('installing Ceph on %s' % hostname)
+
+        if release_installed(args, distro, components):
+            rlogger.info(
+                '%s is already installed on %s, skipping',
+                args.release,
+                hostname,
+            )
+            distro.conn.exit()
+            return
+
+        if args.prefetch:
+            # set up the repositories, but only download the packages
+            rlogger.info('downloading Ceph packages on %s', hostname)
+            distro.packager.download_only = True
+        else:
+            rlogger.info('installing Ceph on %s' % hostname)
 
         cd_conf = getattr(args, 'cd_conf', None)
 
@@ -163,11 +196,29 @@ def install(args):
             gpg_url = gpg_fallback
 
         if args.local_mirror:
-            if args.username:
-                hostname = "%s@%s" % (args.username, hostname)
-            remoto.rsync(hostname, args.local_mirror, '/opt/ceph-deploy/repo', distro.conn.logger, sudo=True)
-            repo_url = 'file:///opt/ceph-deploy/repo'
-            gpg_url = 'file:///opt/ceph-deploy/repo/release.asc'
+            # synced to every host before installing, see mirror.sync
+            repo_url = 'file://%s' % mirror.DESTINATION
+            gpg_url = 'file://%s/release.asc' % mirror.DESTINATION
+
+        cache_url = None
+        if hostname in cache_addresses:
+            address = cache_addresses[hostname]
+            cache_url = functools.partial(package_cache.url, address=address)
+
+            if repo_url:
+                # installing from a repository url, which goes through the cache
+                rlogger.info('installing through the package cache on %s', address)
+                repo_url = cache_url(repo_url)
+                gpg_url = cache_url(gpg_url)
+            elif should_use_custom_repo(args, cd_conf, repo_url):
+                # custom_repo rewrites the urls of the configured repos
+                pass
+            elif upstream_repo_url(distro, args.version_kind, version):
+                # the regular install points the repos it sets up at the cache
+                rlogger.info('installing through the package cache on %s', address)
+            else:
+                rlogger.warning('no upstream repository to cache for %s, not using the cache', distro.name)
+                cache_url = None
 
         if repo_url:  # triggers using a custom repository
             # the user used a custom repo url, this should override anything
@@ -194,7 +245,7 @@ def install(args):
         # Detect and install custom repos here if needed
         elif should_use_custom_repo(args, cd_conf, repo_url):
             LOG.info('detected valid custom repositories from config file')
-            custom_repo(distro, args, cd_conf, rlogger)
+            custom_repo(distro, args, cd_conf, rlogger, cache_url=cache_url)
 
         else:  # otherwise a normal installation
             distro.install(
@@ -204,12 +255,111 @@ def install(args):
                 args.adjust_repos,
                 components=components,
                 gpgcheck = gpgcheck,
+                cache_url=cache_url,
                 args=args
             )
 
+        if args.prefetch:
+            distro.conn.exit()
+            return
+
         # Check the ceph version we just installed
         hosts.common.ceph_version(distro.conn)
         distro.conn.exit()
+        # the init system detection depends on what got installed
+        facts.forget(hostname)
+
+    if package_cache is not None:
+        package_cache.start()
+        package_cache.prefetch(cached_keys(args))
+    install_hosts = args.host
+    unsynced = []
+    if args.local_mirror:
+        unsynced = mirror.sync(
+            args.host,
+            args.local_mirror,
+            username=args.username,
+            jobs=args.mirror_jobs or args.jobs,
+            bwlimit=args.mirror_bwlimit,
+            fanout=args.mirror_fanout,
+            logger=LOG,
+        )
+        install_hosts = [hostname for hostname in args.host if hostname not in unsynced]
+    try:
+        errors = len(unsynced)
+        errors += parallel.execute(install_host, install_hosts, args.jobs, logger=LOG)
+    finally:
+        if package_cache is not None:
+            package_cache.stop()
+
+    if errors:
+        if args.prefetch:
+            raise exc.GenericError('Failed to download Ceph packages on %d hosts' % errors)
+        raise exc.GenericError('Failed to install Ceph on %d hosts' % errors)
+
+
+def upstream_repo_url(distro, version_kind, version):
+    """
+    The url of the upstream repository that a plain install of a stable or
+    testing release would set up on ``distro``, ``None`` when there is none
+    (packages come from the distro itself, or a development build).
+    """
+    if version_kind == 'stable':
+        rpm_repo = 'rpm-%s' % version
+        deb_repo = 'debian-%s' % version
+    elif version_kind == 'testing':
+        rpm_repo = 'rpm-testing'
+        deb_repo = 'debian-testing'
+    else:
+        return None
+
+    if distro.is_deb:
+        return 'https://download.ceph.com/%s/' % deb_repo
+    if distro.normalized_name == 'fedora':
+        return 'https://download.ceph.com/%s/fc%s/' % (rpm_repo, distro.release)
+    if distro.is_el:
+        return 'https://download.ceph.com/%s/%s/' % (rpm_repo, repository_url_part(distro))
+    return None
+
+
+def cached_keys(args):
+    """
+    The GPG keys hosts will ask the package cache for, so that it can get
+    them ahead of time.
+    """
+    cd_conf = getattr(args, 'cd_conf', None)
+    repo_url = os.environ.get('CEPH_DEPLOY_REPO_URL') or args.repo_url
+    if should_use_custom_repo(args, cd_conf, repo_url):
+        repo = cd_conf.get_default_repo()
+        if args.release in cd_conf.get_repos():
+            repo = args.release
+        sections = [repo] + cd_conf.get_list(repo, 'extra-repos')
+        return [
+            cd_conf.get(section, 'gpgkey') for section in sections
+            if cd_conf.has_option(section, 'gpgkey')
+        ]
+    return [os.environ.get('CEPH_DEPLOY_GPG_URL') or args.gpg_url or gpg.url('release')]
+
+
+def release_installed(args, distro, components):
+    """
+    Whether every component is already installed on the host from the
+    requested release, so that setting up repositories and running the
+    package manager can be skipped altogether. This is a single remote call.
+
+    Only named releases are checked, and a repository given on the command
+    line is always set up.
+    """
+    if args.version_kind != 'stable' or distro.is_pkgtarxz:
+        return False
+    if args.local_mirror or args.repo_url or os.environ.get('CEPH_DEPLOY_REPO_URL'):
+        return False
+    return packages.release_installed(
+        distro.conn,
+        components,
+        args.release,
+        distro.is_rpm,
+    )
 
 
 def should_use_custom_repo(args, cd_conf, repo_url):
@@ -229,7 +379,7 @@ def should_use_custom_repo(args, cd_conf, repo_url):
     return False
 
 
-def custom_repo(distro, args, cd_conf, rlogger, install_ceph=None):
+def custom_repo(distro, args, cd_conf, rlogger, install_ceph=None, cache_url=None):
     """
     A custom repo install helper that will go through config checks to retrieve
     repos (and any extra repos defined) and install those
@@ -237,7 +387,11 @@ def custom_repo(distro, args, cd_conf, rlogger, install_ceph=None):
     ``cd_conf`` is the object built from argparse that holds the flags and
     information needed to determine what metadata from the configuration to be
     used.
+
+    ``cache_url``, when given, maps the urls of the repos to the ones that go
+    through the package cache.
     """
+    cache_url = cache_url or (lambda url: url)
     default_repo = cd_conf.get_default_repo()
     components = detect_components(args, distro)
     if args.release in cd_conf.get_repos():
@@ -260,8 +414,8 @@ def custom_repo(distro, args, cd_conf, rlogger, install_ceph=None):
             distro.repo_install(
                 distro,
                 default_repo,
-                options.pop('baseurl'),
-                options.pop('gpgkey'),
+                cache_url(options.pop('baseurl')),
+                cache_url(options.pop('gpgkey')),
                 components=components,
                 **options
             )
@@ -275,8 +429,8 @@ def custom_repo(distro, args, cd_conf, rlogger, install_ceph=None):
                 distro.repo_install(
                     distro,
                     xrepo,
-                    options.pop('baseurl'),
-                    options.pop('gpgkey'),
+                    cache_url(options.pop('baseurl')),
+                    cache_url(options.pop('gpgkey')),
                     components=components,
                     **options
                 )
@@ -340,6 +494,7 @@ def remove(args, purge):
         rlogger.info('%s Ceph on %s' % (remove_action, hostname))
         distro.uninstall(distro, purge=purge)
         distro.conn.exit()
+        facts.forget(hostname)
 
 def uninstall(args):
     remove(args, False)
@@ -596,6 +751,53 @@ def make(parser):
         help='Fetch packages and push them to hosts for a local repo mirror',
     )
 
+    parser.add_argument(
+        '--mirror-jobs',
+        type=int,
+        default=None,
+        metavar='N',
+        help='sync --local-mirror to at most N hosts at the same time \
+                (default: the value of --jobs)',
+    )
+
+    parser.add_argument(
+        '--mirror-bwlimit',
+        type=int,
+        default=None,
+        metavar='KBPS',
+        help='cap the bandwidth of all the --local-mirror syncs together, \
+                in KiB/s (needs rsync on the hosts)',
+    )
+
+    parser.add_argument(
+        '--mirror-fanout',
+        action='store_true',
+        help='sync --local-mirror from hosts that already have it to the \
+                others (needs rsync on the hosts and ssh between them)',
+    )
+
+    parser.add_argument(
+        '--prefetch',
+        action='store_true',
+        help='set up the repositories and only download the packages, \
+                for a later install to use',
+    )
+
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='download packages and keys once, through a caching proxy \
+                that runs on this node while installing',
+    )
+
+    parser.add_argument(
+        '--cache-port',
+        type=int,
+        default=0,
+        metavar='PORT',
+        help='port for the caching proxy of --cache (default: any free port)',
+    )
+
     parser.add_argument(
         '--repo-url',
         nargs='?',
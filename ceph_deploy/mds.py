@@ -1,10 +1,11 @@
 import logging
 import os
+import threading
 
 from ceph_deploy import conf
 from ceph_deploy import exc
 from ceph_deploy import hosts
-from ceph_deploy.util import system
+from ceph_deploy.util import parallel, system
 from ceph_deploy.lib import remoto
 from ceph_deploy.cliutil import priority
 
@@ -64,8 +65,10 @@ def create_mds(distro, name, cluster, init):
         conn.logger.error('exit code from command was: %s' % returncode)
         raise RuntimeError('could not create mds')
 
-    conn.remote_module.touch_file(os.path.join(path, 'done'))
-    conn.remote_module.touch_file(os.path.join(path, init))
+    batch = conn.batch()
+    batch.touch_file(os.path.join(path, 'done'))
+    batch.touch_file(os.path.join(path, init))
+    batch.execute()
 
     if init == 'upstart':
         remoto.process.run(
@@ -134,12 +137,17 @@ def mds_create(args):
     key = get_bootstrap_mds_key(cluster=args.cluster)
 
     bootstrapped = set()
-    errors = 0
-    failed_on_rhel = False
+    # daemons sharing a host are bootstrapped only once, make sure they do not
+    # race each other when several hosts are worked on concurrently
+    bootstrap_locks = dict(
+        (hostname, threading.Lock()) for hostname, _ in args.mds
+    )
+    failed_on_rhel = []
 
-    for hostname, name in args.mds:
+    def create_daemon(host_and_name):
+        hostname, name = host_and_name
+        distro = None
         try:
-            distro = None
             distro = hosts.get(hostname, username=args.username)
             rlogger = distro.conn.logger
             LOG.info(
@@ -151,31 +159,37 @@ def mds_create(args):
 
             LOG.debug('remote host will use %s', distro.init)
 
-            if hostname not in bootstrapped:
-                bootstrapped.add(hostname)
-                LOG.debug('deploying mds bootstrap to %s', hostname)
-                distro.conn.remote_module.write_conf(
-                    args.cluster,
-                    conf_data,
-                    args.overwrite_conf,
-                )
-
-                path = '/var/lib/ceph/bootstrap-mds/{cluster}.keyring'.format(
-                    cluster=args.cluster,
-                )
-
-                if not distro.conn.remote_module.path_exists(path):
-                    rlogger.warning('mds keyring does not exist yet, creating one')
-                    distro.conn.remote_module.write_keyring(path, key)
+            with bootstrap_locks[hostname]:
+                if hostname not in bootstrapped:
+                    bootstrapped.add(hostname)
+                    LOG.debug('deploying mds bootstrap to %s', hostname)
+                    path = '/var/lib/ceph/bootstrap-mds/{cluster}.keyring'.format(
+                        cluster=args.cluster,
+                    )
+
+                    # write the configuration file and check for the keyring in one go
+                    batch = distro.conn.batch()
+                    batch.write_conf(
+                        args.cluster,
+                        conf_data,
+                        args.overwrite_conf,
+                    )
+                    batch.path_exists(path)
+                    _, keyring_exists = batch.execute()
+
+                    if not keyring_exists:
+                        rlogger.warning('mds keyring does not exist yet, creating one')
+                        distro.conn.remote_module.write_keyring(path, key)
 
             create_mds(distro, name, args.cluster, distro.init)
             distro.conn.exit()
-        except RuntimeError as e:
+        except RuntimeError:
             if distro and distro.normalized_name == 'redhat':
                 LOG.error('this feature may not yet available for %s %s' % (distro.name, distro.release))
-                failed_on_rhel = True
-            LOG.error(e)
-            errors += 1
+                failed_on_rhel.append(hostname)
+            raise
+
+    errors = parallel.execute(create_daemon, args.mds, args.jobs, logger=LOG)
 
     if errors:
         if failed_on_rhel:
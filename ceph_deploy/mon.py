@@ -7,7 +7,7 @@ import time
 from ceph_deploy import conf, exc, admin
 from ceph_deploy.cliutil import priority
 from ceph_deploy.util.help_formatters import ToggleRawTextHelpFormatter
-from ceph_deploy.util import paths, net, files, packages, system
+from ceph_deploy.util import paths, net, files, packages, parallel, system
 from ceph_deploy.lib import remoto
 from ceph_deploy.new import new_mon_keyring
 from ceph_deploy import hosts
@@ -410,43 +410,60 @@ def mon_destroy(args):
         raise exc.GenericError('Failed to destroy %d monitors' % errors)
 
 
-def mon_create_initial(args):
-    mon_initial_members = get_mon_initial_members(args, error_on_empty=True)
-
-    # create them normally through mon_create
-    args.mon = mon_initial_members
-    mon_create(args)
+def wait_for_quorum(args, mon_members, timeout=120, interval=1, max_interval=10):
+    """
+    Poll every monitor in ``mon_members`` at the same time until each of them
+    reports being in quorum (as ``leader`` or ``peon``), or until ``timeout``
+    seconds have passed overall. Polls start ``interval`` seconds apart and
+    back off up to ``max_interval`` seconds.
 
-    # make the sets to be able to compare late
-    mon_in_quorum = set([])
-    mon_members = set([host for host in mon_initial_members])
+    Returns the set of monitors that reached quorum.
+    """
+    deadline = time.time() + timeout
+    mon_in_quorum = set()
 
-    for host in mon_initial_members:
+    def watch(host):
         mon_name = 'mon.%s' % host
         LOG.info('processing monitor %s', mon_name)
-        sleeps = [20, 20, 15, 10, 10, 5]
-        tries = 5
         rlogger = logging.getLogger(host)
         distro = hosts.get(
             host,
             username=args.username,
             callbacks=[packages.ceph_is_installed]
         )
+        delay = interval
+        try:
+            while True:
+                status = mon_status_check(distro.conn, rlogger, host, args)
+                if status.get('state', '') in ['peon', 'leader']:
+                    mon_in_quorum.add(host)
+                    LOG.info('%s monitor has reached quorum!', mon_name)
+                    return
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    LOG.warning('%s monitor did not reach quorum within %s seconds', mon_name, timeout)
+                    return
+                delay = min(delay, remaining)
+                LOG.warning('%s monitor is not yet in quorum, retrying in %.1f seconds', mon_name, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, max_interval)
+        finally:
+            distro.conn.exit()
 
-        while tries:
-            status = mon_status_check(distro.conn, rlogger, host, args)
-            has_reached_quorum = status.get('state', '') in ['peon', 'leader']
-            if not has_reached_quorum:
-                LOG.warning('%s monitor is not yet in quorum, tries left: %s' % (mon_name, tries))
-                tries -= 1
-                sleep_seconds = sleeps.pop()
-                LOG.warning('waiting %s seconds before retrying', sleep_seconds)
-                time.sleep(sleep_seconds)  # Magic number
-            else:
-                mon_in_quorum.add(host)
-                LOG.info('%s monitor has reached quorum!', mon_name)
-                break
-        distro.conn.exit()
+    parallel.execute(watch, mon_members, jobs=len(mon_members), logger=LOG)
+    return mon_in_quorum
+
+
+def mon_create_initial(args):
+    mon_initial_members = get_mon_initial_members(args, error_on_empty=True)
+
+    # create them normally through mon_create
+    args.mon = mon_initial_members
+    mon_create(args)
+
+    # make the sets to be able to compare late
+    mon_members = set([host for host in mon_initial_members])
+    mon_in_quorum = wait_for_quorum(args, mon_initial_members)
 
     if mon_in_quorum == mon_members:
         LOG.info('all initial monitors are running and have formed quorum')
@@ -6,10 +6,11 @@ import struct
 import time
 import base64
 import socket
+import threading
 
 from ceph_deploy.cliutil import priority
 from ceph_deploy import conf, hosts, exc
-from ceph_deploy.util import arg_validators, ssh, net
+from ceph_deploy.util import arg_validators, ssh, net, parallel
 from ceph_deploy.misc import mon_hosts
 from ceph_deploy.lib import remoto
 from ceph_deploy.connection import get_local_connection
@@ -17,6 +18,8 @@ from ceph_deploy.connection import get_local_connection
 
 LOG = logging.getLogger(__name__)
 
+_prompt_lock = threading.Lock()
+
 
 def generate_auth_key():
     key = os.urandom(16)
@@ -37,6 +40,12 @@ def ssh_copy_keys(hostname, username=None):
 
     LOG.warning('could not connect via SSH')
 
+    # with --jobs, other hosts may be prompting for a password too
+    with _prompt_lock:
+        _copy_keys(hostname, username)
+
+
+def _copy_keys(hostname, username=None):
     # Create the key if it doesn't exist:
     id_rsa_pub_file = os.path.expanduser(u'~/.ssh/id_rsa.pub')
     id_rsa_file = id_rsa_pub_file.split('.pub')[0]
@@ -78,26 +87,20 @@ def ssh_copy_keys(hostname, username=None):
 def validate_host_ip(ips, subnets):
     """
     Make sure that a given host all subnets specified will have at least one IP
-    in that range.
+    in that range. Every subnet may be a comma separated list of networks, of
+    which any one will do.
     """
     # Make sure we prune ``None`` arguments
     subnets = [s for s in subnets if s is not None]
-    validate_one_subnet = len(subnets) == 1
-
-    def ip_in_one_subnet(ips, subnet):
-        """ ensure an ip exists in at least one subnet """
-        for ip in ips:
-            if net.ip_in_subnet(ip, subnet):
-                return True
-        return False
-
-    for subnet in subnets:
-        if ip_in_one_subnet(ips, subnet):
-            if validate_one_subnet:
-                return
-            else:  # keep going to make sure the other subnets are ok
-                continue
-        else:
+    table = net.SubnetTable(**dict(
+        (str(index), subnet) for index, subnet in enumerate(subnets)
+    ))
+    matched = set()
+    for names in table.classify(ips).values():
+        matched.update(names)
+
+    for index, subnet in enumerate(subnets):
+        if str(index) not in matched:
             msg = "subnet (%s) is not valid for any of the ips found %s" % (subnet, str(ips))
             raise RuntimeError(msg)
 
@@ -107,13 +110,52 @@ def get_public_network_ip(ips, public_subnet):
     Given a public subnet, chose the one IP from the remote host that exists
     within the subnet range.
     """
+    table = net.SubnetTable(public=public_subnet)
     for ip in ips:
-        if net.ip_in_subnet(ip, public_subnet):
+        if table.match(ip):
             return ip
     msg = "IPs (%s) are not valid for any of subnet specified %s" % (str(ips), str(public_subnet))
     raise RuntimeError(msg)
 
 
+def check_networks(host_ips, public_network=None, cluster_network=None):
+    """
+    Validate the addresses of every host against the public and cluster
+    networks in one pass, and return the public address of every host in
+    ``host_ips`` (a dictionary of hostnames and their addresses), ``None``
+    when there is no public network to pick it from.
+
+    All the hosts that are missing a network are reported together.
+    """
+    table = net.SubnetTable(public=public_network, cluster=cluster_network)
+    required = [name for name, networks in table.groups.items() if networks]
+    public_ips = {}
+    failed = set()
+    for host, ips in host_ips.items():
+        classified = table.classify(ips)
+        public_ips[host] = None
+        for ip in ips:
+            if 'public' in classified[ip]:
+                public_ips[host] = ip
+                break
+        for name in sorted(required):
+            if not any(name in names for names in classified.values()):
+                failed.add(host)
+                LOG.error(
+                    'host %s has no address in the %s network (%s), found: %s',
+                    host,
+                    name,
+                    ','.join(str(network) for network in table.groups[name]),
+                    ', '.join(ips) or 'none',
+                )
+    if failed:
+        raise RuntimeError(
+            '%d hosts do not match the network layout: %s' % (
+                len(failed), ', '.join(sorted(failed)))
+        )
+    return public_ips
+
+
 def new(args):
     if args.ceph_conf:
         raise RuntimeError('will not create a Ceph conf file if attemtping to re-use with `--ceph-conf` flag')
@@ -135,14 +177,19 @@ def new(args):
     mon_initial_members = []
     mon_host = []
 
-    for (name, host) in mon_hosts(args.mon):
+    mons = list(mon_hosts(args.mon))
+    host_ips = {}
+    resolver = net.Resolver()
+
+    def discover(mon):
+        name, host = mon
         # Try to ensure we can ssh in properly before anything else
         if args.ssh_copykey:
             ssh_copy_keys(host, args.username)
 
         # Now get the non-local IPs from the remote node
         distro = hosts.get(host, username=args.username)
-        remote_ips = net.ip_addresses(distro.conn)
+        host_ips[host] = net.ip_addresses(distro.conn, hostname=host)
 
         # custom cluster names on sysvinit hosts won't work
         if distro.init == 'sysvinit' and args.cluster != 'ceph':
@@ -153,17 +200,25 @@ def new(args):
 
         distro.conn.exit()
 
-        # Validate subnets if we received any
-        if args.public_network or args.cluster_network:
-            validate_host_ip(remote_ips, [args.public_network, args.cluster_network])
+        # without a public network the address comes from DNS, look it up
+        # now while other hosts are being probed
+        if not args.public_network:
+            LOG.debug('Resolving host %s', host)
+            try:
+                resolver.getaddrinfo(host)
+            except socket.gaierror:
+                pass  # reported below, in order
+
+    # every failure is fatal, like it was when hosts were done one by one
+    parallel.execute(discover, mons, args.jobs, logger=LOG, catch=())
 
+    # Validate subnets if we received any, for all the hosts at once
+    public_ips = check_networks(host_ips, args.public_network, args.cluster_network)
+
+    for (name, host) in mons:
         # Pick the IP that matches the public cluster (if we were told to do
         # so) otherwise pick the first, non-local IP
-        LOG.debug('Resolving host %s', host)
-        if args.public_network:
-            ip = get_public_network_ip(remote_ips, args.public_network)
-        else:
-            ip = net.get_nonlocal_ip(host)
+        ip = public_ips[host] or net.get_nonlocal_ip(host, resolver=resolver)
         LOG.debug('Monitor %s at %s', name, ip)
         mon_initial_members.append(name)
         try:
@@ -174,8 +229,6 @@ def new(args):
         except socket.error:
             mon_host.append(ip)
 
-
-
     LOG.debug('Monitor initial members are %s', mon_initial_members)
     LOG.debug('Monitor addrs are %s', mon_host)
 
@@ -1,18 +1,22 @@
 import argparse
 import json
 import logging
+import os
 import sys
 import time
 from textwrap import dedent
 
 from ceph_deploy import conf, exc, hosts
-from ceph_deploy.util import system, packages
+from ceph_deploy.util import inventory, parallel, stream, system, packages
 from ceph_deploy.cliutil import priority
 from ceph_deploy.lib import remoto
 
 
 LOG = logging.getLogger(__name__)
 
+DEFAULT_FS_TYPE = 'xfs'
+DEFAULT_DMCRYPT_KEY_DIR = '/etc/ceph/dmcrypt-keys'
+
 
 def get_bootstrap_osd_key(cluster):
     """
@@ -220,20 +224,199 @@ def create_osd(
         args.append(journal)
 
     if kw.get('debug'):
-        remoto.process.run(
+        stream.run(
             conn,
             args,
             env={'CEPH_VOLUME_DEBUG': '1'}
         )
 
     else:
-        remoto.process.run(
+        stream.run(
             conn,
             args
         )
 
 
+def parse_batch_spec(specs):
+    """
+    Turn the values of ``--batch`` into a list of ``(hostname, devices)``
+    tuples, in the order hosts were first seen. Each value is either the path
+    to a file with one host per line followed by its devices::
+
+        # hostname  devices...
+        node1       /dev/sdb /dev/sdc
+        node2       /dev/sd[b-y]
+
+    Or a single ``HOST:DEVICE[,DEVICE...]`` entry. Devices may be glob
+    patterns, which are expanded on each host.
+    """
+    devices_by_host = {}
+    hostnames = []
+
+    def add(hostname, devices):
+        if not devices:
+            raise RuntimeError('no devices specified for host %s in --batch' % hostname)
+        if hostname not in devices_by_host:
+            devices_by_host[hostname] = []
+            hostnames.append(hostname)
+        devices_by_host[hostname].extend(devices)
+
+    for spec in specs:
+        if os.path.isfile(spec):
+            with open(spec) as f:
+                for line in f:
+                    line = line.split('#', 1)[0].strip()
+                    if not line:
+                        continue
+                    hostname, _, devices = line.partition(' ')
+                    add(hostname.rstrip(':'), devices.split())
+        elif ':' in spec:
+            hostname, devices = spec.split(':', 1)
+            add(hostname, [d for d in devices.split(',') if d])
+        else:
+            raise RuntimeError(
+                'invalid --batch value, expected a file or HOST:DEVICE[,DEVICE...]: %s' % spec
+            )
+    return [(hostname, devices_by_host[hostname]) for hostname in hostnames]
+
+
+def create_osds_batch(conn, cluster, devices, storetype, dmcrypt, debug=False):
+    """
+    Run on osd node, creates an OSD on every device with a single
+    ``ceph-volume lvm batch`` call.
+    """
+    ceph_volume_executable = system.executable_path(conn, 'ceph-volume')
+    args = [
+        ceph_volume_executable,
+        '--cluster', cluster,
+        'lvm',
+        'batch',
+        '--yes',
+        '--%s' % storetype,
+    ]
+    if dmcrypt:
+        args.append('--dmcrypt')
+    args.extend(devices)
+
+    if debug:
+        stream.run(
+            conn,
+            args,
+            env={'CEPH_VOLUME_DEBUG': '1'}
+        )
+    else:
+        stream.run(
+            conn,
+            args
+        )
+
+
+def create_batch(args, cfg):
+    """
+    Create OSDs on every device of every host in ``--batch``, working on hosts
+    concurrently (up to ``--jobs``), and checking the cluster status once at
+    the end.
+    """
+    if args.data or args.journal or args.block_db or args.block_wal:
+        raise RuntimeError('--batch cannot be combined with --data, --journal, --block-db or --block-wal')
+    if args.host:
+        raise RuntimeError('hosts are taken from --batch, a HOST argument cannot be used with it')
+    # ceph-volume lvm batch has no use for these
+    unsupported = [
+        flag for flag, used in [
+            ('--zap-disk', args.zap_disk),
+            ('--fs-type', args.fs_type != DEFAULT_FS_TYPE),
+            ('--dmcrypt-key-dir', args.dmcrypt_key_dir != DEFAULT_DMCRYPT_KEY_DIR),
+        ] if used
+    ]
+    if unsupported:
+        raise RuntimeError('--batch cannot be combined with %s' % ', '.join(unsupported))
+
+    specs = parse_batch_spec(args.batch)
+    LOG.debug(
+        'Creating OSDs on cluster %s hosts %s',
+        args.cluster,
+        ' '.join(hostname for hostname, _ in specs),
+        )
+
+    key = get_bootstrap_osd_key(cluster=args.cluster)
+    conf_data = conf.ceph.load_raw(args)
+
+    # default to bluestore unless explicitly told not to
+    storetype = 'bluestore'
+    if args.filestore:
+        storetype = 'filestore'
+
+    keyring_path = '/var/lib/ceph/bootstrap-osd/{cluster}.keyring'.format(
+        cluster=args.cluster,
+    )
+
+    def create_host_osds(spec):
+        hostname, patterns = spec
+        distro = hosts.get(
+            hostname,
+            username=args.username,
+            callbacks=[packages.ceph_is_installed]
+        )
+        LOG.info(
+            'Distro info: %s %s %s',
+            distro.name,
+            distro.release,
+            distro.codename
+        )
+        LOG.debug('Deploying osds to %s', hostname)
+
+        # push the conf, check for the bootstrap keyring and find the devices
+        # in one go
+        batch = distro.conn.batch()
+        batch.write_conf(
+            args.cluster,
+            conf_data,
+            args.overwrite_conf
+        )
+        batch.path_exists(keyring_path)
+        batch.expand_devices(patterns)
+        _, keyring_exists, devices = batch.execute()
+
+        if not keyring_exists:
+            distro.conn.logger.warning('osd keyring does not exist yet, creating one')
+            distro.conn.remote_module.write_keyring(keyring_path, key)
+
+        if not devices:
+            raise RuntimeError('no devices found on %s matching: %s' % (hostname, ' '.join(patterns)))
+        distro.conn.logger.info('creating OSDs on: %s', ' '.join(devices))
+        inventory.forget(hostname)
+
+        create_osds_batch(
+            distro.conn,
+            cluster=args.cluster,
+            devices=devices,
+            storetype=storetype,
+            dmcrypt=args.dmcrypt,
+            debug=args.debug,
+        )
+        LOG.debug('Host %s is now ready for osd use.', hostname)
+        distro.conn.exit()
+        created.append(hostname)
+
+    created = []
+    errors = parallel.execute(create_host_osds, specs, args.jobs, logger=LOG)
+
+    if created:
+        # give the OSDs a few seconds to start, then check on all of them at
+        # once, from a host that worked
+        time.sleep(5)
+        distro = hosts.get(created[0], username=args.username)
+        catch_osd_errors(distro.conn, distro.conn.logger, args)
+        distro.conn.exit()
+
+    if errors:
+        raise exc.GenericError('Failed to create OSDs on %d hosts' % errors)
+
+
 def create(args, cfg, create=False):
+    if getattr(args, 'batch', None):
+        return create_batch(args, cfg)
     if not args.host:
         raise RuntimeError('Required host was not specified as a positional argument')
     LOG.debug(
@@ -282,6 +465,7 @@ def create(args, cfg, create=False):
         if args.filestore:
             storetype = 'filestore'
 
+        inventory.forget(hostname)
         create_osd(
             distro.conn,
             cluster=args.cluster,
@@ -311,51 +495,177 @@ def create(args, cfg, create=False):
         raise exc.GenericError('Failed to create %d OSDs' % errors)
 
 
-def disk_zap(args):
+def zap_device(conn, ceph_volume_executable, disk, debug=False):
+    """
+    Run on osd node, destroys data and filesystems on ``disk`` with
+    ``ceph-volume lvm zap``.
+    """
+    command = [
+        ceph_volume_executable,
+        'lvm',
+        'zap',
+        disk,
+    ]
+    if debug:
+        stream.run(
+            conn,
+            command,
+            env={'CEPH_VOLUME_DEBUG': '1'}
+        )
+    else:
+        stream.run(
+            conn,
+            command,
+        )
+
+
+def fast_zap_device(conn, disk):
+    """
+    Run on osd node, wipes the signatures of ``disk`` with ``wipefs`` and
+    discards all of its blocks with ``blkdiscard``, which takes seconds on
+    SSD and NVMe devices. Returns ``False`` if either of them failed, so that
+    the device can get a full zap instead.
+    """
+    for command in (['wipefs', '--all', disk], ['blkdiscard', disk]):
+        if stream.run(conn, command, stop_on_nonzero=False) != 0:
+            return False
+    return True
 
+
+def disk_zap(args):
+    """
+    Zap every disk of the host over a single connection, up to
+    ``--zap-jobs`` of them at the same time.
+    """
     hostname = args.host
     for disk in args.disk:
         if not disk or not hostname:
             raise RuntimeError('zap command needs both HOSTNAME and DISK but got "%s %s"' % (hostname, disk))
-        LOG.debug('zapping %s on %s', disk, hostname)
-        distro = hosts.get(
-            hostname,
-            username=args.username,
-            callbacks=[packages.ceph_is_installed]
-        )
-        LOG.info(
-            'Distro info: %s %s %s',
-            distro.name,
-            distro.release,
-            distro.codename
-        )
+    LOG.debug('zapping %s on %s', ', '.join(args.disk), hostname)
+    distro = hosts.get(
+        hostname,
+        username=args.username,
+        callbacks=[packages.ceph_is_installed]
+    )
+    LOG.info(
+        'Distro info: %s %s %s',
+        distro.name,
+        distro.release,
+        distro.codename
+    )
 
-        distro.conn.remote_module.zeroing(disk)
+    # everything the zaps need from the remote module in one go, calls on it
+    # can't be made from more than one thread at a time
+    batch = distro.conn.batch()
+    for disk in args.disk:
+        batch.zeroing(disk)
+    batch.which('ceph-volume')
+    if args.fast:
+        batch.rotational(args.disk)
+        batch.holders(args.disk)
+        batch.mounts(args.disk)
+    results = batch.execute()
+    ceph_volume_executable = results[len(args.disk)]
+    if not ceph_volume_executable:
+        raise exc.ExecutableNotFound('ceph-volume', hostname)
+    rotational, held, mounted = results[-3:] if args.fast else ({}, {}, {})
+
+    def zap(disk):
+        if args.fast:
+            if rotational.get(disk) is not False:
+                distro.conn.logger.info('%s is not a solid state device, zapping it', disk)
+            elif held.get(disk) != []:
+                # LVM, dm-crypt or md on it need ceph-volume to tear them down
+                distro.conn.logger.info('%s is in use, zapping it', disk)
+            elif mounted.get(disk) is None:
+                distro.conn.logger.info('could not tell if %s is mounted, zapping it', disk)
+            elif mounted[disk]:
+                # never wipe signatures from under a live filesystem or swap
+                distro.conn.logger.info('%s is mounted on %s, zapping it', disk, ', '.join(mounted[disk]))
+            elif fast_zap_device(distro.conn, disk):
+                return
+            else:
+                distro.conn.logger.warning('fast wipe failed for %s, zapping it instead', disk)
+        zap_device(distro.conn, ceph_volume_executable, disk, debug=args.debug)
+
+    inventory.forget(hostname)
+    try:
+        errors = parallel.execute(zap, args.disk, args.zap_jobs, logger=LOG)
+    finally:
+        distro.conn.exit()
 
-        ceph_volume_executable = system.executable_path(distro.conn, 'ceph-volume')
-        if args.debug:
-            remoto.process.run(
-                distro.conn,
-                [
-                    ceph_volume_executable,
-                    'lvm',
-                    'zap',
-                    disk,
-                ],
-                env={'CEPH_VOLUME_DEBUG': '1'}
-            )
-        else:
-            remoto.process.run(
-                distro.conn,
-                [
-                    ceph_volume_executable,
-                    'lvm',
-                    'zap',
-                    disk,
-                ],
-            )
+    if errors:
+        raise exc.GenericError('Failed to zap %d disks' % errors)
 
-        distro.conn.exit()
+
+def disk_inventory(args):
+    """
+    Collect the disks of every host (concurrently, up to ``--jobs``, or from
+    the inventory cache), and show the ones that match the filters, or write
+    them to a ``--batch`` file for ``osd create``.
+    """
+    devices_by_host = {}
+
+    def collect(hostname):
+        devices = None if args.refresh else inventory.load(hostname)
+        if devices is None:
+            distro = hosts.get(hostname, username=args.username)
+            try:
+                kind, out = distro.conn.remote_module.inventory()
+            finally:
+                distro.conn.exit()
+            try:
+                devices = inventory.parse(kind, out)
+            except (ValueError, KeyError, TypeError, AttributeError):
+                # not JSON, or not shaped like the output of either tool
+                raise RuntimeError('could not parse the disks of %s' % hostname)
+            inventory.save(hostname, devices)
+        devices_by_host[hostname] = devices
+
+    errors = parallel.execute(collect, args.host, args.jobs, logger=LOG)
+
+    selected = []
+    for hostname in args.host:
+        if hostname in devices_by_host:
+            selected.append((hostname, inventory.select(
+                devices_by_host[hostname],
+                min_size=args.min_size,
+                max_size=args.max_size,
+                rotational=args.rotational,
+                model=args.model,
+                available=True if args.available else None,
+            )))
+
+    if args.json:
+        # the JSON is the output of the command, not a log message, so it
+        # goes to stdout as is for other tools to read
+        sys.stdout.write(json.dumps(dict(selected), indent=2, sort_keys=True) + '\n')
+    else:
+        for hostname, devices in selected:
+            logger = logging.getLogger(hostname)
+            if not devices:
+                logger.info('no matching disks')
+            for device in devices:
+                logger.info(
+                    '%-16s %10s  %-3s  %-24s %s',
+                    device['path'],
+                    inventory.human_size(device['size']),
+                    'hdd' if device['rotational'] else 'ssd',
+                    device['model'] or '-',
+                    'available' if device['available'] else ', '.join(device['reasons']),
+                )
+
+    if args.batch_file:
+        with open(args.batch_file, 'w') as f:
+            f.write('# hostname  devices\n')
+            for hostname, devices in selected:
+                paths = [d['path'] for d in devices if d['available']]
+                if paths:
+                    f.write('%s %s\n' % (hostname, ' '.join(paths)))
+        LOG.info('wrote the available disks to %s, use it with: osd create --batch %s', args.batch_file, args.batch_file)
+
+    if errors:
+        raise exc.GenericError('Failed to collect the disks of %d hosts' % errors)
 
 
 def disk_list(args, cfg):
@@ -367,12 +677,9 @@ def disk_list(args, cfg):
             username=args.username,
             callbacks=[packages.ceph_is_installed]
         )
-        out, err, code = remoto.process.check(
-            distro.conn,
-            command,
-        )
-        for line in out:
-            if line.startswith('Disk /'):
+        distro.conn.logger.info('Running command: %s' % stream.command_line(distro.conn, command))
+        for source, line in stream.Stream(distro.conn, command):
+            if source == 'stdout' and line.startswith('Disk /'):
                 distro.conn.logger.info(line)
 
 
@@ -393,7 +700,7 @@ def osd_list(args, cfg):
         LOG.debug('Listing disks on {hostname}...'.format(hostname=hostname))
         ceph_volume_executable = system.executable_path(distro.conn, 'ceph-volume')
         if args.debug:
-            remoto.process.run(
+            stream.run(
                 distro.conn,
                 [
                     ceph_volume_executable,
@@ -404,7 +711,7 @@ def osd_list(args, cfg):
 
             )
         else:
-            remoto.process.run(
+            stream.run(
                 distro.conn,
                 [
                     ceph_volume_executable,
@@ -436,11 +743,20 @@ def disk(args):
         create(args, cfg)
     elif args.subcommand == 'zap':
         disk_zap(args)
+    elif args.subcommand == 'inventory':
+        disk_inventory(args)
     else:
         LOG.error('subcommand %s not implemented', args.subcommand)
         sys.exit(1)
 
 
+def _size(value):
+    try:
+        return inventory.parse_size(value)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
 @priority(50)
 def make(parser):
     """
@@ -464,6 +780,16 @@ def make(parser):
     For data devices, it can be an existing logical volume in the format of:
     vg/lv, or a device. For other OSD components like wal, db, and journal, it
     can be logical volume (in vg/lv format) or it must be a GPT partition.
+
+    Create OSDs on many devices of many hosts at once, from a file listing
+    every host followed by its devices (glob patterns are expanded on each
+    host)::
+
+        ceph-deploy osd create --batch osds.txt
+
+    Or from hosts and devices given directly::
+
+        ceph-deploy osd create --batch {node1}:/dev/sdb,/dev/sdc --batch {node2}:/dev/sd[b-y]
     """
     )
     parser.formatter_class = argparse.RawDescriptionHelpFormatter
@@ -511,7 +837,7 @@ def make(parser):
         choices=['xfs',
                  'btrfs'
                  ],
-        default='xfs',
+        default=DEFAULT_FS_TYPE,
         help='filesystem to use to format DEVICE (xfs, btrfs)',
         )
     osd_create.add_argument(
@@ -522,7 +848,7 @@ def make(parser):
     osd_create.add_argument(
         '--dmcrypt-key-dir',
         metavar='KEYDIR',
-        default='/etc/ceph/dmcrypt-keys',
+        default=DEFAULT_DMCRYPT_KEY_DIR,
         help='directory where dm-crypt keys are stored',
         )
     osd_create.add_argument(
@@ -545,6 +871,14 @@ def make(parser):
         default=None,
         help='bluestore block.wal path'
         )
+    osd_create.add_argument(
+        '--batch',
+        action='append',
+        metavar='SPEC',
+        help='Create OSDs on many hosts and devices: a file with a host and '
+             'its devices per line, or HOST:DEVICE[,DEVICE...] (can be used '
+             'more than once)'
+        )
     osd_create.add_argument(
         'host',
         nargs='?',
@@ -585,6 +919,19 @@ def make_disk(parser):
         metavar='DISK',
         help='Disk(s) to zap'
         )
+    disk_zap.add_argument(
+        '--zap-jobs',
+        type=int,
+        default=1,
+        metavar='N',
+        help='zap up to N disks of the host at the same time (default: %(default)s)',
+        )
+    disk_zap.add_argument(
+        '--fast',
+        action='store_true',
+        help='wipe solid state disks that are not in use with wipefs and '
+             'blkdiscard instead of a full zap, other disks are still zapped',
+        )
     disk_zap.add_argument(
         '--debug',
         action='store_true',
@@ -605,6 +952,68 @@ def make_disk(parser):
         action='store_true',
         help='Enable debug mode on remote ceph-volume calls',
         )
+    disk_inventory = disk_parser.add_parser(
+        'inventory',
+        help='List the disks of remote host(s), with filters'
+        )
+    disk_inventory.add_argument(
+        'host',
+        nargs='+',
+        metavar='HOST',
+        help='Remote HOST(s) to list disks from'
+        )
+    disk_inventory.add_argument(
+        '--min-size',
+        type=_size,
+        metavar='SIZE',
+        help='only disks of at least SIZE (like 500G or 2T)',
+        )
+    disk_inventory.add_argument(
+        '--max-size',
+        type=_size,
+        metavar='SIZE',
+        help='only disks of at most SIZE',
+        )
+    rotational = disk_inventory.add_mutually_exclusive_group()
+    rotational.add_argument(
+        '--rotational',
+        dest='rotational',
+        action='store_const',
+        const=True,
+        help='only rotational disks (HDDs)',
+        )
+    rotational.add_argument(
+        '--non-rotational',
+        dest='rotational',
+        action='store_const',
+        const=False,
+        help='only solid state disks (SSD, NVMe)',
+        )
+    disk_inventory.add_argument(
+        '--model',
+        metavar='PATTERN',
+        help='only disks with a model matching PATTERN, like "*SAMSUNG*"',
+        )
+    disk_inventory.add_argument(
+        '--available',
+        action='store_true',
+        help='only disks that are available for OSDs',
+        )
+    disk_inventory.add_argument(
+        '--refresh',
+        action='store_true',
+        help='probe the hosts again instead of using the inventory cache',
+        )
+    disk_inventory.add_argument(
+        '--json',
+        action='store_true',
+        help='print the disks as JSON',
+        )
+    disk_inventory.add_argument(
+        '--batch-file',
+        metavar='FILE',
+        help='write the available disks to FILE, for osd create --batch',
+        )
     parser.set_defaults(
         func=disk,
         )
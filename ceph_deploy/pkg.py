@@ -1,5 +1,7 @@
 import logging
+from . import exc
 from . import hosts
+from .util import parallel
 
 
 LOG = logging.getLogger(__name__)
@@ -7,7 +9,8 @@ LOG = logging.getLogger(__name__)
 
 def install(args):
     packages = args.install.split(',')
-    for hostname in args.hosts:
+
+    def install_host(hostname):
         distro = hosts.get(hostname, username=args.username)
         LOG.info(
             'Distro info: %s %s %s',
@@ -26,10 +29,15 @@ def install(args):
         distro.packager.install(packages)
         distro.conn.exit()
 
+    errors = parallel.execute(install_host, args.hosts, args.jobs, logger=LOG)
+    if errors:
+        raise exc.GenericError('Failed to install packages on %d hosts' % errors)
+
 
 def remove(args):
     packages = args.remove.split(',')
-    for hostname in args.hosts:
+
+    def remove_host(hostname):
         distro = hosts.get(hostname, username=args.username)
         LOG.info(
             'Distro info: %s %s %s',
@@ -49,6 +57,10 @@ def remove(args):
         distro.packager.remove(packages)
         distro.conn.exit()
 
+    errors = parallel.execute(remove_host, args.hosts, args.jobs, logger=LOG)
+    if errors:
+        raise exc.GenericError('Failed to remove packages from %d hosts' % errors)
+
 
 def pkg(args):
     if args.install:
@@ -1,11 +1,12 @@
 import errno
 import logging
 import os
+import threading
 
 from ceph_deploy import conf
 from ceph_deploy import exc
 from ceph_deploy import hosts
-from ceph_deploy.util import system
+from ceph_deploy.util import parallel, system
 from ceph_deploy.lib import remoto
 from ceph_deploy.cliutil import priority
 
@@ -79,8 +80,10 @@ def create_rgw(distro, name, cluster, init):
             ]
         )
 
-    conn.remote_module.touch_file(os.path.join(path, 'done'))
-    conn.remote_module.touch_file(os.path.join(path, init))
+    batch = conn.batch()
+    batch.touch_file(os.path.join(path, 'done'))
+    batch.touch_file(os.path.join(path, init))
+    batch.execute()
 
     if init == 'upstart':
         remoto.process.run(
@@ -147,47 +150,56 @@ def rgw_create(args):
     key = get_bootstrap_rgw_key(cluster=args.cluster)
 
     bootstrapped = set()
-    errors = 0
-    for hostname, name in args.rgw:
-        try:
-            distro = hosts.get(hostname, username=args.username)
-            rlogger = distro.conn.logger
-            LOG.info(
-                'Distro info: %s %s %s',
-                distro.name,
-                distro.release,
-                distro.codename
-            )
-            LOG.debug('remote host will use %s', distro.init)
+    # daemons sharing a host are bootstrapped only once, make sure they do not
+    # race each other when several hosts are worked on concurrently
+    bootstrap_locks = dict(
+        (hostname, threading.Lock()) for hostname, _ in args.rgw
+    )
+
+    def create_daemon(host_and_name):
+        hostname, name = host_and_name
+        distro = hosts.get(hostname, username=args.username)
+        rlogger = distro.conn.logger
+        LOG.info(
+            'Distro info: %s %s %s',
+            distro.name,
+            distro.release,
+            distro.codename
+        )
+        LOG.debug('remote host will use %s', distro.init)
 
+        with bootstrap_locks[hostname]:
             if hostname not in bootstrapped:
                 bootstrapped.add(hostname)
                 LOG.debug('deploying rgw bootstrap to %s', hostname)
-                distro.conn.remote_module.write_conf(
+                path = '/var/lib/ceph/bootstrap-rgw/{cluster}.keyring'.format(
+                    cluster=args.cluster,
+                )
+
+                # write the configuration file and check for the keyring in one go
+                batch = distro.conn.batch()
+                batch.write_conf(
                     args.cluster,
                     conf_data,
                     args.overwrite_conf,
                 )
+                batch.path_exists(path)
+                _, keyring_exists = batch.execute()
 
-                path = '/var/lib/ceph/bootstrap-rgw/{cluster}.keyring'.format(
-                    cluster=args.cluster,
-                )
-
-                if not distro.conn.remote_module.path_exists(path):
+                if not keyring_exists:
                     rlogger.warning('rgw keyring does not exist yet, creating one')
                     distro.conn.remote_module.write_keyring(path, key)
 
-            create_rgw(distro, name, args.cluster, distro.init)
-            distro.conn.exit()
-            LOG.info(
-                ('The Ceph Object Gateway (RGW) is now running on host %s and '
-                 'default port %s'),
-                hostname,
-                '7480'
-            )
-        except RuntimeError as e:
-            LOG.error(e)
-            errors += 1
+        create_rgw(distro, name, args.cluster, distro.init)
+        distro.conn.exit()
+        LOG.info(
+            ('The Ceph Object Gateway (RGW) is now running on host %s and '
+             'default port %s'),
+            hostname,
+            '7480'
+        )
+
+    errors = parallel.execute(create_daemon, args.rgw, args.jobs, logger=LOG)
 
     if errors:
         raise exc.GenericError('Failed to create %d RGWs' % errors)
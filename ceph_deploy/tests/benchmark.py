@@ -0,0 +1,624 @@
+"""
+Benchmark the subcommands that talk to many hosts, end to end, against
+simulated hosts.
+
+Connections are replaced by a stand-in for the ``remoto``/``execnet``
+transport that answers remote module calls and commands the way an Ubuntu
+host would, and waits for ``--latency`` milliseconds for every round trip
+(and a few round trips to open a connection). Everything else, from argument
+parsing to the serialization of remote calls, is the real thing, so that
+regressions in the number of connections, round trips or bytes sent over
+the wire show up here::
+
+    python -m ceph_deploy.tests.benchmark --hosts 20 --latency 50 --jobs 10
+
+With ``--check`` it exits with a non-zero status when a subcommand fails or
+goes over its budget of connections or round trips per host.
+"""
+import argparse
+import ast
+import inspect
+import json
+import logging
+import os
+import re
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+
+from mock import patch
+
+from ceph_deploy import cli, conf, connection
+from ceph_deploy.tests.directory import directory
+from ceph_deploy.util import constants, facts, files
+
+
+# Round trips it takes to open a connection: TCP, the SSH handshake and
+# authentication, and the bootstrap of the remote interpreter
+CONNECT_ROUND_TRIPS = 4
+
+# Subcommands run in order, each one relying on the files left by the ones
+# before it, as they would for a new cluster
+COMMANDS = [
+    ('new', ['new', '--public-network', '10.0.0.0/16']),
+    ('install --repo', ['install', '--repo']),
+    ('install --prefetch', ['install', '--prefetch']),
+    ('install', ['install']),
+    ('install again', ['install']),
+    ('mon create', ['mon', 'create']),
+    ('gatherkeys', ['gatherkeys']),
+    ('config push', ['--overwrite-conf', 'config', 'push']),
+    ('admin', ['admin']),
+    ('admin again', ['admin']),
+]
+
+# Most connections and round trips per host each subcommand is allowed
+BUDGETS = {
+    'new': (3, 7),
+    'install --repo': (2, 5),
+    'install --prefetch': (2, 8),
+    'install': (2, 10),
+    'install again': (2, 6),
+    'mon create': (2, 18),
+    'gatherkeys': (2, 8),
+    'config push': (2, 1),
+    'admin': (2, 2),
+    'admin again': (2, 1),
+}
+
+CEPHDEPLOY_CONF = """\
+[benchmark]
+default = true
+baseurl = https://download.ceph.com/debian-luminous
+gpgkey = https://download.ceph.com/keys/release.asc
+"""
+
+_getaddrinfo = socket.getaddrinfo
+
+KEY = 'AQBmZ4VaAAAAABAAS1Fb3VE9GzmyR4wsnSNgYQ=='
+
+
+class Stats(object):
+    """
+    What went over the wire for every host, shared by all the connections of
+    a :class:`Simulation`.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def add(self, connections=0, round_trips=0, sent=0, received=0):
+        with self.lock:
+            self.connections += connections
+            self.round_trips += round_trips
+            self.bytes_sent += sent
+            self.bytes_received += received
+
+
+class SimulatedHost(object):
+    """
+    The remote end of a simulated host: answers calls to the functions of
+    ``ceph_deploy.hosts.remotes`` and runs commands, keeping track of the
+    paths that were written so that later checks for them succeed, and the
+    digests of the files that were pushed.
+    """
+
+    def __init__(self, name, address):
+        self.name = name
+        self.address = address
+        self.paths = set()
+        self.digests = {}
+        self.packages = set()
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def call(self, name, args):
+        handler = getattr(self, 'remote_%s' % name, None)
+        if handler is not None:
+            return handler(*args)
+        # everything else writes something, remember it
+        if args and isinstance(args[0], str):
+            self.write(args[0])
+
+    def write(self, path, content=None, mode=None):
+        with self.lock:
+            self.writes += 1
+            self.paths.add(path)
+            if content is not None:
+                self.digests[path] = (files.digest(content), mode)
+
+    def remote_file_digest(self, path, mode=None):
+        digest, file_mode = self.digests.get(path, (None, None))
+        if mode is not None and mode != file_mode:
+            return None
+        return digest
+
+    def remote_write_conf(self, cluster, conf, overwrite):
+        path = '/etc/ceph/%s.conf' % cluster
+        if self.remote_file_digest(path) != files.digest(conf):
+            self.write(path, conf, 0o644)
+
+    def remote_write_file(self, path, content, mode=0o644, *args):
+        self.write(path, content, mode)
+
+    def remote_run_batch(self, calls):
+        return [self.call(name, args) for name, args in calls]
+
+    def remote_platform_information(self):
+        return ('Ubuntu', '16.04', 'xenial')
+
+    def remote_machine_type(self):
+        return 'x86_64'
+
+    def remote_shortname(self):
+        return self.name
+
+    def remote_grep(self, term, path):
+        return term == 'systemd'
+
+    def remote_which(self, executable):
+        if executable == 'initctl':
+            return None
+        return '/usr/bin/%s' % executable
+
+    def remote_interfaces(self):
+        return 'json', {
+            'lo': {
+                'up': True,
+                'hwaddr': '00:00:00:00:00:00',
+                'inet': [{'address': '127.0.0.1', 'netmask': '255.0.0.0', 'broadcast': None, 'label': 'lo'}],
+            },
+            'eth0': {
+                'up': True,
+                'hwaddr': '52:54:00:00:00:01',
+                'inet': [{'address': self.address, 'netmask': '255.255.0.0', 'broadcast': '10.0.255.255', 'label': 'eth0'}],
+            },
+        }
+
+    def remote_which_service(self):
+        return '/usr/sbin/service'
+
+    def remote_path_exists(self, path):
+        return path in self.paths
+
+    def remote_path_getuid(self, path):
+        return 167
+
+    def remote_path_getgid(self, path):
+        return 167
+
+    def remote_get_realpath(self, path):
+        return path
+
+    def remote_listdir(self, path):
+        return []
+
+    def remote_get_file(self, path):
+        if path.endswith('/keyring'):
+            return keyring('mon.').encode('utf-8')
+
+    def run(self, command):
+        """
+        Return the ``(stdout, stderr, returncode)`` of ``command``, with the
+        output as lists of byte strings.
+        """
+        out = []
+        if command[0] == 'dpkg-query':
+            out = [
+                '%s installed 12.2.13-1xenial' % package
+                for package in command[4:] if package in self.packages
+            ]
+        elif 'apt-get' in command and '--download-only' in command:
+            pass
+        elif 'apt-get' in command and 'install' in command:
+            with self.lock:
+                self.writes += 1
+                self.packages.update(
+                    argument for argument in command[command.index('install') + 1:]
+                    if not argument.startswith('-')
+                )
+        elif command[-1] == 'mon_status':
+            out = [json.dumps({
+                'name': self.name,
+                'rank': 0,
+                'state': 'leader',
+                'quorum': [0],
+                'monmap': {'mons': [{'name': self.name, 'rank': 0}]},
+            })]
+        elif command[-3:-1] == ['auth', 'get']:
+            out = keyring(command[-1]).splitlines()
+        elif command[-2:] == ['auth', 'export']:
+            out = ''.join(
+                keyring(name) for name in [
+                    'client.admin', 'client.bootstrap-mds', 'client.bootstrap-mgr',
+                    'client.bootstrap-osd', 'client.bootstrap-rgw',
+                ]
+            ).splitlines()
+        elif command[-1] == '--version':
+            out = ['ceph version 12.2.13 luminous (stable)']
+        return [line.encode('utf-8') for line in out], [], 0
+
+
+def keyring(name):
+    return '[%s]\n\tkey = %s\n' % (name, KEY)
+
+
+class SimulatedChannel(object):
+    """
+    Stands in for an ``execnet`` channel: whatever is sent to it is answered
+    right away, after waiting for a round trip.
+    """
+
+    def __init__(self, gateway, module=None):
+        self.gateway = gateway
+        self.module = module
+        self.replies = []
+        self.closed = False
+
+    def send(self, item):
+        if self.module is None:
+            # acknowledgements of streamed output, they don't wait for a reply
+            self.gateway.transfer(sent=len(repr(item)))
+            return
+        # the way remoto calls functions of a remote module: "name(args)"
+        match = re.match(r'(\w+)\((.*)\)$', item, re.DOTALL)
+        name, arguments = match.groups()
+        args = ast.literal_eval('(%s,)' % arguments) if arguments else ()
+        try:
+            reply = self.gateway.host.call(name, args)
+        except Exception as error:
+            reply = error
+        self.gateway.round_trip(sent=len(item), received=len(repr(reply)))
+        self.replies.append(reply)
+
+    def receive(self, timeout=None):
+        if not self.replies:
+            raise EOFError('channel is closed')
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def close(self):
+        self.closed = True
+
+    def isclosed(self):
+        return self.closed
+
+
+class SimulatedGateway(object):
+    """
+    Stands in for an ``execnet`` gateway to a :class:`SimulatedHost`.
+    """
+
+    def __init__(self, simulation, host):
+        self.simulation = simulation
+        self.host = host
+        self.closed = False
+
+    def transfer(self, sent=0, received=0):
+        self.simulation.stats.add(sent=sent, received=received)
+
+    def round_trip(self, sent=0, received=0):
+        self.simulation.wait(1)
+        self.simulation.stats.add(round_trips=1, sent=sent, received=received)
+
+    def hasreceiver(self):
+        return not self.closed
+
+    def remote_exec(self, source, **kw):
+        if isinstance(source, types.ModuleType):
+            # the module source is sent once, calls come later
+            self.transfer(sent=len(inspect.getsource(source)))
+            return SimulatedChannel(self, module=source)
+
+        channel = SimulatedChannel(self)
+        if not callable(source):
+            # remoto asks for the remote environment this way
+            replies = [{'PATH': '/usr/local/bin:/usr/bin:/bin'}]
+            sent = len(source)
+        else:
+            out, err, code = self.host.run(list(kw['cmd']))
+            name = source.__name__
+            if name == '_remote_check':
+                replies = [(out, err, code)]
+            elif name == '_remote_run':
+                replies = [{'debug': line} for line in out]
+                replies.extend({'warning': line} for line in err)
+            else:
+                replies = [('stdout', line) for line in out]
+                replies.extend(('stderr', line) for line in err)
+                replies.append(('exit', code))
+            sent = len(inspect.getsource(source)) + len(repr(kw))
+        self.round_trip(sent=sent, received=sum(len(repr(r)) for r in replies))
+        channel.replies = replies
+        return channel
+
+
+class SimulatedConnection(connection.Connection):
+    """
+    A connection to a :class:`SimulatedHost`, going through the same pool and
+    remote module handling as real connections.
+    """
+
+    simulation = None
+
+    def __init__(self, hostname, *args, **kw):
+        detect_sudo = kw.pop('detect_sudo', False)
+        kw['eager'] = False
+        super(SimulatedConnection, self).__init__(hostname, *args, **kw)
+        host = self.simulation.host(hostname.split('@')[-1])
+        if detect_sudo:
+            # a separate connection that only asks for the remote user
+            self.simulation.connect()
+            self.sudo = False
+        self.simulation.connect()
+        self.gateway = SimulatedGateway(self.simulation, host)
+
+    def close(self):
+        self.gateway.closed = True
+
+
+class Simulation(object):
+    """
+    A set of simulated hosts named ``node1`` to ``nodeN``, along with the
+    ``Connection`` class that reaches them.
+    """
+
+    def __init__(self, count, latency=0, previous=None):
+        self.latency = latency
+        self.stats = Stats()
+        self.names = ['node%d' % i for i in range(1, count + 1)]
+        if previous is not None:
+            # the hosts are left as the previous simulation left them
+            self.hosts = previous.hosts
+        else:
+            self.hosts = dict(
+                (name, SimulatedHost(name, '10.0.%d.%d' % (i // 250, i % 250 + 1)))
+                for i, name in enumerate(self.names)
+            )
+        self.local = SimulatedHost('localhost', '127.0.0.1')
+        self.Connection = type(
+            'Connection',
+            (SimulatedConnection,),
+            {'simulation': self},
+        )
+
+    def host(self, name):
+        return self.hosts.get(name, self.local)
+
+    def getaddrinfo(self, host, port, *args):
+        """
+        Resolve the names of the simulated hosts, leaving other names to
+        ``socket.getaddrinfo``.
+        """
+        if host not in self.hosts:
+            return _getaddrinfo(host, port, *args)
+        flags = args[3] if len(args) > 3 else 0
+        if flags & socket.AI_NUMERICHOST:
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        address = self.hosts[host].address
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (address, port))]
+
+    def writes(self):
+        return sum(host.writes for host in self.hosts.values())
+
+    def wait(self, round_trips):
+        if self.latency:
+            time.sleep(self.latency * round_trips)
+
+    def connect(self):
+        self.wait(CONNECT_ROUND_TRIPS)
+        self.stats.add(connections=1)
+
+
+class NoSleep(object):
+    """
+    Stands in for the ``time`` module of subcommands that give daemons a few
+    seconds to start, which simulated daemons don't need.
+    """
+
+    time = staticmethod(time.time)
+
+    @staticmethod
+    def sleep(seconds):
+        pass
+
+
+def run_command(simulation, argv):
+    """
+    Run the subcommand in ``argv`` against the simulated hosts, returning the
+    error it failed with, if any.
+    """
+    parser = cli.get_parser()
+    args = parser.parse_args(argv)
+    args.cd_conf = conf.cephdeploy.Conf()
+    args.cd_conf.read('cephdeploy.conf')
+    args = conf.cephdeploy.set_overrides(args, _conf=args.cd_conf)
+    try:
+        args.func(args)
+    except Exception as error:
+        return error
+    finally:
+        # the next subcommand is a new ceph-deploy run
+        connection.close_all()
+
+
+def run(hosts=3, latency=0, jobs=1, commands=None):
+    """
+    Run every subcommand in ``COMMANDS`` (or only the ones named in
+    ``commands``) against ``hosts`` simulated hosts with ``latency`` seconds
+    per round trip. Returns a list with a result dictionary per subcommand.
+    """
+    workdir = tempfile.mkdtemp(prefix='ceph-deploy-benchmark-')
+    results = []
+    # facts are cached from one subcommand to the next, like they are by
+    # default across ceph-deploy runs
+    ttl, refresh = facts.ttl, facts.refresh
+    facts.configure(ttl=3600)
+    try:
+        with open(os.path.join(workdir, 'cephdeploy.conf'), 'w') as f:
+            f.write(CEPHDEPLOY_CONF)
+        with directory(workdir):
+            simulation = None
+            for name, argv in COMMANDS:
+                simulation = Simulation(hosts, latency=latency, previous=simulation)
+                writes = simulation.writes()
+                argv = ['--jobs', str(jobs)] + argv + simulation.names
+                patches = [
+                    patch.object(constants, 'local_path', os.path.join(workdir, 'local')),
+                    patch('ceph_deploy.connection.Connection', simulation.Connection),
+                    patch('socket.getaddrinfo', simulation.getaddrinfo),
+                    patch('ceph_deploy.mon.time', NoSleep),
+                ]
+                for patcher in patches:
+                    patcher.start()
+                try:
+                    start = time.time()
+                    error = run_command(simulation, argv)
+                    elapsed = time.time() - start
+                finally:
+                    for patcher in patches:
+                        patcher.stop()
+                if commands and name not in commands:
+                    continue
+                stats = simulation.stats
+                results.append({
+                    'command': name,
+                    'hosts': hosts,
+                    'error': str(error) if error else None,
+                    'wall_time': elapsed,
+                    'connections': stats.connections / float(hosts),
+                    'round_trips': stats.round_trips / float(hosts),
+                    'bytes_sent': stats.bytes_sent / float(hosts),
+                    'bytes_received': stats.bytes_received / float(hosts),
+                    'writes': (simulation.writes() - writes) / float(hosts),
+                })
+    finally:
+        facts.configure(ttl=ttl, refresh=refresh)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def over_budget(result):
+    """
+    Describe how ``result`` fails or goes over its budget, if it does.
+    """
+    if result['error']:
+        return 'failed: %s' % result['error']
+    connections, round_trips = BUDGETS[result['command']]
+    problems = []
+    if result['connections'] > connections:
+        problems.append('%.1f connections per host (budget is %d)' % (
+            result['connections'], connections))
+    if result['round_trips'] > round_trips:
+        problems.append('%.1f round trips per host (budget is %d)' % (
+            result['round_trips'], round_trips))
+    return ', '.join(problems) or None
+
+
+def report(results, out=None):
+    out = out or sys.stdout
+    columns = '%-18s %9s %12s %12s %14s %14s %12s\n'
+    out.write(columns % (
+        'command', 'wall (s)', 'conns/host', 'trips/host', 'KiB sent/host', 'KiB recv/host',
+        'writes/host'))
+    for result in results:
+        out.write(columns % (
+            result['command'],
+            '%.2f' % result['wall_time'],
+            '%.1f' % result['connections'],
+            '%.1f' % result['round_trips'],
+            '%.1f' % (result['bytes_sent'] / 1024),
+            '%.1f' % (result['bytes_received'] / 1024),
+            '%.1f' % result['writes'],
+        ))
+    for result in results:
+        problem = over_budget(result)
+        if problem:
+            out.write('%s: %s\n' % (result['command'], problem))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m ceph_deploy.tests.benchmark',
+        description='Benchmark ceph-deploy subcommands against simulated hosts',
+    )
+    parser.add_argument(
+        '--hosts',
+        type=int,
+        default=10,
+        help='number of simulated hosts (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=20,
+        help='milliseconds every round trip takes (default: %(default)s)',
+    )
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        help='value for the --jobs flag of ceph-deploy (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--command',
+        action='append',
+        dest='commands',
+        choices=[name for name, _ in COMMANDS],
+        help='only report this subcommand, can be used more than once',
+    )
+    parser.add_argument(
+        '--json',
+        action='store_true',
+        help='print the results as JSON',
+    )
+    parser.add_argument(
+        '--check',
+        action='store_true',
+        help='exit with a non-zero status if a subcommand fails or goes over budget',
+    )
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+        help='show the output of ceph-deploy',
+    )
+    options = parser.parse_args(argv)
+
+    root_logger = logging.getLogger()
+    handler = logging.StreamHandler() if options.verbose else logging.NullHandler()
+    root_logger.addHandler(handler)
+    root_logger.setLevel(logging.DEBUG)
+
+    try:
+        results = run(
+            hosts=options.hosts,
+            latency=options.latency / 1000.0,
+            jobs=options.jobs,
+            commands=options.commands,
+        )
+    finally:
+        root_logger.removeHandler(handler)
+
+    if options.json:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        report(results)
+
+    if options.check and any(over_budget(result) for result in results):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,6 +7,11 @@ import pytest
 
 LOG = logging.getLogger(__name__)
 
+# the asyncio modules use syntax that Python 2 can't compile
+collect_ignore = []
+if sys.version_info < (3, 5):
+    collect_ignore.append('unit/aio')
+
 
 def _prepend_path(env):
     """
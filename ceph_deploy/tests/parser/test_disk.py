@@ -3,7 +3,7 @@ import pytest
 from ceph_deploy.cli import get_parser
 from ceph_deploy.tests.util import assert_too_few_arguments
 
-SUBCMDS_WITH_ARGS = ['list', 'zap']
+SUBCMDS_WITH_ARGS = ['list', 'zap', 'inventory']
 
 
 class TestParserDisk(object):
@@ -86,3 +86,28 @@ class TestParserDisk(object):
         assert args.disk[0] == '/dev/sdb'
         assert args.host == 'host1'
         assert args.debug is True
+
+    def test_disk_zap_jobs_and_fast(self):
+        args = self.parser.parse_args('disk zap host1 /dev/sdb'.split())
+        assert args.zap_jobs == 1
+        assert args.fast is False
+        args = self.parser.parse_args('disk zap --fast --zap-jobs 8 host1 /dev/sdb'.split())
+        assert args.zap_jobs == 8
+        assert args.fast is True
+
+    def test_disk_inventory_filters(self):
+        args = self.parser.parse_args(
+            'disk inventory --min-size 1T --non-rotational --model *INTEL* --available host1 host2'.split()
+        )
+        assert args.host == ['host1', 'host2']
+        assert args.min_size == 1 << 40
+        assert args.max_size is None
+        assert args.rotational is False
+        assert args.model == '*INTEL*'
+        assert args.available is True
+
+    def test_disk_inventory_bad_size(self, capsys):
+        with pytest.raises(SystemExit):
+            self.parser.parse_args('disk inventory --max-size lots host1'.split())
+        out, err = capsys.readouterr()
+        assert 'invalid size' in err
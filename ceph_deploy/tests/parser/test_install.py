@@ -156,3 +156,36 @@ class TestParserInstall(object):
     def test_install_gpg_url_custom_path(self):
         args = self.parser.parse_args('install --gpg-url https://ceph.com/key host1'.split())
         assert args.gpg_url == "https://ceph.com/key"
+
+    def test_install_cache_default_is_false(self):
+        args = self.parser.parse_args('install host1'.split())
+        assert args.cache is False
+        assert args.cache_port == 0
+
+    def test_install_cache(self):
+        args = self.parser.parse_args('install --cache --cache-port 8080 host1'.split())
+        assert args.cache is True
+        assert args.cache_port == 8080
+
+    def test_install_mirror_defaults(self):
+        args = self.parser.parse_args('install host1'.split())
+        assert args.mirror_jobs is None
+        assert args.mirror_bwlimit is None
+        assert args.mirror_fanout is False
+
+    def test_install_mirror_options(self):
+        args = self.parser.parse_args(
+            'install --local-mirror /mnt/mymirror --mirror-jobs 4 '
+            '--mirror-bwlimit 10000 --mirror-fanout host1'.split()
+        )
+        assert args.mirror_jobs == 4
+        assert args.mirror_bwlimit == 10000
+        assert args.mirror_fanout is True
+
+    def test_install_prefetch_default_is_false(self):
+        args = self.parser.parse_args('install host1'.split())
+        assert args.prefetch is False
+
+    def test_install_prefetch(self):
+        args = self.parser.parse_args('install --prefetch host1'.split())
+        assert args.prefetch is True
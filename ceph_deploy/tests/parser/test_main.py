@@ -1,6 +1,8 @@
 import pytest
+from mock import Mock, patch
 
 import ceph_deploy
+from ceph_deploy import cli
 from ceph_deploy.cli import get_parser
 from ceph_deploy.tests.util import assert_too_few_arguments
 
@@ -73,6 +75,14 @@ class TestParserMain(object):
         args = self.parser.parse_args('--ceph-conf /tmp/ceph.conf forgetkeys'.split())
         assert args.ceph_conf == '/tmp/ceph.conf'
 
+    def test_default_trace_is_none(self):
+        args = self.parser.parse_args('forgetkeys'.split())
+        assert args.trace is None
+
+    def test_custom_trace(self):
+        args = self.parser.parse_args('--trace out.json forgetkeys'.split())
+        assert args.trace == 'out.json'
+
     @pytest.mark.parametrize('cmd', SUBCMDS_WITH_ARGS)
     def test_valid_subcommands_with_args(self, cmd, capsys):
         with pytest.raises(SystemExit):
@@ -98,3 +108,42 @@ class TestParserMain(object):
         assert 'usage: ceph-deploy' in out
         assert 'optional arguments:' in out
         assert 'commands:' in out
+
+
+class TestLazyCommands(object):
+
+    def test_table_matches_the_functions(self):
+        for name, target, help in cli.COMMANDS:
+            fn = cli.load_command(target)
+            assert ' '.join(fn.__doc__.split()) == help
+
+    def test_only_the_requested_command_is_loaded(self):
+        with patch.object(cli, 'load_command', Mock(wraps=cli.load_command)) as load:
+            parser = get_parser(commands=['forgetkeys'])
+        load.assert_called_once_with('ceph_deploy.forgetkeys:make')
+        args = parser.parse_args(['forgetkeys'])
+        assert args.func.__name__ == 'forgetkeys'
+
+    def test_plugins_are_not_looked_for_builtin_commands(self):
+        with patch.object(cli, 'plugin_commands') as plugin_commands:
+            get_parser(commands=['forgetkeys'])
+        assert plugin_commands.called is False
+
+    def test_plugin_commands(self):
+        def make(parser):
+            """Do something else."""
+            parser.set_defaults(func=make)
+        with patch.object(cli, 'plugin_commands', Mock(return_value=[('other', lambda: make)])):
+            parser = get_parser(commands=['other'])
+        assert parser.parse_args(['other']).func is make
+
+    @pytest.mark.parametrize('argv, command', [
+        (['install', 'node1'], 'install'),
+        (['-v', '--overwrite-conf', 'config', 'push'], 'config'),
+        (['--username', 'mon', '--jobs', '4', 'osd', 'create'], 'osd'),
+        (['--jobs=4', 'mon'], 'mon'),
+        (['--help'], None),
+        ([], None),
+    ])
+    def test_find_command(self, argv, command):
+        assert cli.find_command(cli.base_parser(), argv) == command
@@ -99,3 +99,12 @@ class TestParserOSD(object):
         args = self.parser.parse_args('osd create --dmcrypt --dmcrypt-key-dir /tmp/keys host1 --data /dev/sdb'.split())
         assert args.dmcrypt_key_dir == "/tmp/keys"
 
+    def test_osd_create_batch_default_none(self):
+        args = self.parser.parse_args('osd create host1 --data /dev/sdb'.split())
+        assert args.batch is None
+
+    def test_osd_create_batch_many(self):
+        args = self.parser.parse_args(
+            'osd create --batch osds.txt --batch host2:/dev/sdb,/dev/sdc'.split())
+        assert args.batch == ['osds.txt', 'host2:/dev/sdb,/dev/sdc']
+        assert args.host is None
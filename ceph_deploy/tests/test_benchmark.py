@@ -0,0 +1,63 @@
+from ceph_deploy.tests import benchmark
+
+
+class TestBenchmark(object):
+
+    def test_every_command_is_within_budget(self):
+        results = benchmark.run(hosts=2)
+        assert [result['command'] for result in results] == [
+            name for name, _ in benchmark.COMMANDS
+        ]
+        for result in results:
+            assert benchmark.over_budget(result) is None
+
+    def test_unchanged_files_are_not_written_again(self):
+        results = benchmark.run(hosts=2, commands=['admin', 'admin again'])
+        assert [result['writes'] for result in results] == [1, 0]
+
+    def test_installed_release_is_not_installed_again(self):
+        results = benchmark.run(hosts=2, commands=['install', 'install again'])
+        assert [result['writes'] for result in results] == [3, 0]
+
+    def test_prefetch_leaves_the_install_for_later(self):
+        results = benchmark.run(hosts=2, commands=['install --prefetch', 'install'])
+        assert [result['writes'] for result in results] == [2, 3]
+
+    def test_only_some_commands_are_reported(self):
+        results = benchmark.run(hosts=1, commands=['new'])
+        assert [result['command'] for result in results] == ['new']
+
+    def test_going_over_budget_is_reported(self):
+        result = {
+            'command': 'admin',
+            'error': None,
+            'connections': 5,
+            'round_trips': 1,
+        }
+        assert benchmark.over_budget(result) == '5.0 connections per host (budget is 2)'
+
+    def test_failures_are_reported(self):
+        result = {'command': 'admin', 'error': 'boom'}
+        assert benchmark.over_budget(result) == 'failed: boom'
+
+
+class TestSimulatedChannel(object):
+
+    def setup(self):
+        self.simulation = benchmark.Simulation(1)
+        self.gateway = benchmark.SimulatedGateway(
+            self.simulation,
+            self.simulation.hosts['node1'],
+        )
+
+    def test_module_calls_are_one_round_trip(self):
+        channel = benchmark.SimulatedChannel(self.gateway, module=benchmark)
+        channel.send("path_exists('/etc/ceph')")
+        assert channel.receive() is False
+        assert self.simulation.stats.round_trips == 1
+        assert self.simulation.stats.bytes_sent == len("path_exists('/etc/ceph')")
+
+    def test_written_paths_exist_afterwards(self):
+        channel = benchmark.SimulatedChannel(self.gateway, module=benchmark)
+        channel.send("run_batch([('write_file', ('/etc/ceph/ceph.conf', b'')), ('path_exists', ('/etc/ceph/ceph.conf',))])")
+        assert channel.receive() == [None, True]
@@ -46,12 +46,12 @@ def test_write_keyring(tmpdir):
     distro.conn = MagicMock()
     remotes.write_file.__defaults__ = (0o644, str(tmpdir), -1, -1)
     distro.conn.remote_module = remotes
-    distro.conn.remote_module.write_conf = Mock()
 
-    with patch('ceph_deploy.admin.hosts'):
-        with patch('ceph_deploy.admin.hosts.get', MagicMock(return_value=distro)):
-            with directory(str(tmpdir)):
-                main(args=['admin', 'host1'])
+    with patch.object(remotes, 'write_conf', Mock()):
+        with patch('ceph_deploy.admin.hosts'):
+            with patch('ceph_deploy.admin.hosts.get', MagicMock(return_value=distro)):
+                with directory(str(tmpdir)):
+                    main(args=['admin', 'host1'])
 
     keyring_file = os.path.join(etc_ceph, 'ceph.client.admin.keyring')
     assert os.path.exists(keyring_file)
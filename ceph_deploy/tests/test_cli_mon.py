@@ -37,10 +37,10 @@ fsid = 6ede5564-3cf1-44b5-aa96-1c77b0c3e1d0
 mon initial members = host1
 """)
 
-    fake_ip_addresses = lambda x: ['10.0.0.1']
+    fake_ip_addresses = lambda x, **kw: ['10.0.0.1']
     try:
         with patch('ceph_deploy.new.net.ip_addresses', fake_ip_addresses):
-            with patch('ceph_deploy.new.net.get_nonlocal_ip', lambda x: '10.0.0.1'):
+            with patch('ceph_deploy.new.net.get_nonlocal_ip', lambda x, **kw: '10.0.0.1'):
                 with patch('ceph_deploy.new.arg_validators.Hostname', lambda: lambda x: x):
                     with patch('ceph_deploy.new.hosts'):
                         with directory(str(tmpdir)):
@@ -10,11 +10,11 @@ import pytest
 
 
 def test_write_global_conf_section(tmpdir):
-    fake_ip_addresses = lambda x: ['10.0.0.1']
+    fake_ip_addresses = lambda x, **kw: ['10.0.0.1']
 
     with patch('ceph_deploy.new.hosts'):
         with patch('ceph_deploy.new.net.ip_addresses', fake_ip_addresses):
-            with patch('ceph_deploy.new.net.get_nonlocal_ip', lambda x: '10.0.0.1'):
+            with patch('ceph_deploy.new.net.get_nonlocal_ip', lambda x, **kw: '10.0.0.1'):
                 with patch('ceph_deploy.new.arg_validators.Hostname', lambda: lambda x: x):
                     with directory(str(tmpdir)):
                         main(args=['new', 'host1'])
@@ -26,12 +26,12 @@ def test_write_global_conf_section(tmpdir):
 @pytest.fixture
 def newcfg(request):
     tmpdir = request.getfuncargvalue('tmpdir')
-    fake_ip_addresses = lambda x: ['10.0.0.1']
+    fake_ip_addresses = lambda x, **kw: ['10.0.0.1']
 
     def new(*args):
         with patch('ceph_deploy.new.net.ip_addresses', fake_ip_addresses):
             with patch('ceph_deploy.new.hosts'):
-                with patch('ceph_deploy.new.net.get_nonlocal_ip', lambda x: '10.0.0.1'):
+                with patch('ceph_deploy.new.net.get_nonlocal_ip', lambda x, **kw: '10.0.0.1'):
                     with patch('ceph_deploy.new.arg_validators.Hostname', lambda: lambda x: x):
                         with directory(str(tmpdir)):
                             main(args=['new'] + list(args))
@@ -5,6 +5,8 @@ import pytest
 import tempfile
 import os
 import shutil
+import threading
+import time
 
 
 def get_key_static(keytype, key_path):
@@ -23,11 +25,11 @@ def mock_time_strftime(time_format):
     return "20160412144231"
 
 
-def mock_get_keys_fail(args, host, dest_dir):
+def mock_get_keys_fail(args, host, dest_dir, cancelled=None):
     return False
 
 
-def mock_get_keys_sucess_static(args, host, dest_dir):
+def mock_get_keys_sucess_static(args, host, dest_dir, cancelled=None):
     for keytype in ["admin", "mon", "osd", "mds", "mgr", "rgw"]:
         keypath = gatherkeys.keytype_path_to(args, keytype)
         path = "%s/%s" % (dest_dir, keypath)
@@ -35,7 +37,7 @@ def mock_get_keys_sucess_static(args, host, dest_dir):
     return True
 
 
-def mock_get_keys_sucess_dynamic(args, host, dest_dir):
+def mock_get_keys_sucess_dynamic(args, host, dest_dir, cancelled=None):
     for keytype in ["admin", "mon", "osd", "mds", "mgr", "rgw"]:
         keypath = gatherkeys.keytype_path_to(args, keytype)
         path = "%s/%s" % (dest_dir, keypath)
@@ -139,3 +141,45 @@ class TestGatherKeys(object):
         assert "ceph.bootstrap-osd.keyring-%s" % (mocked_time) in dir_content
         assert "ceph.bootstrap-rgw.keyring-%s" % (mocked_time) in dir_content
         assert len(dir_content) == 12
+
+
+    def test_gatherkeys_from_first_healthy_mon(self):
+        """
+        Test 'gatherkeys' does not wait for mons that are down.
+        """
+        stopped = threading.Event()
+
+        def get_keys(args, host, dest_dir, cancelled=None):
+            if host == 'down':
+                # like a mon that does not answer until the timeout, but
+                # gives up at its next step once keys came from another mon
+                cancelled.wait(10)
+                stopped.set()
+                return False
+            return mock_get_keys_sucess_static(args, host, dest_dir)
+
+        args = mock.Mock()
+        args.cluster = "ceph"
+        args.mon = ['down', 'host1']
+        start = time.time()
+        with mock.patch('ceph_deploy.gatherkeys.gatherkeys_with_mon', get_keys):
+            gatherkeys.gatherkeys(args)
+        assert time.time() - start < 5
+        # the temp directory is only removed once the other mons are done
+        assert stopped.is_set()
+        assert "ceph.client.admin.keyring" in os.listdir(self.test_dir)
+
+
+    @mock.patch('ceph_deploy.gatherkeys.gatherkeys_with_mon', mock_get_keys_sucess_static)
+    def test_gatherkeys_waits_out_the_connect_timeout(self):
+        """
+        Test 'gatherkeys' gives the other mons long enough for a ``ceph``
+        call to time out before removing the temp directory.
+        """
+        args = mock.Mock()
+        args.cluster = "ceph"
+        args.mon = ['host1', 'host2']
+        race = gatherkeys.parallel.race
+        with mock.patch('ceph_deploy.gatherkeys.parallel.race', wraps=race) as patched:
+            gatherkeys.gatherkeys(args)
+        assert patched.call_args[1]['grace'] > gatherkeys.CONNECT_TIMEOUT
@@ -3,6 +3,9 @@ from ceph_deploy import new
 import mock
 import json
 import copy
+import os
+import shutil
+import tempfile
 
 
 remoto_process_check_success_output = {
@@ -59,6 +62,9 @@ class mock_conn(object):
     def __init__(self):
         self.remote_module = mock_remote_module()
 
+    def exit(self):
+        pass
+
 
 class mock_distro(object):
     def __init__(self):
@@ -93,6 +99,33 @@ def mock_remoto_process_check_success(conn, args):
     return out.encode('utf-8').split(b'\n'), [], 0
 
 
+def exported_keyring(names):
+    return ''.join(
+        '[%s]\n\tkey = %s\n\tcaps mon = "allow *"\n' % (name, new.generate_auth_key())
+        for name in names
+    )
+
+
+def mock_remoto_process_check_export(conn, args):
+    if args[-2:] == ['auth', 'export']:
+        out = exported_keyring([
+            'client.admin', 'client.bootstrap-mds', 'client.bootstrap-mgr',
+            'client.bootstrap-osd', 'client.bootstrap-rgw', 'osd.0',
+        ])
+        return out.encode('utf-8').split(b'\n'), [], 0
+    return mock_remoto_process_check_success(conn, args)
+
+
+def mock_remoto_process_check_export_without_rgw(conn, args):
+    if args[-2:] == ['auth', 'export']:
+        out = exported_keyring([
+            'client.admin', 'client.bootstrap-mds', 'client.bootstrap-mgr',
+            'client.bootstrap-osd',
+        ])
+        return out.encode('utf-8').split(b'\n'), [], 0
+    return mock_remoto_process_check_success(conn, args)
+
+
 def mock_remoto_process_check_rc_error(conn, args):
     return [b""], [b"this failed\n"], 1
 
@@ -217,3 +250,47 @@ class TestGatherKeysWithMon(object):
     def test_remoto_process_check_out_missing_monmap_host1(self):
         rc = gatherkeys.gatherkeys_with_mon(self.args, self.host, self.test_dir)
         assert rc is False
+
+
+class TestGatherKeysExport(object):
+    """
+    Keys that exist already come from a single ``ceph auth export``
+    """
+    def setup(self):
+        self.args = mock.Mock()
+        self.args.cluster = "ceph"
+        self.host = 'host1'
+        self.test_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.test_dir)
+
+    @mock.patch('ceph_deploy.gatherkeys.gatherkeys_missing', mock_gatherkeys_missing_fail)
+    @mock.patch('ceph_deploy.lib.remoto.process.check', mock_remoto_process_check_export)
+    @mock.patch('ceph_deploy.hosts.get', mock_hosts_get_file_key_content)
+    def test_exported_keys_are_split(self):
+        rc = gatherkeys.gatherkeys_with_mon(self.args, self.host, self.test_dir)
+        assert rc is True
+        for keytype in ["admin", "mds", "mgr", "osd", "rgw"]:
+            path = os.path.join(self.test_dir, gatherkeys.keytype_path_to(self.args, keytype))
+            with open(path) as f:
+                content = f.read()
+            assert content.startswith('[%s]\n' % gatherkeys.keytype_identity(keytype))
+            assert content.count('[') == 1
+        assert 'osd.0' not in ''.join(os.listdir(self.test_dir))
+
+    @mock.patch('ceph_deploy.lib.remoto.process.check', mock_remoto_process_check_export_without_rgw)
+    @mock.patch('ceph_deploy.hosts.get', mock_hosts_get_file_key_content)
+    def test_missing_keys_are_created(self):
+        missing = mock.Mock(return_value=True)
+        with mock.patch('ceph_deploy.gatherkeys.gatherkeys_missing', missing):
+            rc = gatherkeys.gatherkeys_with_mon(self.args, self.host, self.test_dir)
+        assert rc is True
+        assert [call[0][4] for call in missing.call_args_list] == ['rgw']
+
+    def test_split_keyring(self):
+        lines = exported_keyring(['client.admin', 'mon.']).encode('utf-8').split(b'\n')
+        keys = gatherkeys.split_keyring(lines)
+        assert sorted(keys) == ['client.admin', 'mon.']
+        assert keys['client.admin'][0] == b'[client.admin]'
+        assert keys['client.admin'][1].startswith(b'\tkey = ')
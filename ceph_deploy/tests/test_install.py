@@ -1,4 +1,4 @@
-from mock import Mock
+from mock import Mock, patch
 
 from ceph_deploy import install
 
@@ -147,3 +147,67 @@ class TestDetectComponents(object):
         assert result == sorted([
             'ceph-osd', 'ceph-mds', 'ceph', 'ceph-mon', 'ceph-radosgw'
         ])
+
+
+class TestReleaseInstalled(object):
+
+    def setup(self):
+        self.args = Mock()
+        self.args.version_kind = 'stable'
+        self.args.release = 'luminous'
+        self.args.local_mirror = None
+        self.args.repo_url = None
+        self.distro = Mock()
+        self.distro.is_pkgtarxz = False
+        self.distro.is_rpm = True
+
+    def test_checks_the_host(self):
+        with patch('ceph_deploy.install.packages') as packages:
+            packages.release_installed.return_value = True
+            assert install.release_installed(self.args, self.distro, ['ceph']) is True
+        packages.release_installed.assert_called_with(
+            self.distro.conn, ['ceph'], 'luminous', True)
+
+    def test_dev_builds_are_always_installed(self):
+        self.args.version_kind = 'dev'
+        with patch('ceph_deploy.install.packages') as packages:
+            assert install.release_installed(self.args, self.distro, ['ceph']) is False
+        assert packages.release_installed.called is False
+
+    def test_repo_url_is_always_set_up(self):
+        self.args.repo_url = 'http://mirror/ceph'
+        with patch('ceph_deploy.install.packages') as packages:
+            assert install.release_installed(self.args, self.distro, ['ceph']) is False
+        assert packages.release_installed.called is False
+
+
+class TestUpstreamRepoUrl(object):
+
+    def distro(self, name, **kw):
+        attributes = dict(is_deb=False, is_el=False, normalized_name=name)
+        attributes.update(kw)
+        return Mock(**attributes)
+
+    def test_deb(self):
+        distro = self.distro('ubuntu', is_deb=True)
+        url = install.upstream_repo_url(distro, 'stable', 'luminous')
+        assert url == 'https://download.ceph.com/debian-luminous/'
+
+    def test_el(self):
+        distro = self.distro('centos', is_el=True)
+        distro.normalized_release.int_major = 7
+        distro.normalized_release.major = '7'
+        url = install.upstream_repo_url(distro, 'testing', None)
+        assert url == 'https://download.ceph.com/rpm-testing/el7/'
+
+    def test_fedora(self):
+        distro = self.distro('fedora', is_el=True, release='26')
+        url = install.upstream_repo_url(distro, 'stable', 'luminous')
+        assert url == 'https://download.ceph.com/rpm-luminous/fc26/'
+
+    def test_dev_builds_have_none(self):
+        distro = self.distro('ubuntu', is_deb=True)
+        assert install.upstream_repo_url(distro, 'dev', 'master') is None
+
+    def test_suse_has_none(self):
+        assert install.upstream_repo_url(self.distro('suse'), 'stable', 'luminous') is None
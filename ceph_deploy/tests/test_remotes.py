@@ -1,6 +1,9 @@
+import pytest
+
 from mock import patch
 from ceph_deploy.hosts import remotes
 from ceph_deploy.hosts.remotes import platform_information, parse_os_release
+from ceph_deploy.util import files
 
 class FakeExists(object):
 
@@ -234,3 +237,52 @@ UBUNTU_CODENAME=xenial
         assert distro == 'ubuntu'
         assert release == '16.04'
         assert codename == 'xenial'
+
+
+class TestFileDigest(object):
+
+    def test_missing_file(self, tmpdir):
+        assert remotes.file_digest(str(tmpdir.join('missing'))) is None
+
+    def test_digest_of_contents(self, tmpdir):
+        path = tmpdir.join('ceph.conf')
+        path.write('[global]\n')
+        assert remotes.file_digest(str(path)) == files.digest('[global]\n')
+
+    def test_other_mode(self, tmpdir):
+        path = tmpdir.join('keyring')
+        path.write('key')
+        path.chmod(0o644)
+        assert remotes.file_digest(str(path), 0o600) is None
+        assert remotes.file_digest(str(path), 0o644) == files.digest('key')
+
+
+class TestWriteConf(object):
+
+    def test_same_contents_are_not_rewritten(self, tmpdir):
+        conf = tmpdir.join('ceph.conf')
+        conf.write('[global]\n')
+
+        with patch('ceph_deploy.hosts.remotes.tempfile.NamedTemporaryFile') as tmp_file:
+            with patch('ceph_deploy.hosts.remotes.os.path.exists', return_value=True):
+                with patch('ceph_deploy.hosts.remotes.open', create=True) as fake_open:
+                    fake_open.return_value = conf.open()
+                    with patch('ceph_deploy.hosts.remotes.shutil.move') as move:
+                        remotes.write_conf('ceph', '[global]\n', False)
+
+        assert move.called is False
+        # no temp file is created in /etc/ceph either
+        assert tmp_file.called is False
+
+    def test_different_contents_are_refused_without_a_temp_file(self, tmpdir):
+        conf = tmpdir.join('ceph.conf')
+        conf.write('[global]\n')
+
+        with patch('ceph_deploy.hosts.remotes.tempfile.NamedTemporaryFile') as tmp_file:
+            with patch('ceph_deploy.hosts.remotes.os.path.exists', return_value=True):
+                with patch('ceph_deploy.hosts.remotes.open', create=True) as fake_open:
+                    fake_open.return_value = conf.open()
+                    with pytest.raises(RuntimeError):
+                        remotes.write_conf('ceph', '[global]\nfsid = 1\n', False)
+
+        assert tmp_file.called is False
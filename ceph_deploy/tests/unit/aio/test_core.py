@@ -0,0 +1,198 @@
+import asyncio
+import socket
+import sys
+
+import pytest
+
+if sys.version_info < (3, 5):
+    pytest.skip('asyncio core needs Python 3.5', allow_module_level=True)
+
+from ceph_deploy.aio import core, server
+from ceph_deploy.lib import remoto
+from ceph_deploy.util import constants, facts, parallel
+
+
+def run(coroutine):
+    loop = core.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def local_session():
+    # the local host doesn't need ssh, the server runs in a subprocess
+    return core.connect(socket.gethostname(), detect_sudo=False)
+
+
+class TestEncoding(object):
+
+    def test_bytes_make_it_through_json(self):
+        value = [b'\x00\xff', ('a', 1), {'key': b'value'}]
+        assert server.decode(server.encode(value)) == [b'\x00\xff', ['a', 1], {'key': b'value'}]
+
+
+class TestSession(object):
+
+    def test_remote_module_calls(self, tmpdir):
+        path = str(tmpdir.join('file'))
+
+        async def work():
+            async with await local_session() as session:
+                await session.remote_module.write_file(path, b'contents\x00', 0o600)
+                exists = await session.remote_module.path_exists(path)
+                contents = await session.remote_module.get_file(path)
+            return exists, contents
+
+        assert run(work()) == (True, b'contents\x00')
+
+    def test_remote_errors_are_raised(self):
+        async def work():
+            async with await local_session() as session:
+                await session.remote_module.get_realpath(None)
+
+        with pytest.raises(RuntimeError) as error:
+            run(work())
+        assert 'TypeError' in str(error.value)
+
+    def test_unknown_functions(self):
+        session = core.Session('node1')
+        with pytest.raises(AttributeError):
+            session.remote_module.not_a_remote_function
+
+    def test_check(self):
+        async def work():
+            async with await local_session() as session:
+                return await session.check(['sh', '-c', 'echo out; echo err >&2; exit 3'])
+
+        assert run(work()) == ([b'out'], [b'err'], 3)
+
+    def test_run_raises_on_failure(self):
+        async def work():
+            async with await local_session() as session:
+                await session.run(['false'])
+
+        with pytest.raises(RuntimeError):
+            run(work())
+
+    def test_batch(self):
+        async def work():
+            async with await local_session() as session:
+                batch = session.batch()
+                batch.shortname()
+                batch.path_exists('/')
+                return await batch.execute()
+
+        assert run(work()) == [socket.gethostname().split('.')[0], True]
+
+    def test_blocking_code_can_use_a_session(self):
+        async def work():
+            async with await local_session() as session:
+                loop = asyncio.get_event_loop()
+                conn = core.BlockingConnection(session, loop)
+                return await loop.run_in_executor(
+                    None, remoto.process.check, conn, ['echo', 'hi']
+                )
+
+        assert run(work())[0] == [b'hi']
+
+    def test_ssh_command(self):
+        session = core.Session('node1', username='ceph')
+        command = session.command(sudo=True)
+        assert command[0] == 'ssh'
+        assert command[-2] == 'ceph@node1'
+        assert command[-1].startswith('sudo sh -c ')
+        assert 'python3 python python2.7' in command[-1]
+
+    def test_interpreter_is_found_on_the_host(self):
+        command = core.Session('localhost').command()
+        assert command[:2] == ['sh', '-c']
+        assert 'exec $python -c' in command[2]
+
+
+class TestGet(object):
+
+    def setup(self):
+        self.local_path = constants.local_path
+
+    def teardown(self):
+        constants.local_path = self.local_path
+        facts.configure()
+
+    def test_cached_facts(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.configure(ttl=60)
+        hostname = socket.gethostname()
+        facts.save(hostname, {
+            'name': 'Ubuntu',
+            'release': '16.04',
+            'codename': 'xenial',
+            'machine_type': 'x86_64',
+            'init': 'systemd',
+        })
+
+        async def work():
+            distro = await core.get(hostname, detect_sudo=False)
+            async with distro.conn:
+                return distro, await distro.conn.remote_module.path_exists('/')
+
+        distro, exists = run(work())
+        assert distro.is_deb is True
+        assert distro.init == 'systemd'
+        assert exists is True
+
+
+class TestExecute(object):
+
+    def test_every_item(self):
+        seen = []
+
+        async def work(item):
+            seen.append(item)
+
+        assert core.execute(work, ['a', 'b', 'c'], jobs=2) == 0
+        assert sorted(seen) == ['a', 'b', 'c']
+
+    def test_counts_errors(self):
+        async def work(item):
+            if item == 'b':
+                raise RuntimeError(item)
+
+        assert core.execute(work, ['a', 'b', 'c'], jobs=3) == 1
+
+    def test_other_errors_are_raised(self):
+        async def work(item):
+            raise ValueError(item)
+
+        with pytest.raises(ValueError):
+            core.execute(work, ['a', 'b'], jobs=2)
+
+    def test_runs_at_most_jobs_at_once(self):
+        state = {'running': 0, 'peak': 0}
+
+        async def work(item):
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+            await asyncio.sleep(0.01)
+            state['running'] -= 1
+
+        core.execute(work, range(20), jobs=5)
+        assert state['peak'] == 5
+
+    def test_runs_subprocesses(self):
+        async def work(item):
+            async with await local_session() as session:
+                return await session.run(['true'])
+
+        assert core.execute(work, ['a', 'b'], jobs=2) == 0
+
+    def test_parallel_execute_uses_the_coroutine(self):
+        seen = []
+
+        async def work(item):
+            seen.append(item)
+
+        errors = parallel.execute(seen.append, ['a'], jobs=1, coroutine=work)
+        assert errors == 0
+        assert seen == ['a']
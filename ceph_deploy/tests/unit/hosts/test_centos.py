@@ -1,6 +1,9 @@
+import sys
+
 from ceph_deploy.hosts import centos
 from ceph_deploy import hosts
 from mock import Mock, patch
+from ceph_deploy.util import pkg_managers, versions
 
 
 def pytest_generate_tests(metafunc):
@@ -62,3 +65,79 @@ class TestCentosRepositoryUrlPart(object):
         with patch('ceph_deploy.hosts.get_connection', fake_get_connection):
             self.module = hosts.get('testhost')
         assert centos.rpm_dist(self.module) == output
+
+
+class TestCentosInstall(object):
+
+    def setup(self):
+        self.distro = Mock()
+        self.distro.normalized_name = 'centos'
+        self.distro.normalized_release = versions.NormalizedVersion('7.4')
+        self.distro.packager = pkg_managers.Yum(Mock())
+        self.installs = []
+        self.distro.packager.install = lambda packages, **kw: self.installs.append(packages)
+        self.distro.packager.expire = Mock()
+        self.distro.packager.add_repo_gpg_key = Mock()
+        self.digests = self.distro.packager.remote_conn.remote_module.file_digest
+
+    def test_repo_packages_are_installed_together(self):
+        # the install function shadows its module in the package
+        with patch.object(sys.modules['ceph_deploy.hosts.centos.install'], 'remoto'):
+            centos.install(
+                self.distro, 'stable', 'luminous', True, components=['ceph-mon']
+            )
+        assert self.installs == [
+            [
+                'epel-release',
+                'yum-plugin-priorities',
+                'https://download.ceph.com/rpm-luminous/el7/noarch/ceph-release-1-0.el7.noarch.rpm',
+            ],
+            ['ceph'],
+        ]
+
+    def install(self):
+        with patch.object(sys.modules['ceph_deploy.hosts.centos.install'], 'remoto'):
+            centos.install(
+                self.distro, 'stable', 'luminous', True, components=['ceph-mon']
+            )
+
+    def test_changed_repo_metadata_is_expired(self):
+        self.digests.side_effect = ['old', 'new']
+        self.install()
+        self.distro.packager.expire.assert_called_once_with(['Ceph*', 'ceph*'])
+
+    def test_unchanged_repo_metadata_is_kept(self):
+        self.digests.return_value = 'same'
+        self.install()
+        assert self.distro.packager.expire.called is False
+
+    def test_repos_from_urls_are_expired_once_changed(self):
+        self.digests.side_effect = [None, 'new']
+        centos.mirror_install(
+            self.distro, 'http://mirror/ceph', 'http://mirror/release.asc', True,
+            components=['ceph-mon'],
+        )
+        self.distro.packager.expire.assert_called_once_with(['Ceph*', 'ceph*'])
+        assert self.installs[-1] == ['ceph']
+
+    def test_cached_installs_point_the_repos_at_the_cache(self):
+        def cache_url(url):
+            return url.replace('https://', 'http://10.0.0.1:8080/https/')
+
+        with patch.object(sys.modules['ceph_deploy.hosts.centos.install'], 'remoto'):
+            centos.install(
+                self.distro, 'stable', 'luminous', True, components=['ceph-mon'],
+                cache_url=cache_url,
+            )
+        assert self.installs[0] == [
+            'epel-release',
+            'yum-plugin-priorities',
+            'http://10.0.0.1:8080/https/download.ceph.com/rpm-luminous/el7/noarch/ceph-release-1-0.el7.noarch.rpm',
+        ]
+        self.distro.packager.add_repo_gpg_key.assert_called_once_with(
+            'http://10.0.0.1:8080/https/download.ceph.com/keys/release.asc')
+        self.distro.conn.remote_module.replace_in_file.assert_called_once_with(
+            '/etc/yum.repos.d/ceph.repo',
+            'https://download.ceph.com/',
+            'http://10.0.0.1:8080/https/download.ceph.com/',
+        )
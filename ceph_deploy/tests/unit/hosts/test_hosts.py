@@ -377,6 +377,47 @@ class TestHostGet(object):
 
         assert error.value.__str__() == 'Platform is not supported: Solaris 12 Tijuana'
 
+    def test_get_uses_cached_facts(self):
+        fake_get_connection = self.make_fake_connection()
+        cached = {
+            'name': 'Ubuntu',
+            'release': '16.04',
+            'codename': 'xenial',
+            'machine_type': 'x86_64',
+            'init': 'systemd',
+        }
+        with patch('ceph_deploy.hosts.get_connection', fake_get_connection):
+            with patch('ceph_deploy.hosts.facts.load', Mock(return_value=cached)):
+                result = hosts.get('myhost')
+        assert result.codename == 'xenial'
+        assert result.init == 'systemd'
+        assert result.is_deb is True
+        assert fake_get_connection.remote_module.platform_information.called is False
+
+    def test_get_saves_facts(self):
+        fake_get_connection = self.make_fake_connection(('Ubuntu', '16.04', 'xenial'))
+        fake_get_connection.remote_module.machine_type = Mock(return_value='x86_64')
+        fake_save = Mock()
+        with patch('ceph_deploy.hosts.get_connection', fake_get_connection):
+            with patch('ceph_deploy.hosts.facts.save', fake_save):
+                with patch('ceph_deploy.hosts.debian.choose_init', Mock(return_value='systemd')):
+                    hosts.get('myhost')
+        hostname, saved = fake_save.call_args[0]
+        assert hostname == 'myhost'
+        assert saved['codename'] == 'xenial'
+        assert saved['init'] == 'systemd'
+
+    def test_hosts_do_not_share_attributes(self):
+        fake_get_connection = self.make_fake_connection(('Ubuntu', '16.04', 'xenial'))
+        with patch('ceph_deploy.hosts.get_connection', fake_get_connection):
+            with patch('ceph_deploy.hosts.debian.choose_init', Mock(return_value='systemd')):
+                first = hosts.get('myhost')
+                fake_get_connection.remote_module.platform_information.return_value = (
+                    'Ubuntu', '14.04', 'trusty')
+                second = hosts.get('otherhost')
+        assert first.codename == 'xenial'
+        assert second.codename == 'trusty'
+
 
 class TestGetDistro(object):
 
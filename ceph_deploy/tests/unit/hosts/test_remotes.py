@@ -35,3 +35,141 @@ class TestWhich(object):
         monkeypatch.setattr(remotes.os.path, 'exists', lambda x: True)
         monkeypatch.setattr(remotes.os.path, 'isfile', lambda x: True)
         assert remotes.which('foo') == '/usr/local/bin/foo'
+
+
+class TestReplaceInFile(object):
+
+    def test_replaces_every_occurrence(self, tmpdir):
+        repo = tmpdir.join('ceph.repo')
+        repo.write('baseurl=https://download.ceph.com/a\ngpgkey=https://download.ceph.com/b\n')
+        assert remotes.replace_in_file(str(repo), 'https://', 'http://cache/https/') is True
+        assert repo.read() == 'baseurl=http://cache/https/download.ceph.com/a\ngpgkey=http://cache/https/download.ceph.com/b\n'
+
+    def test_leaves_the_file_alone_without_matches(self, tmpdir):
+        repo = tmpdir.join('ceph.repo')
+        repo.write('baseurl=http://mirror/\n')
+        assert remotes.replace_in_file(str(repo), 'https://', 'http://cache/https/') is False
+
+
+class TestRunBatch(object):
+
+    def test_results_are_in_order(self, tmpdir):
+        path = str(tmpdir)
+        calls = [
+            ('path_exists', (path,)),
+            ('path_exists', (str(tmpdir.join('missing')),)),
+            ('listdir', (path,)),
+        ]
+        assert remotes.run_batch(calls) == [True, False, []]
+
+    def test_no_calls(self):
+        assert remotes.run_batch([]) == []
+
+
+class TestInterfaces(object):
+
+    def test_ip_json(self):
+        entries = [{
+            'ifname': 'eth0',
+            'flags': ['BROADCAST', 'MULTICAST', 'UP', 'LOWER_UP'],
+            'address': '52:54:00:00:00:01',
+            'addr_info': [
+                {'family': 'inet', 'local': '10.0.0.1', 'prefixlen': 24,
+                 'broadcast': '10.0.0.255', 'label': 'eth0'},
+                {'family': 'inet', 'local': '10.0.0.2', 'prefixlen': 24,
+                 'broadcast': '10.0.0.255', 'label': 'eth0', 'secondary': True},
+                {'family': 'inet6', 'local': 'fe80::1', 'prefixlen': 64},
+            ],
+        }]
+        assert remotes._ip_json(entries, {}) == {
+            'eth0': {
+                'up': True,
+                'hwaddr': '52:54:00:00:00:01',
+                'inet': [{'address': '10.0.0.1', 'netmask': '255.255.255.0',
+                          'broadcast': '10.0.0.255', 'label': 'eth0'}],
+                'secondary': [{'type': 'inet', 'address': '10.0.0.2',
+                               'netmask': '255.255.255.0',
+                               'broadcast': '10.0.0.255', 'label': 'eth0'}],
+                'inet6': [{'address': 'fe80::1', 'prefixlen': '64'}],
+            },
+        }
+
+    def test_sysfs_state_wins(self):
+        entries = [{'ifname': 'eth0', 'flags': ['UP'], 'link': 'bond0'}]
+        links = {'eth0': {'up': False, 'hwaddr': 'aa:bb:cc:dd:ee:ff'}}
+        assert remotes._ip_json(entries, links) == {
+            'eth0': {'up': False, 'hwaddr': 'aa:bb:cc:dd:ee:ff', 'parent': 'bond0'},
+        }
+
+    def test_sys_class_net(self, tmpdir):
+        eth0 = tmpdir.mkdir('eth0')
+        eth0.join('flags').write('0x1003\n')
+        eth0.join('address').write('52:54:00:00:00:01\n')
+        tmpdir.mkdir('eth1').join('flags').write('0x1002\n')
+        assert remotes._sys_class_net(str(tmpdir)) == {
+            'eth0': {'up': True, 'hwaddr': '52:54:00:00:00:01'},
+            'eth1': {'up': False},
+        }
+
+    def test_falls_back_to_ip_output(self, monkeypatch):
+        def output(command):
+            if '-json' in command:
+                return None
+            return '1: lo: <LOOPBACK,UP> mtu 65536\n'
+        monkeypatch.setattr(remotes, '_sys_class_net', lambda: {})
+        monkeypatch.setattr(remotes, 'which', lambda x: '/sbin/%s' % x)
+        monkeypatch.setattr(remotes, '_output', output)
+        assert remotes.interfaces() == ('ip', '1: lo: <LOOPBACK,UP> mtu 65536\n')
+
+    def test_nothing_available(self, monkeypatch):
+        monkeypatch.setattr(remotes, '_sys_class_net', lambda: {})
+        monkeypatch.setattr(remotes, 'which', lambda x: None)
+        assert remotes.interfaces() == (None, None)
+
+
+class TestInventory(object):
+
+    def test_falls_back_to_lsblk(self, monkeypatch):
+        def output(command):
+            if 'inventory' in command:
+                return None
+            return '{"blockdevices": []}'
+        monkeypatch.setattr(remotes, 'which', lambda x: '/usr/sbin/%s' % x)
+        monkeypatch.setattr(remotes, '_output', output)
+        assert remotes.inventory() == ('lsblk', '{"blockdevices": []}')
+
+    def test_nothing_available(self, monkeypatch):
+        monkeypatch.setattr(remotes, 'which', lambda x: None)
+        assert remotes.inventory() == (None, None)
+
+
+class TestMounts(object):
+
+    def test_mount_table(self, tmpdir):
+        mountinfo = tmpdir.join('mountinfo')
+        mountinfo.write(
+            '22 1 259:2 / / rw,relatime shared:1 - ext4 /dev/root rw\n'
+            '30 22 0:45 / /srv/my\\040data rw - btrfs /dev/nvme1n1p1 rw\n'
+            '31 22 0:46 / /proc rw - proc proc rw\n'
+        )
+        swaps = tmpdir.join('swaps')
+        swaps.write(
+            'Filename    Type       Size    Used  Priority\n'
+            '/dev/sdc2   partition  1048572 0     -2\n'
+        )
+        table = remotes._mount_table(str(mountinfo), str(swaps))
+        assert table['259:2'] == ['/']
+        assert table['nvme1n1p1'] == ['/srv/my data']
+        assert table['sdc2'] == ['[SWAP]']
+        assert '0:46' in table and 'proc' not in table
+
+    def test_not_a_block_device(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(remotes, '_mount_table', lambda: {})
+        path = str(tmpdir.join('sdb'))
+        assert remotes.mounts([path, 'vg/lv']) == {path: None, 'vg/lv': None}
+
+    def test_unreadable_mounts(self, monkeypatch):
+        def unreadable():
+            raise IOError('no procfs')
+        monkeypatch.setattr(remotes, '_mount_table', unreadable)
+        assert remotes.mounts(['/dev/sdb']) == {'/dev/sdb': None}
@@ -0,0 +1,140 @@
+import logging
+
+from mock import Mock, patch
+
+from ceph_deploy import connection
+from ceph_deploy.util import constants
+
+
+logger = logging.getLogger('test')
+
+
+class FakeConnection(object):
+
+    def __init__(self, hostname, **kw):
+        self.hostname = hostname
+        self.pool_key = kw.get('pool_key')
+        self.remote_module = None
+        self.alive = True
+        self.closed = False
+
+    def is_alive(self):
+        return self.alive
+
+    def exit(self):
+        connection.release(self)
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionPool(object):
+
+    def setup(self):
+        connection.close_all()
+        self.patcher = patch('ceph_deploy.connection.Connection', FakeConnection)
+        self.patcher.start()
+
+    def teardown(self):
+        connection.close_all()
+        self.patcher.stop()
+
+    def test_exited_connections_are_reused(self):
+        conn = connection.get_connection('node1', None, logger)
+        conn.exit()
+        assert connection.get_connection('node1', None, logger) is conn
+
+    def test_connections_in_use_are_not_shared(self):
+        conn = connection.get_connection('node1', None, logger)
+        assert connection.get_connection('node1', None, logger) is not conn
+
+    def test_connections_are_per_user(self):
+        conn = connection.get_connection('node1', None, logger)
+        conn.exit()
+        other = connection.get_connection('node1', 'ceph', logger)
+        assert other is not conn
+        assert other.hostname == 'ceph@node1'
+
+    def test_dead_connections_are_closed(self):
+        conn = connection.get_connection('node1', None, logger)
+        conn.exit()
+        conn.alive = False
+        assert connection.get_connection('node1', None, logger) is not conn
+        assert conn.closed is True
+
+    def test_reused_connections_log_to_the_new_logger(self):
+        conn = connection.get_connection('node1', None, logger)
+        conn.remote_module = Mock()
+        conn.exit()
+        other_logger = logging.getLogger('other')
+        connection.get_connection('node1', None, other_logger)
+        assert conn.logger is other_logger
+        assert conn.remote_module.logger is other_logger
+
+    def test_close_all(self):
+        conn = connection.get_connection('node1', None, logger)
+        conn.exit()
+        connection.close_all()
+        assert conn.closed is True
+        assert connection.get_connection('node1', None, logger) is not conn
+
+
+class TestRemoteBatch(object):
+
+    def setup(self):
+        self.conn = Mock()
+        self.conn.remote_module.run_batch.return_value = ['node1', 0]
+        self.batch = connection.RemoteBatch(self.conn)
+
+    def test_calls_are_sent_together(self):
+        self.batch.shortname()
+        self.batch.path_getuid('/var/lib/ceph')
+        assert self.batch.execute() == ['node1', 0]
+        self.conn.remote_module.run_batch.assert_called_once_with(
+            [('shortname', ()), ('path_getuid', ('/var/lib/ceph',))]
+        )
+
+    def test_batch_is_emptied_after_execute(self):
+        self.batch.shortname()
+        self.batch.execute()
+        assert len(self.batch) == 0
+
+    def test_empty_batch_does_not_go_remote(self):
+        assert self.batch.execute() == []
+        assert self.conn.remote_module.run_batch.called is False
+
+
+class TestSSHOptions(object):
+
+    def setup(self):
+        self.local_path = constants.local_path
+
+    def teardown(self):
+        constants.local_path = self.local_path
+
+    def test_control_path_is_in_local_path(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        result = connection.ssh_options()
+        assert 'ControlMaster=auto' in result
+        assert 'ControlPath=%s/ssh/%%C' % tmpdir in result
+        assert tmpdir.join('ssh').check(dir=True)
+
+    def test_disabled(self):
+        with patch('ceph_deploy.connection.control_persist', None):
+            assert connection.ssh_options() == ''
+
+    def test_control_path_with_spaces_is_skipped(self, tmpdir):
+        constants.local_path = str(tmpdir.join('with spaces'))
+        assert connection.ssh_options() == ''
+
+    def test_ssh_connection_string_includes_options(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        conn = connection.Connection('node1', eager=False)
+        result = conn._make_connection_string('node1', _needs_ssh=lambda host: True)
+        assert result.startswith('ssh=-o ControlMaster=auto ')
+        assert ' node1//python=' in result
+
+    def test_local_connection_string_is_untouched(self):
+        conn = connection.Connection('node1', eager=False)
+        result = conn._make_connection_string('node1', _needs_ssh=lambda host: False)
+        assert result.startswith('popen//python=')
@@ -222,3 +222,39 @@ class TestConcatenateKeyrings(object):
 
         with py.test.raises(RuntimeError):
             mon.concatenate_keyrings(self.args)
+
+
+class TestWaitForQuorum(object):
+
+    def setup(self):
+        self.args = Mock()
+        self.args.username = None
+        self.args.cluster = 'ceph'
+        self.fake_get = Mock()
+
+    def wait(self, statuses, **kw):
+        def fake_status_check(conn, logger, hostname, args):
+            return statuses[hostname].pop(0)
+
+        with patch('ceph_deploy.mon.hosts.get', self.fake_get):
+            with patch('ceph_deploy.mon.mon_status_check', fake_status_check):
+                with patch('ceph_deploy.mon.time.sleep'):
+                    return mon.wait_for_quorum(self.args, sorted(statuses), **kw)
+
+    def test_all_in_quorum(self):
+        statuses = {
+            'mon1': [{'state': 'leader'}],
+            'mon2': [{'state': 'probing'}, {}, {'state': 'peon'}],
+        }
+        assert self.wait(statuses) == set(['mon1', 'mon2'])
+
+    def test_connections_are_released(self):
+        self.wait({'mon1': [{'state': 'leader'}]})
+        assert self.fake_get.return_value.conn.exit.called
+
+    def test_stops_at_deadline(self):
+        statuses = {
+            'mon1': [{'state': 'leader'}],
+            'mon2': [{'state': 'probing'}] * 100,
+        }
+        assert self.wait(statuses, timeout=0) == set(['mon1'])
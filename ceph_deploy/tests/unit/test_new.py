@@ -1,5 +1,10 @@
-from ceph_deploy import new
+import time
+
+from mock import Mock, patch
+
+from ceph_deploy import conf, new
 from ceph_deploy.tests import util
+from ceph_deploy.tests.directory import directory
 import pytest
 
 
@@ -26,3 +31,82 @@ class TestValidateHostIp(object):
         subnets = ["10.0.0.1/16", "10.1.1.1/16"]
         with pytest.raises(RuntimeError):
             new.validate_host_ip(ips, subnets)
+
+    def test_any_network_of_a_list_will_do(self):
+        ips = ['192.168.1.10', '2001:db8::10']
+        subnets = ["10.0.0.0/16,2001:db8::/64", None]
+        assert new.validate_host_ip(ips, subnets) is None
+
+
+class TestCheckNetworks(object):
+
+    def test_picks_public_ips(self):
+        host_ips = {
+            'node1': ['192.168.0.1', '10.0.0.1'],
+            'node2': ['10.1.0.2', '192.168.0.2'],
+        }
+        public_ips = new.check_networks(host_ips, '10.0.0.0/16,10.1.0.0/16', '192.168.0.0/24')
+        assert public_ips == {'node1': '10.0.0.1', 'node2': '10.1.0.2'}
+
+    def test_no_networks(self):
+        assert new.check_networks({'node1': ['10.0.0.1']}) == {'node1': None}
+
+    def test_reports_every_host(self):
+        host_ips = {
+            'node1': ['10.0.0.1'],
+            'node2': ['10.9.0.1'],
+            'node3': [],
+        }
+        with pytest.raises(RuntimeError) as error:
+            new.check_networks(host_ips, '10.0.0.0/16', '10.0.0.0/8')
+        assert str(error.value).endswith('2 hosts do not match the network layout: node2, node3')
+
+
+class TestNewParallel(object):
+
+    def setup(self):
+        self.args = Mock(
+            ceph_conf=None,
+            cluster='ceph',
+            fsid=None,
+            public_network='10.0.0.0/24',
+            cluster_network=None,
+            ssh_copykey=False,
+            username=None,
+            jobs=3,
+            mon=['node1', 'node2', 'node3'],
+        )
+
+    def ip_addresses(self, conn, hostname=None):
+        # the first hosts take the longest to answer
+        number = int(conn.hostname[-1])
+        time.sleep(0.03 * (3 - number))
+        return ['10.0.0.%d' % number]
+
+    def new(self, tmpdir):
+        def get(host, **kw):
+            return Mock(init='systemd', conn=Mock(hostname=host))
+
+        with patch('ceph_deploy.new.hosts.get', get):
+            with patch('ceph_deploy.new.net.ip_addresses', self.ip_addresses):
+                with directory(str(tmpdir)):
+                    new.new(self.args)
+        with tmpdir.join('ceph.conf').open() as f:
+            return conf.ceph.parse(f)
+
+    def test_mons_keep_their_order(self, tmpdir):
+        cfg = self.new(tmpdir)
+        assert cfg.get('global', 'mon initial members') == 'node1, node2, node3'
+        assert cfg.get('global', 'mon host') == '10.0.0.1,10.0.0.2,10.0.0.3'
+
+    def test_dns_is_looked_up_once_per_host(self, tmpdir):
+        self.args.public_network = None
+        calls = []
+
+        def getaddrinfo(host, port):
+            calls.append(host)
+            return [(None, None, None, None, ('192.168.0.%s' % host[-1], 0))]
+        with patch('ceph_deploy.util.net.socket.getaddrinfo', getaddrinfo):
+            cfg = self.new(tmpdir)
+        assert cfg.get('global', 'mon host') == '192.168.0.1,192.168.0.2,192.168.0.3'
+        assert sorted(calls) == ['node1', 'node2', 'node3']
@@ -0,0 +1,324 @@
+import json
+
+import pytest
+from mock import Mock, patch
+
+from ceph_deploy import exc, osd
+from ceph_deploy.util import constants, facts
+from ceph_deploy.hosts import remotes
+
+
+class TestParseBatchSpec(object):
+
+    def test_inline(self):
+        result = osd.parse_batch_spec(['node1:/dev/sdb,/dev/sdc'])
+        assert result == [('node1', ['/dev/sdb', '/dev/sdc'])]
+
+    def test_file(self, tmpdir):
+        spec = tmpdir.join('osds.txt')
+        spec.write(
+            '# hostname devices\n'
+            'node1 /dev/sdb /dev/sdc\n'
+            '\n'
+            'node2:   /dev/sd[b-y]  # all of them\n'
+        )
+        result = osd.parse_batch_spec([str(spec)])
+        assert result == [
+            ('node1', ['/dev/sdb', '/dev/sdc']),
+            ('node2', ['/dev/sd[b-y]']),
+        ]
+
+    def test_hosts_are_merged_in_order(self):
+        result = osd.parse_batch_spec(['node2:/dev/sdb', 'node1:/dev/sdb', 'node2:/dev/sdc'])
+        assert result == [
+            ('node2', ['/dev/sdb', '/dev/sdc']),
+            ('node1', ['/dev/sdb']),
+        ]
+
+    def test_host_without_devices(self):
+        with pytest.raises(RuntimeError):
+            osd.parse_batch_spec(['node1:'])
+
+    def test_invalid(self):
+        with pytest.raises(RuntimeError):
+            osd.parse_batch_spec(['/no/such/spec/file'])
+
+
+class TestExpandDevices(object):
+
+    def test_literal_devices_are_kept(self):
+        assert remotes.expand_devices(['vg/lv', '/dev/sdb']) == ['vg/lv', '/dev/sdb']
+
+    def test_patterns_are_expanded(self, tmpdir):
+        for name in ['sdc', 'sdb', 'nvme0']:
+            tmpdir.join(name).write('')
+        pattern = str(tmpdir.join('sd*'))
+        result = remotes.expand_devices([pattern, str(tmpdir.join('sdb'))])
+        assert result == [str(tmpdir.join('sdb')), str(tmpdir.join('sdc'))]
+
+    def test_pattern_without_matches(self, tmpdir):
+        assert remotes.expand_devices([str(tmpdir.join('sd*'))]) == []
+
+
+class TestDiskZap(object):
+
+    def setup(self):
+        self.args = Mock(
+            host='node1',
+            disk=['/dev/sdb', '/dev/nvme0n1', 'vg/lv'],
+            username=None,
+            zap_jobs=3,
+            fast=False,
+            debug=False,
+        )
+        self.distro = Mock()
+        self.calls = []
+        self.distro.conn.batch.return_value.execute.return_value = [
+            None, None, None, '/usr/sbin/ceph-volume',
+            {'/dev/sdb': True, '/dev/nvme0n1': False, 'vg/lv': None},
+            {'/dev/sdb': [], '/dev/nvme0n1': [], 'vg/lv': None},
+            {'/dev/sdb': [], '/dev/nvme0n1': [], 'vg/lv': None},
+        ]
+
+    def run(self, conn, command, **kw):
+        self.calls.append(command)
+        return 0
+
+    def zap(self):
+        with patch('ceph_deploy.osd.hosts.get', return_value=self.distro) as get:
+            with patch('ceph_deploy.osd.stream.run', self.run):
+                osd.disk_zap(self.args)
+        return get
+
+    def test_one_connection_for_every_disk(self):
+        get = self.zap()
+        assert get.call_count == 1
+        assert self.distro.conn.batch.call_count == 1
+        assert self.distro.conn.exit.call_count == 1
+        assert sorted(self.calls) == [
+            ['/usr/sbin/ceph-volume', 'lvm', 'zap', disk]
+            for disk in sorted(self.args.disk)
+        ]
+
+    def test_fast_only_wipes_solid_state_disks(self):
+        self.args.fast = True
+        self.zap()
+        assert ['wipefs', '--all', '/dev/nvme0n1'] in self.calls
+        assert ['blkdiscard', '/dev/nvme0n1'] in self.calls
+        zapped = [command[-1] for command in self.calls if 'zap' in command]
+        assert sorted(zapped) == ['/dev/sdb', 'vg/lv']
+
+    def test_fast_leaves_devices_in_use_to_zap(self):
+        self.args.fast = True
+        self.args.disk = ['/dev/nvme0n1', '/dev/nvme1n1']
+        self.distro.conn.batch.return_value.execute.return_value = [
+            None, None, '/usr/sbin/ceph-volume',
+            {'/dev/nvme0n1': False, '/dev/nvme1n1': False},
+            {'/dev/nvme0n1': ['dm-0'], '/dev/nvme1n1': None},
+            {'/dev/nvme0n1': [], '/dev/nvme1n1': []},
+        ]
+        self.zap()
+        assert sorted(self.calls) == [
+            ['/usr/sbin/ceph-volume', 'lvm', 'zap', '/dev/nvme0n1'],
+            ['/usr/sbin/ceph-volume', 'lvm', 'zap', '/dev/nvme1n1'],
+        ]
+
+    def test_fast_leaves_mounted_devices_to_zap(self):
+        self.args.fast = True
+        self.args.disk = ['/dev/nvme0n1', '/dev/nvme1n1']
+        self.distro.conn.batch.return_value.execute.return_value = [
+            None, None, '/usr/sbin/ceph-volume',
+            {'/dev/nvme0n1': False, '/dev/nvme1n1': False},
+            {'/dev/nvme0n1': [], '/dev/nvme1n1': []},
+            {'/dev/nvme0n1': ['/var/lib/ceph/osd/ceph-0'], '/dev/nvme1n1': None},
+        ]
+        self.zap()
+        assert sorted(self.calls) == [
+            ['/usr/sbin/ceph-volume', 'lvm', 'zap', '/dev/nvme0n1'],
+            ['/usr/sbin/ceph-volume', 'lvm', 'zap', '/dev/nvme1n1'],
+        ]
+
+    def test_failed_fast_wipe_falls_back_to_zap(self):
+        self.args.fast = True
+        self.args.disk = ['/dev/nvme0n1']
+        self.distro.conn.batch.return_value.execute.return_value = [
+            None, '/usr/sbin/ceph-volume', {'/dev/nvme0n1': False}, {'/dev/nvme0n1': []},
+            {'/dev/nvme0n1': []},
+        ]
+
+        def run(conn, command, **kw):
+            self.calls.append(command)
+            return 1 if command[0] == 'blkdiscard' else 0
+        self.run = run
+        self.zap()
+        assert self.calls[-1] == ['/usr/sbin/ceph-volume', 'lvm', 'zap', '/dev/nvme0n1']
+
+    def test_failures_are_counted(self):
+        def run(conn, command, **kw):
+            if command[-1] != 'vg/lv':
+                raise RuntimeError('zap failed')
+        self.run = run
+        with pytest.raises(exc.GenericError) as error:
+            self.zap()
+        assert str(error.value) == 'Failed to zap 2 disks'
+        assert self.distro.conn.exit.call_count == 1
+
+    def test_ceph_volume_missing(self):
+        self.distro.conn.batch.return_value.execute.return_value = [None, None, None, None]
+        with pytest.raises(exc.ExecutableNotFound):
+            self.zap()
+
+
+class TestCreateBatch(object):
+
+    def setup(self):
+        self.args = Mock(
+            batch=['node1:/dev/sdb', 'node2:/dev/sdb'],
+            host=None,
+            data=None,
+            journal=None,
+            block_db=None,
+            block_wal=None,
+            zap_disk=False,
+            fs_type='xfs',
+            dmcrypt_key_dir='/etc/ceph/dmcrypt-keys',
+            filestore=False,
+            dmcrypt=False,
+            username=None,
+            jobs=1,
+            cluster='ceph',
+        )
+        self.hosts = {}
+        self.checked = []
+
+    def get(self, hostname, **kw):
+        if hostname not in self.hosts:
+            distro = Mock()
+            distro.conn.batch.return_value.execute.return_value = [None, True, ['/dev/sdb']]
+            self.hosts[hostname] = distro
+        return self.hosts[hostname]
+
+    def create(self, create_osds_batch=None):
+        with patch.multiple(
+                'ceph_deploy.osd',
+                get_bootstrap_osd_key=Mock(),
+                create_osds_batch=create_osds_batch or Mock(),
+                catch_osd_errors=lambda conn, logger, args: self.checked.append(conn),
+                time=Mock()):
+            with patch('ceph_deploy.osd.conf.ceph.load_raw'):
+                with patch('ceph_deploy.osd.inventory.forget'):
+                    with patch('ceph_deploy.osd.hosts.get', self.get):
+                        osd.create_batch(self.args, None)
+
+    def test_status_is_checked_once(self):
+        self.create()
+        assert self.checked == [self.hosts['node1'].conn]
+
+    def test_status_is_checked_on_a_host_that_worked(self):
+        def create_osds_batch(conn, **kw):
+            if conn is self.hosts['node1'].conn:
+                raise RuntimeError('ceph-volume failed')
+        with pytest.raises(exc.GenericError) as error:
+            self.create(create_osds_batch)
+        assert str(error.value) == 'Failed to create OSDs on 1 hosts'
+        assert self.checked == [self.hosts['node2'].conn]
+
+    @pytest.mark.parametrize('option, value, flag', [
+        ('zap_disk', True, '--zap-disk'),
+        ('fs_type', 'btrfs', '--fs-type'),
+        ('dmcrypt_key_dir', '/tmp/keys', '--dmcrypt-key-dir'),
+    ])
+    def test_unsupported_options(self, option, value, flag):
+        setattr(self.args, option, value)
+        with pytest.raises(RuntimeError) as error:
+            self.create()
+        assert str(error.value) == '--batch cannot be combined with %s' % flag
+        assert self.hosts == {}
+
+
+class TestDiskInventory(object):
+
+    def setup(self):
+        self.local_path = constants.local_path
+        facts.configure(ttl=60)
+        self.args = Mock(
+            host=['node1', 'node2'],
+            username=None,
+            jobs=2,
+            refresh=False,
+            min_size=None,
+            max_size=None,
+            rotational=None,
+            model=None,
+            available=False,
+            json=False,
+            batch_file=None,
+        )
+        self.probed = []
+
+    def teardown(self):
+        constants.local_path = self.local_path
+        facts.configure()
+
+    def get(self, hostname, **kw):
+        self.probed.append(hostname)
+        distro = Mock()
+        distro.conn.remote_module.inventory.return_value = ('lsblk', json.dumps({
+            'blockdevices': [
+                {'name': 'sdb', 'size': 4000787030016, 'rota': True, 'type': 'disk'},
+                {'name': 'nvme0n1', 'size': 1600321314816, 'rota': False, 'type': 'disk',
+                 'children': [{'name': 'nvme0n1p1', 'type': 'part'}]},
+            ],
+        }))
+        return distro
+
+    def inventory(self):
+        with patch('ceph_deploy.osd.hosts.get', self.get):
+            osd.disk_inventory(self.args)
+
+    def test_cached_after_the_first_run(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        self.inventory()
+        self.inventory()
+        assert sorted(self.probed) == ['node1', 'node2']
+        self.args.refresh = True
+        self.inventory()
+        assert len(self.probed) == 4
+
+    def test_batch_file_has_available_disks(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        self.args.batch_file = str(tmpdir.join('osds.txt'))
+        self.args.rotational = True
+        self.inventory()
+        assert osd.parse_batch_spec([self.args.batch_file]) == [
+            ('node1', ['/dev/sdb']),
+            ('node2', ['/dev/sdb']),
+        ]
+
+    def test_unparseable_output_fails_the_host(self, tmpdir, capsys):
+        constants.local_path = str(tmpdir)
+        self.args.json = True
+        get = self.get
+
+        def broken(hostname, **kw):
+            distro = get(hostname, **kw)
+            if hostname == 'node2':
+                distro.conn.remote_module.inventory.return_value = ('lsblk', 'lsblk: unknown option')
+            return distro
+
+        with patch('ceph_deploy.osd.hosts.get', broken):
+            with pytest.raises(exc.GenericError) as error:
+                osd.disk_inventory(self.args)
+        assert str(error.value) == 'Failed to collect the disks of 1 hosts'
+        out, _ = capsys.readouterr()
+        assert sorted(json.loads(out)) == ['node1']
+
+    def test_json(self, tmpdir, capsys):
+        constants.local_path = str(tmpdir)
+        self.args.json = True
+        self.args.available = True
+        self.inventory()
+        out, _ = capsys.readouterr()
+        result = json.loads(out)
+        assert sorted(result) == ['node1', 'node2']
+        assert [d['path'] for d in result['node1']] == ['/dev/sdb']
@@ -126,3 +126,16 @@ class TestSubnet(object):
             validator('3.3.3.3')
         message = error.value.message
         assert 'must contain a slash' in message
+
+    def test_ipv6_and_lists_are_valid(self):
+        validator = arg_validators.Subnet()
+        value = '10.0.0.0/16, 2001:db8::/64'
+        assert validator(value) == value
+
+    def test_bad_prefix_length(self):
+        validator = arg_validators.Subnet()
+
+        with raises(ArgumentError) as error:
+            validator('10.0.0.0/16,2001:db8::/200')
+        message = error.value.message
+        assert 'invalid prefix length' in message
@@ -0,0 +1,152 @@
+try:
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import HTTPError, urlopen
+import threading
+
+import pytest
+from mock import patch
+
+from ceph_deploy.util import cache
+
+
+class FakeResponse(object):
+
+    def __init__(self, content):
+        self.content = content
+
+    def read(self, size=-1):
+        content, self.content = self.content, b''
+        return content
+
+    def close(self):
+        pass
+
+
+class TestUrls(object):
+
+    def setup(self):
+        self.cache = cache.Cache(port=8080, path='/cache')
+
+    def test_url_goes_through_the_cache(self):
+        url = self.cache.url('https://download.ceph.com/rpm-luminous/el7/', '10.0.0.1')
+        assert url == 'http://10.0.0.1:8080/https/download.ceph.com/rpm-luminous/el7/'
+
+    def test_ipv6_addresses(self):
+        url = self.cache.url('https://download.ceph.com/keys/release.asc', 'fd00::1')
+        assert url == 'http://[fd00::1]:8080/https/download.ceph.com/keys/release.asc'
+
+    def test_upstream(self):
+        self.cache.url('https://download.ceph.com/rpm-luminous/el7/', '10.0.0.1')
+        upstream = self.cache.upstream('/https/download.ceph.com/keys/release.asc')
+        assert upstream == 'https://download.ceph.com/keys/release.asc'
+
+    def test_upstream_of_urls_never_rewritten(self):
+        self.cache.url('https://download.ceph.com/rpm-luminous/el7/', '10.0.0.1')
+        assert self.cache.upstream('/http/download.ceph.com/keys/release.asc') is None
+        assert self.cache.upstream('/https/example.com/index.html') is None
+
+    def test_upstream_of_other_paths(self):
+        assert self.cache.upstream('/favicon.ico') is None
+        assert self.cache.upstream('/file/host/etc/passwd') is None
+
+    def test_no_parent_directories(self):
+        self.cache.url('https://download.ceph.com/', '10.0.0.1')
+        assert self.cache.upstream('/https/download.ceph.com/../../etc/passwd') is None
+
+    def test_local_path(self):
+        path = self.cache.local_path('https://download.ceph.com/debian-luminous/dists/xenial/Release')
+        assert path == '/cache/https/download.ceph.com/debian-luminous/dists/xenial/Release'
+
+
+class TestFetch(object):
+
+    def setup(self):
+        self.downloads = []
+
+    def urlopen(self, url):
+        self.downloads.append(url)
+        return FakeResponse(b'contents of %s' % url.encode('utf-8'))
+
+    def test_packages_are_downloaded_once(self, tmpdir):
+        url = 'https://download.ceph.com/rpm-luminous/el7/x86_64/ceph-12.2.13-0.el7.x86_64.rpm'
+        with patch('ceph_deploy.util.cache.urlopen', self.urlopen):
+            path = cache.Cache(path=str(tmpdir)).fetch(url)
+            # a later run too
+            assert cache.Cache(path=str(tmpdir)).fetch(url) == path
+        assert self.downloads == [url]
+        with open(path, 'rb') as f:
+            assert f.read() == b'contents of ' + url.encode('utf-8')
+
+    def test_metadata_is_downloaded_once_per_run(self, tmpdir):
+        url = 'https://download.ceph.com/rpm-luminous/el7/x86_64/repodata/repomd.xml'
+        with patch('ceph_deploy.util.cache.urlopen', self.urlopen):
+            package_cache = cache.Cache(path=str(tmpdir))
+            package_cache.fetch(url)
+            package_cache.fetch(url)
+            cache.Cache(path=str(tmpdir)).fetch(url)
+        assert self.downloads == [url, url]
+
+    def test_concurrent_requests_download_once(self, tmpdir):
+        url = 'https://download.ceph.com/keys/release.asc'
+        package_cache = cache.Cache(path=str(tmpdir))
+        with patch('ceph_deploy.util.cache.urlopen', self.urlopen):
+            threads = [
+                threading.Thread(target=package_cache.fetch, args=(url,))
+                for _ in range(10)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert self.downloads == [url]
+        assert package_cache.hits == 9
+
+    def test_failed_downloads_leave_nothing_behind(self, tmpdir):
+        url = 'https://download.ceph.com/keys/release.asc'
+        response = FakeResponse(b'')
+        response.read = lambda size=-1: 1 / 0
+        with patch('ceph_deploy.util.cache.urlopen', lambda url: response):
+            with pytest.raises(ZeroDivisionError):
+                cache.Cache(path=str(tmpdir)).fetch(url)
+        assert tmpdir.join('https', 'download.ceph.com', 'keys').listdir() == []
+
+
+class TestServer(object):
+
+    def setup(self):
+        self.package_cache = None
+
+    def teardown(self):
+        if self.package_cache is not None:
+            self.package_cache.stop()
+
+    def get(self, tmpdir, upstream):
+        self.package_cache = cache.Cache(path=str(tmpdir))
+        self.package_cache.start()
+        url = self.package_cache.url(upstream, '127.0.0.1')
+        with patch('ceph_deploy.util.cache.urlopen', lambda url: FakeResponse(b'key')):
+            return urlopen(url)
+
+    def test_serves_through_http(self, tmpdir):
+        response = self.get(tmpdir, 'https://download.ceph.com/keys/release.asc')
+        assert response.read() == b'key'
+
+    def test_unknown_paths(self, tmpdir):
+        with pytest.raises(HTTPError) as error:
+            self.get(tmpdir, 'ftp://download.ceph.com/keys/release.asc')
+        assert error.value.code == 404
+
+    def test_is_not_an_open_proxy(self, tmpdir):
+        self.get(tmpdir, 'https://download.ceph.com/keys/release.asc')
+        url = 'http://127.0.0.1:%d/https/example.com/index.html' % self.package_cache.port
+        with pytest.raises(HTTPError) as error:
+            urlopen(url)
+        assert error.value.code == 404
+
+    def test_listens_on_the_given_addresses_only(self, tmpdir):
+        self.package_cache = cache.Cache(path=str(tmpdir), addresses=['127.0.0.1'])
+        self.package_cache.start()
+        addresses = [server.server_address for server in self.package_cache.servers]
+        assert addresses == [('127.0.0.1', self.package_cache.port)]
@@ -0,0 +1,81 @@
+import json
+import time
+
+from ceph_deploy.util import constants, facts
+
+
+class TestFacts(object):
+
+    def setup(self):
+        self.local_path = constants.local_path
+        facts.configure(ttl=60)
+
+    def teardown(self):
+        constants.local_path = self.local_path
+        facts.configure()
+
+    def test_save_and_load(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.save('node1', {'name': 'Ubuntu'})
+        assert facts.load('node1') == {'name': 'Ubuntu'}
+        assert tmpdir.join('facts', 'node1.json').check(file=True)
+
+    def test_missing_host(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        assert facts.load('node1') is None
+
+    def test_disabled(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.configure()
+        facts.save('node1', {'name': 'Ubuntu'})
+        assert facts.load('node1') is None
+        assert not tmpdir.join('facts').check()
+
+    def test_ttl_from_config_file_string(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.configure(ttl='60')
+        facts.save('node1', {'name': 'Ubuntu'})
+        assert facts.load('node1') == {'name': 'Ubuntu'}
+
+    def test_stale_facts_are_ignored(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        tmpdir.mkdir('facts').join('node1.json').write(
+            json.dumps({'timestamp': time.time() - 120, 'facts': {'name': 'Ubuntu'}}))
+        assert facts.load('node1') is None
+
+    def test_corrupt_facts_are_ignored(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        tmpdir.mkdir('facts').join('node1.json').write('{not json')
+        assert facts.load('node1') is None
+
+    def test_refresh_ignores_cache_but_saves(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.save('node1', {'name': 'Ubuntu'})
+        facts.configure(ttl=60, refresh=True)
+        assert facts.load('node1') is None
+        facts.save('node1', {'name': 'CentOS'})
+        facts.configure(ttl=60)
+        assert facts.load('node1') == {'name': 'CentOS'}
+
+    def test_read_and_write_other_caches(self, tmpdir):
+        path = str(tmpdir.join('cache', 'node1.json'))
+        facts.write(path, 'devices', ['/dev/sdb'])
+        assert facts.read(path, 'devices') == ['/dev/sdb']
+        assert facts.read(path, 'facts') is None
+        assert tmpdir.join('cache').listdir() == [tmpdir.join('cache', 'node1.json')]
+
+    def test_update(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.save('node1', {'name': 'Ubuntu'})
+        facts.update('node1', init='systemd')
+        assert facts.load('node1') == {'name': 'Ubuntu', 'init': 'systemd'}
+
+    def test_forget(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.save('node1', {'name': 'Ubuntu'})
+        facts.forget('node1')
+        assert facts.load('node1') is None
+
+    def test_forget_missing_host(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.forget('node1')
@@ -0,0 +1,52 @@
+from mock import Mock
+
+from ceph_deploy.hosts import remotes
+from ceph_deploy.util import files
+
+
+def fake_conn(digests):
+    conn = Mock()
+    conn.remote_module.run_batch.side_effect = [digests, None]
+    return conn
+
+
+class TestDigest(object):
+
+    def test_text_and_bytes_agree(self):
+        assert files.digest('[global]\n') == files.digest(b'[global]\n')
+
+    def test_matches_the_remote_digest(self, tmpdir):
+        path = tmpdir.join('keyring')
+        path.write_binary(b'\x00key')
+        assert files.digest(b'\x00key') == remotes.file_digest(str(path))
+
+
+class TestPush(object):
+
+    def setup(self):
+        self.files = [
+            files.conf_file('ceph', '[global]\n', False),
+            files.plain_file('/etc/ceph/ceph.client.admin.keyring', b'key', 0o600),
+        ]
+
+    def test_asks_for_digests_first(self):
+        conn = fake_conn([None, None])
+        files.push(conn, self.files)
+        digests = conn.remote_module.run_batch.call_args_list[0][0][0]
+        assert digests == [
+            ('file_digest', ('/etc/ceph/ceph.conf', None)),
+            ('file_digest', ('/etc/ceph/ceph.client.admin.keyring', 0o600)),
+        ]
+
+    def test_writes_what_changed(self):
+        conn = fake_conn([files.digest('[global]\n'), 'stale'])
+        assert files.push(conn, self.files) is True
+        writes = conn.remote_module.run_batch.call_args_list[1][0][0]
+        assert writes == [
+            ('write_file', ('/etc/ceph/ceph.client.admin.keyring', b'key', 0o600)),
+        ]
+
+    def test_nothing_is_sent_when_unchanged(self):
+        conn = fake_conn([files.digest('[global]\n'), files.digest(b'key')])
+        assert files.push(conn, self.files) is False
+        assert conn.remote_module.run_batch.call_count == 1
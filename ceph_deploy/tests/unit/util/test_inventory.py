@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+from ceph_deploy.util import constants, facts, inventory
+
+
+LSBLK = json.dumps({'blockdevices': [
+    {'name': 'sda', 'size': '480103981056', 'rota': '0', 'model': 'SAMSUNG MZ7LM480',
+     'type': 'disk', 'mountpoint': None, 'fstype': None,
+     'children': [{'name': 'sda1', 'size': '480102932480', 'rota': '0', 'type': 'part',
+                   'mountpoint': '/', 'fstype': 'xfs'}]},
+    {'name': 'sdb', 'size': 4000787030016, 'rota': True, 'model': 'ST4000NM0035   ',
+     'type': 'disk', 'mountpoint': None, 'fstype': None},
+    {'name': 'sr0', 'size': 1073741312, 'rota': True, 'model': 'QEMU DVD-ROM',
+     'type': 'rom', 'mountpoint': None, 'fstype': None},
+]})
+
+CEPH_VOLUME = json.dumps([
+    {'path': '/dev/nvme0n1', 'available': True, 'rejected_reasons': [],
+     'sys_api': {'size': 1600321314816.0, 'rotational': '0', 'model': 'INTEL SSDPE2KE016T8'}},
+    {'path': '/dev/sdc', 'available': False, 'rejected_reasons': ['LVM detected'],
+     'sys_api': {'size': 4000787030016.0, 'rotational': '1', 'model': 'ST4000NM0035'}},
+])
+
+
+class TestParseSize(object):
+
+    @pytest.mark.parametrize('value, size', [
+        ('1024', 1024),
+        ('500G', 500 << 30),
+        ('1.5T', 3 << 39),
+        ('2tib', 2 << 40),
+        ('10 MB', 10 << 20),
+    ])
+    def test_sizes(self, value, size):
+        assert inventory.parse_size(value) == size
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            inventory.parse_size('lots')
+
+    def test_human_size(self):
+        assert inventory.human_size(512) == '512B'
+        assert inventory.human_size(4000787030016) == '3.64TB'
+
+
+class TestParse(object):
+
+    def test_lsblk(self):
+        assert inventory.parse('lsblk', LSBLK) == [
+            {'path': '/dev/sda', 'size': 480103981056, 'rotational': False,
+             'model': 'SAMSUNG MZ7LM480', 'available': False, 'reasons': ['has partitions']},
+            {'path': '/dev/sdb', 'size': 4000787030016, 'rotational': True,
+             'model': 'ST4000NM0035', 'available': True, 'reasons': []},
+        ]
+
+    def test_ceph_volume(self):
+        devices = inventory.parse('ceph-volume', CEPH_VOLUME)
+        assert devices[0] == {
+            'path': '/dev/nvme0n1', 'size': 1600321314816, 'rotational': False,
+            'model': 'INTEL SSDPE2KE016T8', 'available': True, 'reasons': [],
+        }
+        assert devices[1]['rotational'] is True
+        assert devices[1]['reasons'] == ['LVM detected']
+
+    def test_nothing_to_parse(self):
+        with pytest.raises(RuntimeError):
+            inventory.parse(None, None)
+
+
+class TestSelect(object):
+
+    def setup(self):
+        self.devices = inventory.parse('ceph-volume', CEPH_VOLUME) + inventory.parse('lsblk', LSBLK)
+
+    def paths(self, **kw):
+        return [device['path'] for device in inventory.select(self.devices, **kw)]
+
+    def test_no_filters(self):
+        assert self.paths() == ['/dev/nvme0n1', '/dev/sdc', '/dev/sda', '/dev/sdb']
+
+    def test_size(self):
+        assert self.paths(min_size=inventory.parse_size('1T')) == ['/dev/nvme0n1', '/dev/sdc', '/dev/sdb']
+        assert self.paths(max_size=inventory.parse_size('2T')) == ['/dev/nvme0n1', '/dev/sda']
+
+    def test_rotational_model_and_availability(self):
+        assert self.paths(rotational=False, available=True) == ['/dev/nvme0n1']
+        assert self.paths(model='st4000*') == ['/dev/sdc', '/dev/sdb']
+        assert self.paths(model='*samsung*', available=True) == []
+
+
+class TestCache(object):
+
+    def setup(self):
+        self.local_path = constants.local_path
+        facts.configure(ttl=60)
+
+    def teardown(self):
+        constants.local_path = self.local_path
+        facts.configure()
+
+    def test_save_load_and_forget(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        devices = inventory.parse('lsblk', LSBLK)
+        inventory.save('node1', devices)
+        assert inventory.load('node1') == devices
+        inventory.forget('node1')
+        assert inventory.load('node1') is None
+
+    def test_follows_the_facts_settings(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        inventory.save('node1', [])
+        facts.configure(ttl=60, refresh=True)
+        assert inventory.load('node1') is None
+        facts.configure()
+        inventory.save('node2', [])
+        assert not tmpdir.join('inventory', 'node2.json').check()
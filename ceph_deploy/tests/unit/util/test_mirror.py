@@ -0,0 +1,144 @@
+import threading
+
+from mock import patch
+
+from ceph_deploy.util import mirror
+
+
+class Transfers(object):
+    """
+    Stands in for ``mirror.transfer``, recording every transfer and failing
+    the ones in ``failing`` (pairs of source and host).
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, source, hostname, path, username=None, bwlimit=None, plain=False):
+        with self.lock:
+            self.calls.append((source, hostname, bwlimit, plain))
+        if (source, hostname) in self.failing:
+            raise RuntimeError('could not sync %s' % hostname)
+
+
+class TestRsyncCommand(object):
+
+    def test_syncs_directory_contents_as_root(self):
+        command = mirror.rsync_command('/mirror', 'node1:/opt/ceph-deploy/repo')
+        assert command[0] == 'rsync'
+        assert command[-2:] == ['/mirror/', 'node1:/opt/ceph-deploy/repo/']
+        assert 'sudo rsync' in command
+        assert '--delete' in command
+        assert not [part for part in command if part.startswith('--bwlimit')]
+
+    def test_bandwidth_limit(self):
+        command = mirror.rsync_command('/mirror/', 'node1:/repo', bwlimit=500)
+        assert '--bwlimit=500' in command
+        assert command[-2:] == ['/mirror/', 'node1:/repo/']
+
+
+    def test_multiplexing_only_when_asked(self):
+        with patch.object(mirror.connection, 'ssh_options', return_value='-o ControlPath=/c/%C'):
+            local = mirror.rsync_command('/mirror', 'node1:/repo', multiplex=True)
+            remote = mirror.rsync_command('/repo', 'node2:/repo')
+        assert local[local.index('-e') + 1] == 'ssh -o BatchMode=yes -o ControlPath=/c/%C'
+        assert remote[remote.index('-e') + 1] == 'ssh -o BatchMode=yes'
+
+
+class TestTransfer(object):
+
+    def transfer(self, source):
+        with patch.object(mirror.connection, 'get_local_connection'):
+            with patch.object(mirror.connection, 'get_connection'):
+                with patch.object(mirror.stream, 'run') as run:
+                    mirror.transfer(source, 'node2', '/mirror', bwlimit=100)
+        return run
+
+    def test_rsync_is_never_timed_out(self):
+        run = self.transfer('node1')
+        assert run.call_args[1]['timeout'] == mirror.stream.FOREVER
+
+    def test_only_this_node_uses_its_multiplexing(self):
+        with patch.object(mirror, 'rsync_command') as rsync_command:
+            self.transfer(None)
+            self.transfer('node1')
+        assert [call[1]['multiplex'] for call in rsync_command.call_args_list] == [True, False]
+
+
+class TestSync(object):
+
+    def setup(self):
+        self.hosts = ['node%d' % i for i in range(1, 8)]
+
+    def sync(self, transfers, **kw):
+        with patch.object(mirror, 'transfer', transfers):
+            return mirror.sync(self.hosts, '/mirror', **kw)
+
+    def test_plain_sync_from_this_node(self):
+        transfers = Transfers()
+        assert self.sync(transfers, jobs=3) == []
+        assert sorted(call[1] for call in transfers.calls) == self.hosts
+        assert set(call[0] for call in transfers.calls) == set([None])
+        assert all(call[3] for call in transfers.calls)
+
+    def test_bandwidth_is_shared_by_concurrent_transfers(self):
+        transfers = Transfers()
+        self.sync(transfers, jobs=4, bwlimit=1000)
+        assert set(call[2] for call in transfers.calls) == set([250])
+        assert not any(call[3] for call in transfers.calls)
+
+    def test_bandwidth_limit_is_never_zero(self):
+        transfers = Transfers()
+        self.sync(transfers, jobs=7, bwlimit=3)
+        assert set(call[2] for call in transfers.calls) == set([1])
+
+    def test_fanout_doubles_sources(self):
+        transfers = Transfers()
+        self.sync(transfers, jobs=10, fanout=True)
+        calls = [call[:2] for call in transfers.calls]
+        assert calls[0] == (None, 'node1')
+        assert set(calls[1:3]) == set([(None, 'node2'), ('node1', 'node3')])
+        assert set(calls[3:7]) == set([
+            (None, 'node4'), ('node1', 'node5'), ('node2', 'node6'), ('node3', 'node7'),
+        ])
+
+    def test_fanout_is_capped_by_jobs(self):
+        transfers = Transfers()
+        self.sync(transfers, jobs=2, fanout=True)
+        calls = [call[:2] for call in transfers.calls]
+        assert calls[0] == (None, 'node1')
+        assert sorted(call[1] for call in calls) == self.hosts
+        assert set(call[0] for call in calls) == set([None, 'node1'])
+
+    def test_failed_hosts_are_not_sources(self):
+        transfers = Transfers(failing=[(None, 'node1')])
+        failed = self.sync(transfers, jobs=10, fanout=True)
+        assert failed == ['node1']
+        assert 'node1' not in [call[0] for call in transfers.calls]
+        assert sorted(call[1] for call in transfers.calls) == self.hosts
+
+    def test_retries_from_this_node_when_a_source_fails(self):
+        transfers = Transfers(failing=[('node1', 'node3')])
+        failed = self.sync(transfers, jobs=10, fanout=True)
+        assert failed == []
+        assert (None, 'node3') in [call[:2] for call in transfers.calls]
+
+    def test_every_retry_is_from_this_node(self):
+        transfers = Transfers(failing=[('node1', 'node3'), ('node1', 'node5'), ('node2', 'node6')])
+        failed = self.sync(transfers, jobs=10, fanout=True)
+        assert failed == []
+        calls = [call[:2] for call in transfers.calls]
+        for hostname in ('node3', 'node5', 'node6'):
+            assert (None, hostname) in calls
+
+    def test_retries_are_not_retried(self):
+        transfers = Transfers(failing=[('node1', 'node3'), (None, 'node3')])
+        failed = self.sync(transfers, jobs=10, fanout=True)
+        assert failed == ['node3']
+        assert [call[:2] for call in transfers.calls].count((None, 'node3')) == 1
+
+    def test_reports_hosts_that_could_not_be_synced(self):
+        transfers = Transfers(failing=[(None, 'node2'), (None, 'node5')])
+        assert sorted(self.sync(transfers, jobs=3)) == ['node2', 'node5']
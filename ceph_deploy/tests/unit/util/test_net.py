@@ -8,9 +8,10 @@ try:
 except ImportError:
     from io import StringIO
 
-from ceph_deploy.util import net
+from ceph_deploy.util import constants, facts, net
 from ceph_deploy.tests import util
 import pytest
+from mock import Mock
 
 
 # The following class adds about 1900 tests via py.test generation
@@ -42,6 +43,89 @@ class TestIpInSubnet(object):
         assert net.ip_in_subnet(ip, "10.9.1.0/24") is False
 
 
+class TestNetwork(object):
+
+    def test_host_bits_are_ignored(self):
+        assert '10.0.200.1' in net.Network('10.0.0.1/16')
+
+    def test_ipv6(self):
+        network = net.Network('2001:db8::/64')
+        assert '2001:db8::10' in network
+        assert '2001:db8:0:1::10' not in network
+
+    def test_scope_is_ignored(self):
+        assert 'fe80::1%eth0' in net.Network('fe80::/10')
+
+    def test_versions_do_not_mix(self):
+        assert '::ffff:10.0.0.1' not in net.Network('10.0.0.0/8')
+        assert '10.0.0.1' not in net.Network('::/0')
+
+    @pytest.mark.parametrize('cidr', ['10.0.0.0', '10.0.0.0/33', 'fe80::/129', 'foo/8'])
+    def test_invalid(self, cidr):
+        with pytest.raises(ValueError):
+            net.Network(cidr)
+
+    def test_ip_in_subnet_ipv6(self):
+        assert net.ip_in_subnet('2001:db8::1', '2001:db8::/32')
+
+
+class TestSubnetTable(object):
+
+    def setup(self):
+        self.table = net.SubnetTable(
+            public='10.0.0.0/16, 10.1.0.0/16,2001:db8::/64',
+            cluster=['10.0.0.0/8', None],
+        )
+
+    def test_classify(self):
+        assert self.table.classify(['10.1.2.3', '10.2.0.1', '2001:db8::5', '127.0.0.1', 'bogus']) == {
+            '10.1.2.3': ['cluster', 'public'],
+            '10.2.0.1': ['cluster'],
+            '2001:db8::5': ['public'],
+            '127.0.0.1': [],
+            'bogus': [],
+        }
+
+    def test_most_specific_network_first(self):
+        assert [str(network) for _, network in self.table.match('10.0.0.1')] == [
+            '10.0.0.0/16', '10.0.0.0/8'
+        ]
+
+    def test_groups(self):
+        assert [str(n) for n in self.table.groups['public']] == [
+            '10.0.0.0/16', '10.1.0.0/16', '2001:db8::/64'
+        ]
+        assert net.SubnetTable(public=None).groups == {'public': []}
+
+
+class TestResolver(object):
+
+    def test_looks_up_once(self, monkeypatch):
+        calls = []
+
+        def getaddrinfo(host, port):
+            calls.append(host)
+            return [(None, None, None, None, ('10.0.0.1', 0))]
+        monkeypatch.setattr(net.socket, 'getaddrinfo', getaddrinfo)
+        resolver = net.Resolver()
+        assert net.get_nonlocal_ip('node1', resolver=resolver) == '10.0.0.1'
+        assert net.get_nonlocal_ip('node1', resolver=resolver) == '10.0.0.1'
+        assert calls == ['node1']
+
+    def test_failures_are_cached(self, monkeypatch):
+        calls = []
+
+        def getaddrinfo(host, port):
+            calls.append(host)
+            raise net.socket.gaierror('nope')
+        monkeypatch.setattr(net.socket, 'getaddrinfo', getaddrinfo)
+        resolver = net.Resolver()
+        for _ in range(2):
+            with pytest.raises(net.exc.UnableToResolveError):
+                net.get_nonlocal_ip('node1', resolver=resolver)
+        assert calls == ['node1']
+
+
 class TestGetRequest(object):
 
     def test_urlopen_fails(self, monkeypatch):
@@ -51,3 +135,56 @@ class TestGetRequest(object):
         monkeypatch.setattr(net, 'urlopen', bad_urlopen)
         with pytest.raises(RuntimeError):
             net.get_request('https://example.ceph.com')
+
+
+class TestLinuxInterfaces(object):
+
+    def setup(self):
+        self.local_path = constants.local_path
+        self.conn = Mock(hostname='node1')
+        self.conn.remote_module.interfaces.return_value = (
+            'json', {'eth0': {'up': True, 'inet': [{'address': '10.0.0.1'}]}}
+        )
+
+    def teardown(self):
+        constants.local_path = self.local_path
+        facts.configure()
+
+    def test_json_result_is_used_as_is(self):
+        assert net.linux_interfaces(self.conn) == {
+            'eth0': {'up': True, 'inet': [{'address': '10.0.0.1'}]}
+        }
+
+    def test_ip_output_is_parsed(self):
+        self.conn.remote_module.interfaces.return_value = (
+            'ip',
+            '2: eth0: <BROADCAST,UP,LOWER_UP> mtu 1500\n'
+            '    inet 10.0.0.1/24 brd 10.0.0.255 scope global eth0\n'
+        )
+        ifaces = net.linux_interfaces(self.conn)
+        assert ifaces['eth0']['up'] is True
+        assert ifaces['eth0']['inet'][0]['netmask'] == '255.255.255.0'
+
+    def test_no_tools(self):
+        self.conn.remote_module.interfaces.return_value = (None, None)
+        assert net.linux_interfaces(self.conn) == {}
+
+    def test_cached_with_host_facts(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.configure(ttl=60)
+        facts.save('node1', {'name': 'Ubuntu'})
+        first = net.linux_interfaces(self.conn)
+        assert net.linux_interfaces(self.conn) == first
+        assert self.conn.remote_module.interfaces.call_count == 1
+        assert facts.load('node1')['interfaces'] == first
+
+    def test_cached_under_the_plain_hostname(self, tmpdir):
+        constants.local_path = str(tmpdir)
+        facts.configure(ttl=60)
+        facts.save('node1', {'name': 'Ubuntu'})
+        self.conn.hostname = 'ceph@node1'
+        first = net.linux_interfaces(self.conn, hostname='node1')
+        assert net.linux_interfaces(self.conn, hostname='node1') == first
+        assert self.conn.remote_module.interfaces.call_count == 1
+        assert facts.load('node1')['interfaces'] == first
+        assert facts.load('ceph@node1') is None
@@ -41,3 +41,53 @@ class TestCephVersion(object):
         _check = Mock(return_value=(version, b'', 1))
         c = packages.Ceph(Mock(), _check=_check)
         assert c._get_version_output() == '9.0.1-kjh234h123hd'
+
+
+class TestInstalledVersions(object):
+
+    def test_rpm(self):
+        _check = Mock(return_value=([
+            b'ceph installed 12.2.13-0.el7',
+            b'package ceph-mon is not installed',
+        ], [], 1))
+        result = packages.installed_versions(Mock(), ['ceph', 'ceph-mon'], True, _check=_check)
+        assert result == {'ceph': '12.2.13-0.el7'}
+        assert _check.call_args[0][1][:2] == ['rpm', '-q']
+
+    def test_deb_drops_epochs_and_removed_packages(self):
+        _check = Mock(return_value=([
+            b'ceph installed 12.2.13-1xenial',
+            b'ceph-mon installed 2:12.2.13-1xenial',
+            b'ceph-osd config-files 12.2.13-1xenial',
+        ], [], 0))
+        result = packages.installed_versions(
+            Mock(), ['ceph', 'ceph-mon', 'ceph-osd'], False, _check=_check)
+        assert result == {'ceph': '12.2.13-1xenial', 'ceph-mon': '12.2.13-1xenial'}
+        assert _check.call_args[0][1][0] == 'dpkg-query'
+
+
+class TestReleaseInstalled(object):
+
+    def check(self, *lines):
+        return Mock(return_value=([line.encode('utf-8') for line in lines], [], 0))
+
+    def test_every_package_from_the_release(self):
+        _check = self.check('ceph installed 12.2.13-0.el7', 'ceph-mon installed 12.2.1-0.el7')
+        assert packages.release_installed(
+            Mock(), ['ceph', 'ceph-mon'], 'luminous', True, _check=_check) is True
+
+    def test_missing_package(self):
+        _check = self.check('ceph installed 12.2.13-0.el7')
+        assert packages.release_installed(
+            Mock(), ['ceph', 'ceph-mon'], 'luminous', True, _check=_check) is False
+
+    def test_other_release(self):
+        _check = self.check('ceph installed 13.2.10-0.el7')
+        assert packages.release_installed(
+            Mock(), ['ceph'], 'luminous', True, _check=_check) is False
+
+    def test_unknown_release_is_not_checked(self):
+        _check = self.check('ceph installed 0.94.10-0.el7')
+        assert packages.release_installed(
+            Mock(), ['ceph'], 'dumpling', True, _check=_check) is False
+        assert _check.called is False
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+
+from pytest import raises
+
+from ceph_deploy.util import parallel
+
+
+class RecordingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestExecute(object):
+
+    def test_calls_every_item(self):
+        seen = []
+        parallel.execute(seen.append, ['a', 'b', 'c'])
+        assert seen == ['a', 'b', 'c']
+
+    def test_calls_every_item_concurrently(self):
+        seen = []
+        parallel.execute(seen.append, ['a', 'b', 'c'], jobs=3)
+        assert sorted(seen) == ['a', 'b', 'c']
+
+    def test_counts_runtime_errors(self):
+        def fail(item):
+            raise RuntimeError(item)
+        assert parallel.execute(fail, ['a', 'b'], logger=logging.getLogger('test')) == 2
+
+    def test_counts_runtime_errors_concurrently(self):
+        def fail_on_b(item):
+            if item == 'b':
+                raise RuntimeError(item)
+        assert parallel.execute(fail_on_b, ['a', 'b', 'c'], jobs=2) == 1
+
+    def test_other_errors_are_raised(self):
+        def fail(item):
+            raise ValueError(item)
+        with raises(ValueError):
+            parallel.execute(fail, ['a', 'b'], jobs=2)
+
+    def test_no_items(self):
+        assert parallel.execute(lambda item: None, [], jobs=4) == 0
+
+    def test_runs_at_most_jobs_at_once(self):
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def work(item):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+
+        parallel.execute(work, range(6), jobs=2)
+        assert state['peak'] == 2
+
+
+class TestRace(object):
+
+    def test_first_winner(self):
+        released = threading.Event()
+
+        def work(item, cancelled):
+            if item == 'slow':
+                released.wait(5)
+            return True
+
+        try:
+            assert parallel.race(work, ['slow', 'fast'], grace=0) == 'fast'
+        finally:
+            released.set()
+
+    def test_losers_are_cancelled(self):
+        stopped = threading.Event()
+
+        def work(item, cancelled):
+            if item == 'winner':
+                return True
+            cancelled.wait(5)
+            stopped.set()
+            return False
+
+        assert parallel.race(work, ['loser', 'winner']) == 'winner'
+        # losers are given the time to stop before returning
+        assert stopped.is_set()
+
+    def test_losers_are_waited_for_a_bounded_time(self):
+        released = threading.Event()
+
+        def work(item, cancelled):
+            if item == 'stuck':
+                released.wait(5)
+            return item == 'winner'
+
+        start = time.time()
+        try:
+            assert parallel.race(work, ['stuck', 'winner'], grace=0.2) == 'winner'
+        finally:
+            released.set()
+        assert time.time() - start < 2
+
+    def test_no_winner(self):
+        def fail(item, cancelled):
+            if item == 'b':
+                raise RuntimeError(item)
+            return False
+        assert parallel.race(fail, ['a', 'b', 'c']) is None
+
+    def test_single_item(self):
+        assert parallel.race(lambda item, cancelled: True, ['a']) == 'a'
+        assert parallel.race(lambda item, cancelled: False, ['a']) is None
+        assert parallel.race(lambda item, cancelled: True, []) is None
+
+    def test_other_errors_are_raised(self):
+        def fail(item, cancelled):
+            raise ValueError(item)
+        with raises(ValueError):
+            parallel.race(fail, ['a', 'b'])
+
+
+class TestGroupedLogs(object):
+
+    def setup(self):
+        self.handler = RecordingHandler()
+        logging.getLogger().addHandler(self.handler)
+
+    def teardown(self):
+        logging.getLogger().removeHandler(self.handler)
+
+    def test_logs_are_not_interleaved(self):
+        def work(hostname):
+            logger = logging.getLogger(hostname)
+            for i in range(3):
+                logger.warning('%s %s', hostname, i)
+                time.sleep(0.01)
+
+        parallel.execute(work, ['host1', 'host2'], jobs=2)
+        messages = self.handler.messages
+        assert len(messages) == 6
+        first = messages[0].split()[0]
+        assert messages[:3] == ['%s %s' % (first, i) for i in range(3)]
+
+    def test_root_handlers_are_restored(self):
+        handlers = logging.getLogger().handlers[:]
+        parallel.execute(lambda item: None, ['host1', 'host2'], jobs=2)
+        assert logging.getLogger().handlers == handlers
+
+    def test_live_records_are_not_held_back(self):
+        grouped = parallel.GroupedLogs()
+        with grouped:
+            grouped.start()
+            logging.getLogger('host1').warning('held')
+            logging.getLogger('host1').warning('live', extra={'live': True})
+            assert self.handler.messages == ['live']
+            grouped.finish()
+        assert self.handler.messages == ['live', 'held']
+
+    def test_big_groups_are_dispatched_early(self):
+        grouped = parallel.GroupedLogs(max_records=2)
+        with grouped:
+            grouped.start()
+            for i in range(3):
+                logging.getLogger('host1').warning('%s', i)
+            assert self.handler.messages == ['0', '1']
+            grouped.finish()
+        assert self.handler.messages == ['0', '1', '2']
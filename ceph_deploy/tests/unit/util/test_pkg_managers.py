@@ -5,7 +5,7 @@ from ceph_deploy.util import pkg_managers
 class TestApt(object):
 
     def setup(self):
-        self.to_patch = 'ceph_deploy.util.pkg_managers.remoto.process.run'
+        self.to_patch = 'ceph_deploy.util.pkg_managers.stream.run'
 
     def test_install_single_package(self):
         fake_run = Mock()
@@ -43,7 +43,7 @@ class TestApt(object):
 class TestYum(object):
 
     def setup(self):
-        self.to_patch = 'ceph_deploy.util.pkg_managers.remoto.process.run'
+        self.to_patch = 'ceph_deploy.util.pkg_managers.stream.run'
 
     def test_install_single_package(self):
         fake_run = Mock()
@@ -81,7 +81,7 @@ class TestYum(object):
 class TestZypper(object):
 
     def setup(self):
-        self.to_patch = 'ceph_deploy.util.pkg_managers.remoto.process.run'
+        self.to_patch = 'ceph_deploy.util.pkg_managers.stream.run'
         self.to_check = 'ceph_deploy.util.pkg_managers.remoto.process.check'
 
     def test_install_single_package(self):
@@ -122,7 +122,7 @@ class TestZypper(object):
 class TestDNF(object):
 
     def setup(self):
-        self.to_patch = 'ceph_deploy.util.pkg_managers.remoto.process.run'
+        self.to_patch = 'ceph_deploy.util.pkg_managers.stream.run'
 
     def test_install_single_package(self):
         fake_run = Mock()
@@ -154,3 +154,105 @@ class TestDNF(object):
             pkg_managers.DNF(Mock()).remove(['vim', 'zsh'])
             result = fake_run.call_args_list[-1]
         assert 'remove' in result[0][-1]
+
+
+class TestPlanner(object):
+
+    def setup(self):
+        self.packager = pkg_managers.Yum(Mock())
+        self.packager.install = Mock()
+
+    def transactions(self):
+        return [call[0][0] for call in self.packager.install.call_args_list]
+
+    def test_packages_share_a_transaction(self):
+        self.packager.plan('vim')
+        self.packager.plan(['zsh', 'tmux'])
+        self.packager.commit()
+        assert self.transactions() == [['vim', 'zsh', 'tmux']]
+
+    def test_repo_packages_share_a_transaction(self):
+        self.packager.plan('epel-release', repo=True)
+        self.packager.plan('ceph-release', repo=True)
+        self.packager.commit()
+        assert self.transactions() == [['epel-release', 'ceph-release']]
+
+    def test_split_after_repo_packages(self):
+        self.packager.plan('epel-release', repo=True)
+        self.packager.plan('ceph')
+        self.packager.commit()
+        assert self.transactions() == [['epel-release'], ['ceph']]
+
+    def test_packages_are_only_installed_once(self):
+        self.packager.plan(['yum-plugin-priorities', 'ceph'])
+        self.packager.commit()
+        self.packager.plan(['yum-plugin-priorities', 'ceph-mon', 'ceph-mon'])
+        self.packager.commit()
+        assert self.transactions() == [['yum-plugin-priorities', 'ceph'], ['ceph-mon']]
+
+    def test_nothing_planned(self):
+        self.packager.commit()
+        assert self.packager.install.called is False
+
+
+class TestDownloadOnly(object):
+
+    def setup(self):
+        self.to_patch = 'ceph_deploy.util.pkg_managers.stream.run'
+
+    def command(self, packager, packages=None, **kw):
+        fake_run = Mock()
+        with patch(self.to_patch, fake_run):
+            packager.install(packages or ['ceph'], **kw)
+        return fake_run.call_args_list[-1][0][-1]
+
+    def test_installs_by_default(self):
+        for manager in (pkg_managers.Yum, pkg_managers.DNF, pkg_managers.Apt, pkg_managers.Zypper):
+            command = self.command(manager(Mock()))
+            assert not [flag for flag in command if 'download' in flag]
+
+    def test_download_only(self):
+        for manager, flag in [
+                (pkg_managers.Yum, '--downloadonly'),
+                (pkg_managers.DNF, '--downloadonly'),
+                (pkg_managers.Apt, '--download-only'),
+                (pkg_managers.Zypper, '--download-only'),
+                (pkg_managers.Pacman, '--downloadonly')]:
+            packager = manager(Mock())
+            packager.download_only = True
+            command = self.command(packager)
+            assert flag in command
+            assert command[-1] == 'ceph'
+
+    def test_overridden_per_install(self):
+        packager = pkg_managers.Yum(Mock())
+        packager.download_only = True
+        assert '--downloadonly' not in self.command(packager, download_only=False)
+
+    def test_repo_packages_are_installed(self):
+        packager = pkg_managers.Yum(Mock())
+        packager.download_only = True
+        packager.install = Mock()
+        packager.plan('epel-release', repo=True)
+        packager.plan('ceph')
+        packager.commit()
+        calls = [(call[0][0], call[1]['download_only']) for call in packager.install.call_args_list]
+        assert calls == [(['epel-release'], False), (['ceph'], True)]
+
+
+class TestExpire(object):
+
+    def test_only_expires_the_given_repos(self):
+        fake_run = Mock()
+        with patch('ceph_deploy.util.pkg_managers.stream.run', fake_run):
+            pkg_managers.Yum(Mock()).expire(['Ceph*', 'ceph*'])
+        command = fake_run.call_args[0][-1]
+        assert command == [
+            'yum', 'clean', 'metadata', '--disablerepo=*', '--enablerepo=Ceph*,ceph*',
+        ]
+
+    def test_repo_digest(self):
+        remote = Mock()
+        remote.conn.remote_module.file_digest.return_value = 'abc'
+        assert pkg_managers.DNF(remote).repo_digest('custom.repo') == 'abc'
+        remote.conn.remote_module.file_digest.assert_called_with('/etc/yum.repos.d/custom.repo')
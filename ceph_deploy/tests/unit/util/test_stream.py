@@ -0,0 +1,140 @@
+import pytest
+from mock import Mock
+
+from ceph_deploy.util import stream
+
+
+class FakeChannel(object):
+
+    def __init__(self, messages=None):
+        self.messages = list(messages or [])
+        self.sent = []
+        self.closed = False
+
+    def receive(self, timeout=None):
+        if self.messages:
+            return self.messages.pop(0)
+
+    def send(self, item):
+        self.sent.append(item)
+
+    def close(self):
+        self.closed = True
+
+
+def make_conn(messages):
+    conn = Mock()
+    conn.sudo = False
+    conn.channel = FakeChannel(messages)
+    conn.execute.return_value = conn.channel
+    return conn
+
+
+class TestRemoteStream(object):
+
+    def test_lines_and_exit_status(self):
+        channel = FakeChannel()
+        stream._remote_stream(
+            channel,
+            ['sh', '-c', 'echo one; echo two >&2; printf three; exit 2'],
+            window=64,
+            max_line_length=100,
+        )
+        assert sorted(channel.sent[:-1]) == [
+            ('stderr', b'two'), ('stdout', b'one'), ('stdout', b'three'),
+        ]
+        assert channel.sent[-1] == ('exit', 2)
+
+    def test_long_lines_are_split(self):
+        channel = FakeChannel()
+        stream._remote_stream(channel, ['echo', 'abcdefg'], window=64, max_line_length=3)
+        assert channel.sent == [
+            ('stdout', b'abc'), ('stdout', b'def'), ('stdout', b'g'), ('exit', 0),
+        ]
+
+    def test_waits_for_the_other_end(self):
+        channel = FakeChannel()
+        channel.receive = Mock()
+        stream._remote_stream(channel, ['seq', '1', '5'], window=2, max_line_length=100)
+        assert channel.receive.call_count == 2
+
+
+class TestStream(object):
+
+    def test_yields_lines(self):
+        conn = make_conn([('stdout', b'one\r'), ('stderr', b'two'), ('exit', 0)])
+        command = stream.Stream(conn, ['ls'])
+        assert list(command) == [('stdout', 'one'), ('stderr', 'two')]
+        assert command.returncode == 0
+
+    def test_acknowledges_every_window(self):
+        messages = [('stdout', b'line')] * 5 + [('exit', 0)]
+        conn = make_conn(messages)
+        list(stream.Stream(conn, ['ls'], window=2))
+        assert conn.channel.sent == [None, None]
+
+    def test_stopping_early_closes_the_channel(self):
+        conn = make_conn([('stdout', b'one'), ('stdout', b'two'), ('exit', 0)])
+        lines = iter(stream.Stream(conn, ['ls']))
+        next(lines)
+        lines.close()
+        assert conn.channel.closed is True
+
+    def test_timing_out_closes_the_channel(self):
+        class TimeoutError(Exception):
+            pass
+
+        conn = make_conn([])
+        conn.global_timeout = 1
+        conn.channel.receive = Mock(side_effect=[('stdout', b'one'), TimeoutError()])
+        command = stream.Stream(conn, ['ls'])
+        assert list(command) == [('stdout', 'one')]
+        assert command.returncode == -1
+        assert conn.channel.closed is True
+
+    def test_exiting_leaves_the_channel_alone(self):
+        conn = make_conn([('exit', 0)])
+        list(stream.Stream(conn, ['ls']))
+        assert conn.channel.closed is False
+
+
+class TestRun(object):
+
+    def test_logs_output_live(self):
+        conn = make_conn([('stdout', b'one'), ('stderr', b'two'), ('exit', 0)])
+        assert stream.run(conn, ['ls']) == 0
+        conn.logger.debug.assert_called_with('one', extra={'live': True})
+        conn.logger.warning.assert_called_with('two', extra={'live': True})
+
+    def test_raises_on_failure(self):
+        conn = make_conn([('exit', 1)])
+        with pytest.raises(RuntimeError):
+            stream.run(conn, ['ls'])
+
+    def test_does_not_raise_when_told_not_to(self):
+        conn = make_conn([('exit', 1)])
+        assert stream.run(conn, ['ls'], stop_on_nonzero=False) == 1
+
+    def test_timeouts_only_warn(self):
+        class TimeoutError(Exception):
+            pass
+
+        conn = make_conn([])
+        conn.global_timeout = 300
+        conn.channel.receive = Mock(side_effect=TimeoutError())
+        assert stream.run(conn, ['yum', 'install', 'ceph']) == -1
+        conn.logger.warning.assert_called_with(
+            'No data was received after 300 seconds, disconnecting...')
+        assert conn.logger.error.called is False
+
+    def test_waiting_forever(self):
+        conn = make_conn([('exit', 0)])
+        conn.global_timeout = 300
+        conn.channel.receive = Mock(return_value=('exit', 0))
+        assert stream.run(conn, ['rsync'], timeout=stream.FOREVER) == 0
+        conn.channel.receive.assert_called_with(None)
+
+    def test_command_line_with_sudo(self):
+        conn = make_conn([])
+        conn.sudo = True
+        assert stream.command_line(conn, ['ls', '-l']) == 'sudo ls -l'
@@ -0,0 +1,129 @@
+import json
+
+from mock import Mock
+from pytest import raises
+
+from ceph_deploy.util import trace
+
+
+class TestRecord(object):
+
+    def setup(self):
+        trace.start()
+
+    def test_calls_add_up_per_host_and_name(self):
+        trace.record('node1', 'remote_module', 'which', 0, sent=10, received=5)
+        trace.record('node1', 'remote_module', 'which', 0, sent=10, received=5)
+        trace.record('node2', 'remote_module', 'which', 0, sent=10, received=5)
+        rows = dict(((row['host'], row['name']), row) for row in trace.summary())
+        assert rows[('node1', 'which')]['count'] == 2
+        assert rows[('node1', 'which')]['sent'] == 20
+        assert rows[('node2', 'which')]['count'] == 1
+
+    def test_start_forgets_everything(self):
+        trace.record('node1', 'remote_module', 'which', 0)
+        trace.start()
+        assert trace.summary() == []
+
+    def test_report_logs_a_row_per_call(self):
+        trace.record('node1', 'remote_module', 'which', 0)
+        logger = Mock()
+        trace.report(logger)
+        assert logger.log.call_count == 3
+
+
+class TestWrite(object):
+
+    def test_chrome_trace_format(self, tmpdir):
+        trace.start(keep_events=True)
+        trace.record('node1', 'process.check', 'ceph auth get', trace._started, command='ceph auth get')
+        path = str(tmpdir.join('out.json'))
+        trace.write(path)
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        assert events[0]['ph'] == 'M'
+        assert events[0]['args'] == {'name': 'node1'}
+        assert events[1]['ph'] == 'X'
+        assert events[1]['name'] == 'ceph auth get'
+        assert events[1]['tid'] == events[0]['tid']
+        assert events[1]['args']['command'] == 'ceph auth get'
+
+    def test_events_are_not_kept_by_default(self, tmpdir):
+        trace.start()
+        trace.record('node1', 'process.check', 'ceph', 0)
+        path = str(tmpdir.join('out.json'))
+        trace.write(path)
+        with open(path) as f:
+            assert json.load(f)['traceEvents'] == []
+
+
+class TestCommandName(object):
+
+    def test_options_and_paths_are_skipped(self):
+        command = ['/usr/bin/ceph', '--cluster=ceph', 'auth', 'get', 'client.admin']
+        assert trace.command_name(command) == 'ceph auth get'
+
+    def test_short_commands(self):
+        assert trace.command_name(['hostname']) == 'hostname'
+
+    def test_empty(self):
+        assert trace.command_name([]) == ''
+
+
+class TestTracedModule(object):
+
+    def setup(self):
+        trace.start()
+        self.module = Mock()
+        self.module.which.return_value = '/usr/bin/ceph'
+        self.traced = trace.TracedModule(self.module, 'node1')
+
+    def test_calls_are_recorded(self):
+        assert self.traced.which('ceph') == '/usr/bin/ceph'
+        row = trace.summary()[0]
+        assert (row['host'], row['name'], row['count']) == ('node1', 'which', 1)
+
+    def test_failed_calls_are_recorded(self):
+        self.module.which.side_effect = RuntimeError
+        with raises(RuntimeError):
+            self.traced.which('ceph')
+        assert trace.summary()[0]['count'] == 1
+
+    def test_attributes_are_set_on_the_module(self):
+        self.traced.logger = 'logger'
+        assert self.module.logger == 'logger'
+
+
+class TestTracedChannel(object):
+
+    def setup(self):
+        trace.start()
+        self.channel = Mock()
+
+    def traced(self, last_reply=lambda reply: False):
+        return trace.TracedChannel(
+            self.channel, 'node1', 'process.run', ['ceph', 'status'], last_reply
+        )
+
+    def test_recorded_once_the_other_end_is_gone(self):
+        self.channel.receive.side_effect = ['line', EOFError]
+        channel = self.traced()
+        channel.receive()
+        assert trace.summary() == []
+        with raises(EOFError):
+            channel.receive()
+        row = trace.summary()[0]
+        assert (row['name'], row['count']) == ('ceph status', 1)
+
+    def test_recorded_on_last_reply(self):
+        self.channel.receive.return_value = ('exit', 0)
+        channel = self.traced(last_reply=lambda reply: reply[0] == 'exit')
+        channel.receive()
+        assert trace.summary()[0]['count'] == 1
+
+    def test_recorded_only_once(self):
+        self.channel.receive.return_value = ('exit', 0)
+        channel = self.traced(last_reply=lambda reply: True)
+        channel.receive()
+        channel.close()
+        assert trace.summary()[0]['count'] == 1
@@ -56,28 +56,36 @@ class Hostname(object):
 
 class Subnet(object):
     """
-    A really dumb validator to ensure that we are receiving a subnet (or
-    something that actually looks like a subnet).
-
-    It doesn't enforce at all the constraints of proper validation as that has
-    its own set of caveats that are difficult to implement given that
-    ceph-deploy doesn't (should not) include third party dependencies.
+    A validator to ensure that we are receiving a subnet, or a comma separated
+    list of them like Ceph accepts for its networks. Both IPv4 (``x.x.x.x/xx``)
+    and IPv6 (``x:x::/xx``) subnets are accepted.
     """
 
     def __call__(self, string):
+        for subnet in string.split(','):
+            self.validate(subnet.strip())
+        return string
+
+    def validate(self, string):
         ip = string.split('/')[0]
-        ip_parts = ip.split('.')
+        if ':' not in ip:
+            ip_parts = ip.split('.')
 
-        if len(ip_parts) != 4:
-            err = "subnet must have at least 4 numbers separated by dots like x.x.x.x/xx, but got: %s" % string
-            raise argparse.ArgumentError(None, err)
+            if len(ip_parts) != 4:
+                err = "subnet must have at least 4 numbers separated by dots like x.x.x.x/xx, but got: %s" % string
+                raise argparse.ArgumentError(None, err)
 
-        if [i for i in ip_parts[:4] if i.isalpha()]:  # only numbers
-            err = "subnet must have digits separated by dots like x.x.x.x/xx, but got: %s" % string
-            raise argparse.ArgumentError(None, err)
+            if [i for i in ip_parts[:4] if i.isalpha()]:  # only numbers
+                err = "subnet must have digits separated by dots like x.x.x.x/xx, but got: %s" % string
+                raise argparse.ArgumentError(None, err)
 
         if len(string.split('/')) != 2:
             err = "subnet must contain a slash, like x.x.x.x/xx, but got: %s" % string
             raise argparse.ArgumentError(None, err)
 
-        return string
+        # imported here, it pulls in urllib which slows down every command
+        from ceph_deploy.util import net
+        try:
+            net.Network(string)
+        except ValueError as error:
+            raise argparse.ArgumentError(None, str(error))
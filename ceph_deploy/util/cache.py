@@ -0,0 +1,263 @@
+"""
+A caching HTTP proxy that runs on the admin node for ``install --cache``, so
+that packages and keys are downloaded from upstream once instead of once per
+host.
+
+Upstream URLs are rewritten to go through the cache: the scheme and host of
+the upstream URL become the first parts of the path, like
+``http://10.0.0.1:8080/https/download.ceph.com/keys/release.asc``. The first
+request for a file downloads it into ``~/.cephdeploy/cache`` while any other
+request for the same file waits for it, and every later request is served
+from there.
+
+Packages and keys never change once published, so they are kept across runs.
+Everything else (repository metadata) is downloaded again the first time it
+is asked for in a run, and then served from the cache for the rest of it.
+
+The cache only listens on the addresses hosts are told to use, and only
+forwards requests to the upstream servers of URLs it rewrote.
+"""
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.error import HTTPError
+    from urllib.parse import urlsplit
+    from urllib.request import urlopen
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib2 import HTTPError, urlopen
+    from urlparse import urlsplit
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from ceph_deploy.util.paths import local
+
+LOG = logging.getLogger(__name__)
+
+# Files that never change once published
+IMMUTABLE = ('.rpm', '.deb', '.asc', '.gpg', '.key')
+
+
+def local_address(hostname):
+    """
+    The address of this node that ``hostname`` can reach it on: the one the
+    route to ``hostname`` goes out from. No packets are sent.
+    """
+    family, _, _, _, address = socket.getaddrinfo(hostname, 9, 0, socket.SOCK_DGRAM)[0]
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    try:
+        sock.connect(address)
+        return sock.getsockname()[0]
+    finally:
+        sock.close()
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Server6(Server):
+    address_family = socket.AF_INET6
+
+
+class Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def respond(self, body):
+        cache = self.server.cache
+        url = cache.upstream(self.path)
+        if url is None:
+            self.send_error(404)
+            return
+        try:
+            path = cache.fetch(url)
+        except HTTPError as error:
+            self.send_error(error.code)
+            return
+        except Exception as error:
+            LOG.warning('could not fetch %s: %s', url, error)
+            self.send_error(502)
+            return
+        with open(path, 'rb') as f:
+            self.send_response(200)
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            if body:
+                shutil.copyfileobj(f, self.wfile)
+
+    def log_message(self, format, *args):
+        LOG.debug('cache: %s - %s', self.address_string(), format % args)
+
+
+class Cache(object):
+    """
+    The caching proxy, serving from a background thread between
+    :meth:`start` and :meth:`stop`::
+
+        cache = Cache()
+        cache.start()
+        repo_url = cache.url('https://download.ceph.com/rpm-luminous/el7/', '10.0.0.1')
+        ...
+        cache.stop()
+
+    :param port: Port to listen on, any free one by default
+    :param path: Where to keep the downloaded files, defaults to
+                 ``~/.cephdeploy/cache``
+    :param addresses: The addresses of this node to listen on (the ones
+                      given to :meth:`url`), only the loopback one by default
+    """
+
+    def __init__(self, port=0, path=None, addresses=None):
+        self.port = port
+        self.path = path or local.cache()
+        self.addresses = sorted(addresses or ['127.0.0.1'])
+        self.servers = []
+        self.lock = threading.Lock()
+        # the (scheme, host) of the upstream urls rewritten by url(), the
+        # only ones requests are forwarded to
+        self.allowed = set()
+        # per file locks, so that a file is only downloaded once at a time
+        self.locks = {}
+        # files downloaded (or checked) during this run
+        self.fresh = set()
+        self.hits = 0
+        self.downloads = 0
+
+    def start(self):
+        try:
+            for address in self.addresses:
+                server_class = Server6 if ':' in address else Server
+                server = server_class((address, self.port), Handler)
+                server.cache = self
+                # every address gets the port the first one got
+                self.port = server.server_address[1]
+                self.servers.append(server)
+                thread = threading.Thread(target=server.serve_forever, name='cache')
+                thread.daemon = True
+                thread.start()
+        except Exception:
+            self.stop()
+            raise
+        LOG.info(
+            'serving the package cache on %s port %d from %s',
+            ', '.join(self.addresses),
+            self.port,
+            self.path,
+        )
+
+    def stop(self):
+        if not self.servers:
+            return
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+        LOG.info(
+            'package cache: %d files downloaded, %d served from the cache',
+            self.downloads,
+            self.hits,
+        )
+
+    def url(self, url, address):
+        """
+        The URL that goes through the cache for the upstream ``url``, for a
+        host that reaches this node on ``address``.
+        """
+        parts = urlsplit(url)
+        with self.lock:
+            self.allowed.add((parts.scheme, parts.netloc))
+        if ':' in address:
+            address = '[%s]' % address
+        cached = 'http://%s:%d/%s/%s%s' % (address, self.port, parts.scheme, parts.netloc, parts.path)
+        if parts.query:
+            cached += '?' + parts.query
+        return cached
+
+    def upstream(self, path):
+        """
+        The upstream URL for the ``path`` of a request, ``None`` if it does
+        not look like one or is not on an upstream server :meth:`url` was
+        asked about.
+        """
+        parts = path.lstrip('/').split('/', 2)
+        if len(parts) < 3 or parts[0] not in ('http', 'https') or not parts[1]:
+            return None
+        with self.lock:
+            if (parts[0], parts[1]) not in self.allowed:
+                return None
+        if '..' in parts[2].split('?')[0].split('/'):
+            return None
+        return '%s://%s/%s' % tuple(parts)
+
+    def local_path(self, url):
+        parts = urlsplit(url)
+        path = parts.path
+        if not path or path.endswith('/'):
+            path += 'index'
+        if parts.query:
+            path += '?' + parts.query
+        return os.path.join(self.path, parts.scheme, parts.netloc, path.lstrip('/'))
+
+    def _lock_for(self, path):
+        with self.lock:
+            return self.locks.setdefault(path, threading.Lock())
+
+    def fetch(self, url):
+        """
+        The path of the cached copy of ``url``, downloading it first when it
+        is not cached yet (or not fresh).
+        """
+        path = self.local_path(url)
+        with self._lock_for(path):
+            immutable = urlsplit(url).path.endswith(IMMUTABLE)
+            if os.path.exists(path) and (immutable or path in self.fresh):
+                with self.lock:
+                    self.hits += 1
+                return path
+
+            LOG.debug('cache: downloading %s', url)
+            directory = os.path.dirname(path)
+            if not os.path.isdir(directory):
+                try:
+                    os.makedirs(directory)
+                except OSError:
+                    # another file in it might be downloading
+                    if not os.path.isdir(directory):
+                        raise
+            response = urlopen(url)
+            tmp = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+            try:
+                with tmp:
+                    shutil.copyfileobj(response, tmp)
+                os.rename(tmp.name, path)
+            except Exception:
+                os.unlink(tmp.name)
+                raise
+            finally:
+                response.close()
+            with self.lock:
+                self.fresh.add(path)
+                self.downloads += 1
+        return path
+
+    def prefetch(self, urls):
+        """
+        Download ``urls`` ahead of the hosts asking for them. Failures are
+        only logged, hosts will get the error themselves if it persists.
+        """
+        for url in urls:
+            try:
+                self.fetch(url)
+            except Exception as error:
+                LOG.warning('could not prefetch %s: %s', url, error)
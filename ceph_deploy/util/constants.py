@@ -17,6 +17,9 @@ mds_path = join(base_path, 'mds')
 
 osd_path = join(base_path, 'osd')
 
+# Path on the admin node where ceph-deploy keeps its own state
+local_path = '~/.cephdeploy'
+
 # Default package components to install
 _base_components = [
     'ceph',
@@ -34,3 +37,18 @@ default_components.deb = tuple(_base_components + ['radosgw'])
 default_components.pkgtarxz = tuple(['ceph'])
 
 gpg_key_base_url = "download.ceph.com/keys/"
+
+# Major version of the packages of each named release
+release_majors = {
+    'infernalis': 9,
+    'jewel': 10,
+    'kraken': 11,
+    'luminous': 12,
+    'mimic': 13,
+    'nautilus': 14,
+    'octopus': 15,
+    'pacific': 16,
+    'quincy': 17,
+    'reef': 18,
+    'squid': 19,
+}
@@ -0,0 +1,124 @@
+"""
+An on-disk cache for the information ``hosts.get`` gathers from a remote host
+(distribution, release, codename, machine type and init system), so that it
+doesn't have to be asked for again on every command.
+
+Every host gets its own JSON file in ``~/.cephdeploy/facts``. Entries older
+than ``ttl`` seconds are ignored, and caching is disabled altogether (the
+default, unless the CLI configures it) when ``ttl`` is not set. Other caches
+that should follow the same settings (like the disk inventories) go through
+:func:`read` and :func:`write`.
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+
+from ceph_deploy.util import paths
+
+LOG = logging.getLogger(__name__)
+
+# Maximum age in seconds for cached facts to be used, caching is disabled
+# when not set
+ttl = None
+
+# Ignore cached facts, but still save the ones gathered from hosts
+refresh = False
+
+
+def configure(ttl=None, refresh=False):
+    """
+    Set how the cache behaves for the rest of the run. ``ttl`` may come as
+    a string when it is set from the ceph-deploy configuration file.
+    """
+    globals()['ttl'] = int(ttl) if ttl else None
+    globals()['refresh'] = refresh
+
+
+def enabled():
+    return bool(ttl)
+
+
+def read(path, key):
+    """
+    The ``key`` entry of the JSON cache file at ``path``, or ``None`` if
+    caching is disabled, a refresh was requested, or the file is missing,
+    unreadable or older than ``ttl``.
+    """
+    if not enabled() or refresh:
+        return None
+    try:
+        with open(path) as f:
+            cached = json.load(f)
+        age = time.time() - cached['timestamp']
+        value = cached[key]
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return None
+    if age < 0 or age > ttl:
+        return None
+    return value
+
+
+def write(path, key, value):
+    """
+    Store ``value`` as the ``key`` entry of the JSON cache file at ``path``.
+    Failing to write the cache is not an error, it just means the information
+    will be gathered again next time.
+    """
+    if not enabled():
+        return
+    directory = os.path.dirname(path)
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        # write to a temporary file first, so that concurrent readers never
+        # see a half written file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.%s.' % os.path.basename(path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'timestamp': time.time(), key: value}, f)
+        os.rename(tmp_path, path)
+    except (IOError, OSError) as error:
+        LOG.debug('unable to write the cache in %s: %s', path, error)
+
+
+def load(hostname):
+    """
+    Return the cached facts for ``hostname`` as a dictionary, or ``None`` if
+    there are no usable facts for the host (see :func:`read`).
+    """
+    path = paths.local.facts(hostname)
+    host_facts = read(path, 'facts')
+    if host_facts is not None:
+        LOG.debug('using cached facts for %s from %s', hostname, path)
+    return host_facts
+
+
+def save(hostname, host_facts):
+    """
+    Store ``host_facts`` for ``hostname``.
+    """
+    write(paths.local.facts(hostname), 'facts', host_facts)
+
+
+def update(hostname, **kw):
+    """
+    Add (or replace) some facts of an already cached host. Does nothing if the
+    host has no usable cached facts.
+    """
+    host_facts = load(hostname)
+    if host_facts is None:
+        return
+    host_facts.update(kw)
+    save(hostname, host_facts)
+
+
+def forget(hostname):
+    """
+    Drop the cached facts for ``hostname``, used when something that was
+    cached (like the init system) is likely to have changed.
+    """
+    try:
+        os.remove(paths.local.facts(hostname))
+    except OSError:
+        pass
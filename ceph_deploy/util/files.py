@@ -1,5 +1,80 @@
+"""
+Read local files and push files to remote hosts.
+
+Pushing is hash first: the digests of the remote copies are fetched in one
+round trip, and only the files that differ are sent over and written, in
+another one. Hosts that already have every file are not written to at all.
+
+A file to push is described with :func:`conf_file` or :func:`plain_file`::
+
+    changed = files.push(conn, [
+        files.conf_file(args.cluster, conf_data, args.overwrite_conf),
+        files.plain_file('/etc/ceph/ceph.client.admin.keyring', keyring, 0o600),
+    ])
+"""
+import hashlib
 
 
 def read_file(path):
     with open(path, 'rb') as f:
         return f.read()
+
+
+def digest(content):
+    """
+    The digest of ``content``, as ``remotes.file_digest`` computes it on the
+    remote end.
+    """
+    if not isinstance(content, bytes):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def conf_file(cluster, conf, overwrite):
+    """
+    The configuration of ``cluster``, written with ``remotes.write_conf``.
+    """
+    return (
+        '/etc/ceph/{cluster}.conf'.format(cluster=cluster),
+        conf,
+        None,
+        ('write_conf', (cluster, conf, overwrite)),
+    )
+
+
+def plain_file(path, content, mode=0o644):
+    """
+    Any other file, written with ``remotes.write_file``. A remote copy with
+    the same content but another mode is written again.
+    """
+    return (path, content, mode, ('write_file', (path, content, mode)))
+
+
+def digest_calls(files):
+    """
+    The remote calls that return the digest of every file.
+    """
+    return [('file_digest', (path, mode)) for path, _, mode, _ in files]
+
+
+def write_calls(files, digests):
+    """
+    The remote calls that write the files whose remote digest differs, given
+    the results of :func:`digest_calls`.
+    """
+    return [
+        write for (_, content, _, write), remote in zip(files, digests)
+        if remote != digest(content)
+    ]
+
+
+def push(conn, files):
+    """
+    Write ``files`` on the host of ``conn``, leaving alone the ones that are
+    already there. Returns ``True`` if anything had to be written.
+    """
+    digests = conn.remote_module.run_batch(digest_calls(files))
+    writes = write_calls(files, digests)
+    if writes:
+        conn.remote_module.run_batch(writes)
+    return bool(writes)
@@ -0,0 +1,164 @@
+"""
+The disks of remote hosts, for ``disk inventory``.
+
+Hosts describe their disks with ``ceph-volume inventory`` when it is
+installed, or with ``lsblk`` otherwise. Both are turned into the same list of
+dictionaries, one per disk::
+
+    {'path': '/dev/sdb',
+     'size': 4000787030016,
+     'rotational': True,
+     'model': 'ST4000NM0035',
+     'available': False,
+     'reasons': ['has partitions']}
+
+Inventories are cached in ``~/.cephdeploy/inventory``, one JSON file per
+host, for as long as host facts are (see :mod:`ceph_deploy.util.facts`), so
+that selecting devices again (or for ``osd create --batch``) doesn't need
+another round of probing. The cache of a host is dropped when its disks are
+zapped or get OSDs.
+"""
+import fnmatch
+import json
+import logging
+import os
+import re
+
+from ceph_deploy.util import facts, paths
+
+LOG = logging.getLogger(__name__)
+
+UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40, 'P': 1 << 50}
+
+
+def parse_size(value):
+    """
+    The number of bytes in a size like ``500G``, ``1.5T`` or ``1024``, with
+    binary units.
+    """
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGTP]?)(?:i?B)?\s*$', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError('invalid size: %s' % value)
+    number, unit = match.groups()
+    return int(float(number) * UNITS[unit.upper()])
+
+
+def human_size(size):
+    for unit in ('', 'K', 'M', 'G', 'T'):
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = 'P'
+    if not unit:
+        return '%dB' % size
+    return '%.2f%sB' % (size, unit)
+
+
+def _flag(value):
+    """``lsblk`` and ``ceph-volume`` give booleans as strings too"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    return str(value).strip().lower() not in ('', '0', 'false')
+
+
+def parse_ceph_volume(out):
+    devices = []
+    for entry in json.loads(out):
+        sys_api = entry.get('sys_api', {})
+        devices.append({
+            'path': entry['path'],
+            'size': int(float(sys_api.get('size') or 0)),
+            'rotational': _flag(sys_api.get('rotational')),
+            'model': (sys_api.get('model') or '').strip(),
+            'available': bool(entry.get('available')),
+            'reasons': list(entry.get('rejected_reasons') or []),
+        })
+    return devices
+
+
+def parse_lsblk(out):
+    """
+    Disks (and multipath devices) from ``lsblk --json``. Without
+    ``ceph-volume`` to ask, a disk is considered available when it is not
+    empty and has no partitions, filesystem, or mount point.
+    """
+    devices = []
+    for entry in json.loads(out).get('blockdevices', []):
+        if entry.get('type') not in ('disk', 'mpath'):
+            continue
+        size = int(entry.get('size') or 0)
+        reasons = []
+        if not size:
+            reasons.append('empty')
+        if entry.get('children'):
+            reasons.append('has partitions')
+        if entry.get('fstype'):
+            reasons.append('has a %s filesystem' % entry['fstype'])
+        if entry.get('mountpoint'):
+            reasons.append('mounted on %s' % entry['mountpoint'])
+        devices.append({
+            'path': '/dev/%s' % entry['name'],
+            'size': size,
+            'rotational': _flag(entry.get('rota')),
+            'model': (entry.get('model') or '').strip(),
+            'available': not reasons,
+            'reasons': reasons,
+        })
+    return devices
+
+
+def parse(kind, out):
+    """
+    The devices in the ``(kind, out)`` result of the remote ``inventory``
+    function.
+    """
+    if kind == 'ceph-volume':
+        return parse_ceph_volume(out)
+    if kind == 'lsblk':
+        return parse_lsblk(out)
+    raise RuntimeError('neither ceph-volume nor lsblk could list the disks')
+
+
+def select(devices, min_size=None, max_size=None, rotational=None, model=None, available=None):
+    """
+    The devices that match every filter given. ``model`` is a case
+    insensitive glob pattern (``*SAMSUNG*``), sizes are in bytes.
+    """
+    selected = []
+    for device in devices:
+        if min_size is not None and device['size'] < min_size:
+            continue
+        if max_size is not None and device['size'] > max_size:
+            continue
+        if rotational is not None and device['rotational'] != rotational:
+            continue
+        if model is not None and not fnmatch.fnmatch(device['model'].lower(), model.lower()):
+            continue
+        if available is not None and device['available'] != available:
+            continue
+        selected.append(device)
+    return selected
+
+
+def load(hostname):
+    """
+    The cached devices of ``hostname``, ``None`` when there are none or they
+    can't be used (see :func:`ceph_deploy.util.facts.read`).
+    """
+    path = paths.local.inventory(hostname)
+    devices = facts.read(path, 'devices')
+    if devices is not None:
+        LOG.debug('using the cached disk inventory of %s from %s', hostname, path)
+    return devices
+
+
+def save(hostname, devices):
+    facts.write(paths.local.inventory(hostname), 'devices', devices)
+
+
+def forget(hostname):
+    try:
+        os.remove(paths.local.inventory(hostname))
+    except OSError:
+        pass
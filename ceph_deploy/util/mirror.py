@@ -0,0 +1,147 @@
+"""
+Sync a local repository mirror to many hosts for ``install --local-mirror``.
+
+Hosts are synced concurrently, ``jobs`` at a time. With a bandwidth limit, it
+is shared by the transfers running at the same time, so that all of them
+together stay under it.
+
+With ``fanout``, hosts that are already synced become sources for the next
+ones: the admin node syncs one host, then the admin node and that host sync
+two more, then four, and so on, so that seeding many hosts is not limited by
+the uplink of the admin node. Host to host transfers run ``rsync`` on the
+source host as the login user, which needs to be able to ``ssh`` to the other
+hosts (with agent forwarding or a key of its own).
+
+Plain syncs from the admin node go through ``remoto.rsync``, which does not
+need anything installed on the hosts. With a bandwidth limit or ``fanout``,
+the ``rsync`` command is used instead and needs to be installed everywhere.
+"""
+import logging
+
+from ceph_deploy import connection
+from ceph_deploy.lib import remoto
+from ceph_deploy.util import parallel, stream
+
+LOG = logging.getLogger(__name__)
+
+# Where the mirror goes on every host
+DESTINATION = '/opt/ceph-deploy/repo'
+
+
+def target(hostname, username=None):
+    if username:
+        return '%s@%s' % (username, hostname)
+    return hostname
+
+
+def rsync_command(source, destination, bwlimit=None, multiplex=False):
+    """
+    The ``rsync`` command that syncs the ``source`` directory to
+    ``destination`` (a ``host:path``), as root on the destination.
+
+    With ``multiplex``, ``ssh`` shares the master connections of this node,
+    which only makes sense for a command that runs on it.
+    """
+    ssh = ['ssh', '-o', 'BatchMode=yes']
+    if multiplex:
+        ssh.append(connection.ssh_options())
+    command = [
+        'rsync',
+        '--archive',
+        '--delete',
+        '--rsync-path', 'sudo rsync',
+        '-e', ' '.join(ssh),
+    ]
+    if bwlimit:
+        command.append('--bwlimit=%d' % bwlimit)
+    command.extend([source.rstrip('/') + '/', destination.rstrip('/') + '/'])
+    return command
+
+
+def transfer(source, hostname, path, username=None, bwlimit=None, plain=False):
+    """
+    Sync the mirror to ``hostname`` from ``source``, a host that already has
+    it or ``None`` for the admin node (where it lives in ``path``).
+    """
+    rlogger = logging.getLogger(hostname)
+    if plain:
+        remoto.rsync(target(hostname, username), path, DESTINATION, rlogger, sudo=True)
+        return
+    destination = '%s:%s' % (target(hostname, username), DESTINATION)
+    if source is None:
+        rlogger.info('syncing the mirror from this node')
+        conn = connection.get_local_connection(rlogger)
+    else:
+        rlogger.info('syncing the mirror from %s', source)
+        conn = connection.get_connection(
+            source,
+            username,
+            logging.getLogger(source),
+            detect_sudo=False,
+        )
+        path = DESTINATION
+    command = rsync_command(path, destination, bwlimit=bwlimit, multiplex=source is None)
+    try:
+        # rsync says nothing until it is done, however long that takes
+        stream.run(conn, command, timeout=stream.FOREVER)
+    finally:
+        conn.exit()
+
+
+def sync(hosts, path, username=None, jobs=1, bwlimit=None, fanout=False, logger=None):
+    """
+    Sync the local ``path`` directory to :data:`DESTINATION` on every host in
+    ``hosts``, and return the hosts that could not be synced.
+
+    With ``fanout``, a host that could not be synced from another host gets
+    one more try from the admin node, and hosts are only used as sources once
+    they have been synced.
+
+    :param jobs: Most transfers running at the same time
+    :param bwlimit: Most KiB/s all the transfers together can use
+    :param fanout: Use hosts already synced as sources for the others
+    """
+    logger = logger or LOG
+    jobs = max(1, int(jobs or 1))
+    plain = not (bwlimit or fanout)
+    pending = list(hosts)
+    sources = [None]
+    # hosts that could not be synced from another host, tried again from here
+    retries = []
+    failed = []
+
+    while pending or retries:
+        if retries:
+            batch, retries = retries[:jobs], retries[jobs:]
+            pairs = [(None, host) for host in batch]
+        else:
+            if fanout:
+                count = min(len(sources), jobs, len(pending))
+            else:
+                count = len(pending)
+            batch, pending = pending[:count], pending[count:]
+            pairs = list(zip(sources, batch)) if fanout else [(None, host) for host in batch]
+        # the transfers running at the same time share the bandwidth
+        limit = bwlimit and max(1, bwlimit // min(len(pairs), jobs))
+        outcome = {}
+
+        def run(pair):
+            source, hostname = pair
+            outcome[hostname] = False
+            transfer(source, hostname, path, username=username, bwlimit=limit, plain=plain)
+            outcome[hostname] = True
+
+        parallel.execute(run, pairs, jobs, logger=logger)
+
+        for source, hostname in pairs:
+            if outcome.get(hostname):
+                sources.append(hostname)
+            elif source is not None:
+                # the source might be the problem, try again from here
+                retries.append(hostname)
+            else:
+                failed.append(hostname)
+
+    if failed:
+        logger.error('could not sync the mirror to: %s', ', '.join(failed))
+    return failed
@@ -5,10 +5,12 @@ except ImportError:
     from urllib2 import urlopen, HTTPError
 
 from ceph_deploy import exc
+import binascii
 import logging
 import re
 import socket
-from ceph_deploy.lib import remoto
+import threading
+from ceph_deploy.util import facts
 
 
 LOG = logging.getLogger(__name__)
@@ -18,12 +20,44 @@ LOG = logging.getLogger(__name__)
 # host where we need to get IPs from. SaltStack does this by calling `ip` and
 # parsing the output, which is probably the one true way of dealing with it.
 
-def get_nonlocal_ip(host, subnet=None):
+class Resolver(object):
     """
-    Search result of getaddrinfo() for a non-localhost-net address
+    A DNS cache that can be shared by threads working on different hosts:
+    every name is looked up once, even when asked for at the same time, and
+    later lookups (failed ones too) get the same answer.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locks = {}
+        self.results = {}
+
+    def getaddrinfo(self, host):
+        """``socket.getaddrinfo(host, None)``, from the cache if possible"""
+        with self.lock:
+            host_lock = self.locks.setdefault(host, threading.Lock())
+        with host_lock:
+            if host not in self.results:
+                try:
+                    self.results[host] = (socket.getaddrinfo(host, None), None)
+                except socket.gaierror as error:
+                    self.results[host] = (None, error)
+            result, error = self.results[host]
+        if error is not None:
+            raise error
+        return result
+
+
+def get_nonlocal_ip(host, subnet=None, resolver=None):
+    """
+    Search result of getaddrinfo() for a non-localhost-net address, going
+    through ``resolver`` (a :class:`Resolver`) if given.
     """
     try:
-        ailist = socket.getaddrinfo(host, None)
+        if resolver is not None:
+            ailist = resolver.getaddrinfo(host)
+        else:
+            ailist = socket.getaddrinfo(host, None)
     except socket.gaierror:
         raise exc.UnableToResolveError(host)
     for ai in ailist:
@@ -49,30 +83,138 @@ def get_nonlocal_ip(host, subnet=None):
     raise exc.UnableToResolveError(host)
 
 
+def ip_to_int(ip):
+    """
+    Return the ``(version, integer)`` of an IPv4 or IPv6 address, raising
+    ``ValueError`` if it is not one. A scope like in ``fe80::1%eth0`` is
+    ignored.
+    """
+    ip = ip.split('%')[0]
+    for version, family in ((4, socket.AF_INET), (6, socket.AF_INET6)):
+        try:
+            packed = socket.inet_pton(family, ip)
+        except (socket.error, ValueError):
+            continue
+        return version, int(binascii.hexlify(packed), 16)
+    raise ValueError('not an IP address: %s' % ip)
+
+
+class Network(object):
+    """
+    An IPv4 or IPv6 network like ``10.0.0.0/16`` or ``2001:db8::/64``. Host
+    bits set in the address (``10.0.0.1/16``) are ignored, as Ceph does.
+    """
+
+    def __init__(self, cidr):
+        self.cidr = cidr.strip()
+        try:
+            address, prefixlen = self.cidr.split('/')
+            self.prefixlen = int(prefixlen)
+        except ValueError:
+            raise ValueError('subnet must look like x.x.x.x/xx, but got: %s' % cidr)
+        self.version, network = ip_to_int(address)
+        bits = 32 if self.version == 4 else 128
+        if not 0 <= self.prefixlen <= bits:
+            raise ValueError('invalid prefix length in subnet: %s' % cidr)
+        self.mask = ((1 << bits) - 1) ^ ((1 << (bits - self.prefixlen)) - 1)
+        self.network = network & self.mask
+
+    def __contains__(self, ip):
+        version, address = ip_to_int(ip)
+        return version == self.version and address & self.mask == self.network
+
+    def __str__(self):
+        return self.cidr
+
+    def __repr__(self):
+        return '<Network %s>' % self.cidr
+
+
+def parse_networks(value):
+    """
+    The networks in a comma separated list like Ceph takes for ``public
+    network`` and ``cluster network``. ``None`` gives no networks.
+    """
+    if not value:
+        return []
+    return [Network(cidr) for cidr in value.split(',') if cidr.strip()]
+
+
+class SubnetTable(object):
+    """
+    Matches addresses against many networks at once. Networks are kept in
+    prefix tables: one dictionary per IP version and prefix length, keyed by
+    the network address, so matching an address takes a lookup per distinct
+    prefix length instead of a comparison per network::
+
+        >>> table = SubnetTable(public='10.0.0.0/16,10.1.0.0/16', cluster='192.168.0.0/24')
+        >>> table.classify(['10.1.2.3', '192.168.0.10', '127.0.0.1'])
+        {'10.1.2.3': ['public'], '192.168.0.10': ['cluster'], '127.0.0.1': []}
+
+    :param groups: Names (like ``public``) and the networks in each, as
+                   a comma separated string or a list of them
+    """
+
+    def __init__(self, **groups):
+        self.groups = {}
+        self.tables = {}
+        for name, value in groups.items():
+            if isinstance(value, (list, tuple)):
+                value = ','.join(v for v in value if v)
+            networks = parse_networks(value)
+            self.groups[name] = networks
+            for network in networks:
+                prefixes = self.tables.setdefault(network.version, {})
+                table = prefixes.setdefault((network.prefixlen, network.mask), {})
+                table.setdefault(network.network, []).append((name, network))
+
+    def match(self, ip):
+        """
+        The ``(group, network)`` pairs for every network ``ip`` is in. Invalid
+        addresses are in no network.
+        """
+        try:
+            version, address = ip_to_int(ip)
+        except ValueError:
+            return []
+        found = []
+        for (_, mask), table in sorted(self.tables.get(version, {}).items(), reverse=True):
+            found.extend(table.get(address & mask, []))
+        return found
+
+    def classify(self, ips):
+        """
+        Map every address in ``ips`` to the (sorted) names of the groups it
+        has a network in.
+        """
+        return dict(
+            (ip, sorted(set(name for name, _ in self.match(ip))))
+            for ip in ips
+        )
+
+
 def ip_in_subnet(ip, subnet):
     """Does IP exists in a given subnet utility. Returns a boolean"""
-    ipaddr = int(''.join(['%02x' % int(x) for x in ip.split('.')]), 16)
-    netstr, bits = subnet.split('/')
-    netaddr = int(''.join(['%02x' % int(x) for x in netstr.split('.')]), 16)
-    mask = (0xffffffff << (32 - int(bits))) & 0xffffffff
-    return (ipaddr & mask) == (netaddr & mask)
+    return ip in Network(subnet)
 
 
 def in_subnet(cidr, addrs=None):
     """
     Returns True if host is within specified subnet, otherwise False
     """
+    network = Network(cidr)
     for address in addrs:
-        if ip_in_subnet(address, cidr):
+        if address in network:
             return True
     return False
 
 
-def ip_addresses(conn, interface=None, include_loopback=False):
+def ip_addresses(conn, interface=None, include_loopback=False, hostname=None):
     """
     Returns a list of IPv4/IPv6 addresses assigned to the host. 127.0.0.1/::1 is
     ignored, unless 'include_loopback=True' is indicated. If 'interface' is
     provided, then only IP addresses from that interface will be returned.
+    ``hostname`` is passed on to :func:`linux_interfaces`.
 
     Example output looks like::
 
@@ -81,7 +223,7 @@ def ip_addresses(conn, interface=None, include_loopback=False):
 
     """
     ret = set()
-    ifaces = linux_interfaces(conn)
+    ifaces = linux_interfaces(conn, hostname=hostname)
     if interface is None:
         target_ifaces = ifaces
     else:
@@ -113,7 +255,7 @@ def ip_addresses(conn, interface=None, include_loopback=False):
     return sorted(list(ret))
 
 
-def linux_interfaces(conn):
+def linux_interfaces(conn, hostname=None):
     """
     Obtain interface information for *NIX/BSD variants in remote servers.
 
@@ -143,39 +285,32 @@ def linux_interfaces(conn):
                 'inet6': [{'address': '::1', 'prefixlen': '128'}],
                 'up': True}}
 
+    The remote side reads ``/sys/class/net`` and ``ip -json addr`` in a
+    single call, older hosts send back the output of ``ip addr show`` (or
+    ``ifconfig -a``) to be parsed here. When facts caching is enabled (see
+    :mod:`ceph_deploy.util.facts`) the result is kept with the host facts,
+    and later calls for the same host don't ask again.
+
     :param conn: A connection object to a remote node
+    :param hostname: The name the host facts are kept under, as given to
+                     :func:`ceph_deploy.hosts.get` (``conn.hostname`` is
+                     ``user@host`` when connecting with a username)
     """
-    ifaces = dict()
-    ip_path = conn.remote_module.which('ip')
-    ifconfig_path = None if ip_path else conn.remote_module.which('ifconfig')
-    if ip_path:
-        cmd1, _, _ = remoto.process.check(
-            conn,
-            [
-                '{0}'.format(ip_path),
-                'link',
-                'show',
-            ],
-        )
-        cmd2, _, _ = remoto.process.check(
-            conn,
-            [
-                '{0}'.format(ip_path),
-                'addr',
-                'show',
-            ],
-        )
-        ifaces = _interfaces_ip(b'\n'.join(cmd1).decode('utf-8') + '\n' +
-                                b'\n'.join(cmd2).decode('utf-8'))
-    elif ifconfig_path:
-        cmd, _, _ = remoto.process.check(
-            conn,
-            [
-                '{0}'.format(ifconfig_path),
-                '-a',
-            ]
-        )
-        ifaces = _interfaces_ifconfig('\n'.join(cmd))
+    hostname = hostname or conn.hostname
+    host_facts = facts.load(hostname)
+    if host_facts and 'interfaces' in host_facts:
+        return host_facts['interfaces']
+
+    kind, result = conn.remote_module.interfaces()
+    if kind == 'json':
+        ifaces = result
+    elif kind == 'ip':
+        ifaces = _interfaces_ip(result)
+    elif kind == 'ifconfig':
+        ifaces = _interfaces_ifconfig(result)
+    else:
+        ifaces = dict()
+    facts.update(hostname, interfaces=ifaces)
     return ifaces
 
 
@@ -1,5 +1,5 @@
 from ceph_deploy.exc import ExecutableNotFound
-from ceph_deploy.util import system, versions
+from ceph_deploy.util import constants, system, versions
 from ceph_deploy.lib import remoto
 
 
@@ -59,6 +59,52 @@ class Ceph(object):
         return versions.parse_version(self._get_version_output)
 
 
+def installed_versions(conn, packages, is_rpm, _check=None):
+    """
+    Ask for the installed version of every package in ``packages`` with a
+    single ``rpm -q`` (or ``dpkg-query`` for DEB hosts) call. Returns a
+    dictionary of package names and versions, packages that are not
+    installed are left out.
+    """
+    _check = _check or remoto.process.check
+    if is_rpm:
+        command = ['rpm', '-q', '--queryformat', '%{NAME} installed %{VERSION}-%{RELEASE}\\n']
+    else:
+        command = ['dpkg-query', '--show', '--showformat', '${Package} ${db:Status-Status} ${Version}\\n']
+    # missing packages make both of them exit non-zero, which is fine here
+    out, _, _ = _check(conn, command + list(packages))
+
+    installed = {}
+    for line in out:
+        if not isinstance(line, str):
+            line = line.decode('utf-8', 'replace')
+        parts = line.split()
+        # rpm reports missing packages as 'package foo is not installed'
+        if len(parts) == 3 and parts[1] == 'installed':
+            name, _, version = parts
+            # drop the epoch, like in 2:12.2.13-1xenial
+            installed[name] = version.split(':')[-1]
+    return installed
+
+
+def release_installed(conn, packages, release, is_rpm, _check=None):
+    """
+    Whether every package in ``packages`` is installed with a version from the
+    named ``release`` (like ``luminous``). Releases that are not known are
+    never considered installed.
+    """
+    major = constants.release_majors.get(release)
+    if major is None or not packages:
+        return False
+    installed = installed_versions(conn, packages, is_rpm, _check=_check)
+    for package in packages:
+        if package not in installed:
+            return False
+        if versions.NormalizedVersion(installed[package]).int_major != major:
+            return False
+    return True
+
+
 # callback helpers
 
 def ceph_is_installed(module):
@@ -0,0 +1,246 @@
+"""
+Run the same operation against many hosts at once.
+
+Most subcommands take a list of hosts and do the exact same work on each one
+of them. :func:`execute` takes that per-host work (a callable accepting one
+item, usually a hostname) and runs it with a bounded number of threads,
+counting failures the same way the serial loops always did.
+
+While hosts are being worked on concurrently, log records are grouped per
+host: everything a worker logs is held back until it is done with its host and
+then it is handed to the real logging handlers in one block, so that the
+output for one host is never interleaved with another one. Records logged with
+``extra={'live': True}`` (like the output of long running commands, see
+:mod:`ceph_deploy.util.stream`) skip the grouping and go out right away.
+"""
+import logging
+import sys
+import threading
+import time
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+LOG = logging.getLogger(__name__)
+
+
+def execute(func, items, jobs=1, logger=None, catch=RuntimeError, coroutine=None):
+    """
+    Call ``func(item)`` for every item in ``items`` using at most ``jobs``
+    threads. When ``coroutine`` is given, it is awaited for every item instead
+    on an ``asyncio`` event loop (see :mod:`ceph_deploy.aio`), with the same
+    handling of errors.
+
+    Exceptions matching ``catch`` are logged (with ``logger``) and counted,
+    and the number of failed items is returned, so that callers can report it
+    like they did before with their own ``exc.GenericError``. Any other
+    exception stops the scheduling of new items and is re-raised once the
+    items already in progress are done.
+
+    With a single job (the default) items are processed serially in the
+    calling thread, with no change in how logging behaves.
+
+    :param func: A callable accepting a single item
+    :param items: An iterable of items (e.g. hostnames)
+    :param jobs: Maximum number of items to process at the same time
+    :param logger: Optional logger to report caught errors, defaults to this
+                   module's logger
+    :param catch: Exception class (or tuple of classes) that count as a failure
+    :param coroutine: Optional coroutine function to use instead of ``func``
+    """
+    logger = logger or LOG
+    if coroutine is not None:
+        from ceph_deploy.aio import core
+        return core.execute(coroutine, items, jobs=jobs, logger=logger, catch=catch)
+    items = list(items)
+    jobs = max(1, min(int(jobs or 1), len(items)))
+
+    if jobs == 1:
+        errors = 0
+        for item in items:
+            try:
+                func(item)
+            except catch as e:
+                logger.error(e)
+                errors += 1
+        return errors
+
+    pending = queue.Queue()
+    for item in items:
+        pending.put(item)
+
+    lock = threading.Lock()
+    state = {'errors': 0, 'failure': None}
+    grouped = GroupedLogs()
+
+    def worker():
+        while state['failure'] is None:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            grouped.start()
+            try:
+                func(item)
+            except catch as e:
+                logger.error(e)
+                with lock:
+                    state['errors'] += 1
+            except Exception:
+                with lock:
+                    if state['failure'] is None:
+                        state['failure'] = sys.exc_info()[1]
+            finally:
+                grouped.finish()
+
+    with grouped:
+        workers = [threading.Thread(target=worker) for _ in range(jobs)]
+        for thread in workers:
+            thread.daemon = True
+            thread.start()
+        for thread in workers:
+            # join with a timeout so that a KeyboardInterrupt can still reach
+            # the main thread
+            while thread.is_alive():
+                thread.join(0.5)
+
+    if state['failure'] is not None:
+        raise state['failure']
+    return state['errors']
+
+
+def race(func, items, logger=None, catch=RuntimeError, grace=10):
+    """
+    Call ``func(item, cancelled)`` for every item in ``items`` at the same
+    time, and return the first item it returns something true for (``None``
+    if it does not for any of them) without waiting for the rest to finish.
+
+    ``cancelled`` is a ``threading.Event`` that gets set as soon as there is
+    a winner, ``func`` should check it and stop quietly once it is set. The
+    calls still running are then given up to ``grace`` seconds to do so
+    before returning, so that they are not left using what the caller is
+    about to clean up. Exceptions matching ``catch`` are logged and count as
+    a loss, any other is re-raised.
+    """
+    logger = logger or LOG
+    items = list(items)
+    cancelled = threading.Event()
+
+    if len(items) < 2:
+        for item in items:
+            try:
+                if func(item, cancelled):
+                    return item
+            except catch as e:
+                logger.error(e)
+        return None
+
+    finished = queue.Queue()
+    grouped = GroupedLogs()
+    threads = []
+
+    def worker(item):
+        grouped.start()
+        won, failure = False, None
+        try:
+            won = func(item, cancelled)
+        except catch as e:
+            logger.error(e)
+        except Exception:
+            failure = sys.exc_info()[1]
+        grouped.finish()
+        finished.put((item, won, failure))
+
+    with grouped:
+        try:
+            for item in items:
+                thread = threading.Thread(target=worker, args=(item,))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+            for _ in items:
+                while True:
+                    # a timeout so that a KeyboardInterrupt can still reach
+                    # the main thread
+                    try:
+                        item, won, failure = finished.get(timeout=0.5)
+                        break
+                    except queue.Empty:
+                        pass
+                if failure is not None:
+                    raise failure
+                if won:
+                    return item
+        finally:
+            cancelled.set()
+            deadline = time.time() + grace
+            for thread in threads:
+                thread.join(max(0, deadline - time.time()))
+            running = len([thread for thread in threads if thread.is_alive()])
+            if running:
+                logger.warning('%d calls did not stop within %s seconds', running, grace)
+    return None
+
+
+class GroupedLogs(logging.Handler):
+    """
+    A handler that stands in for every handler of the root logger while
+    workers are running. Records emitted from a thread that called
+    :meth:`start` are held back until the same thread calls :meth:`finish`,
+    at which point they are dispatched to the original handlers in one block.
+    Records from any other thread, or marked as ``live``, go through right
+    away. To keep memory bounded, a group that grows to ``max_records`` is
+    dispatched early.
+    """
+
+    def __init__(self, max_records=10000):
+        logging.Handler.__init__(self)
+        self.max_records = max_records
+        self.handlers = []
+        self.groups = {}
+        self.dispatch_lock = threading.Lock()
+
+    def __enter__(self):
+        root_logger = logging.getLogger()
+        self.handlers = root_logger.handlers[:]
+        for handler in self.handlers:
+            root_logger.removeHandler(handler)
+        root_logger.addHandler(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        root_logger = logging.getLogger()
+        root_logger.removeHandler(self)
+        for handler in self.handlers:
+            root_logger.addHandler(handler)
+        return False
+
+    def start(self):
+        self.groups[threading.current_thread().ident] = []
+
+    def finish(self):
+        records = self.groups.pop(threading.current_thread().ident, [])
+        self.flush_records(records)
+
+    def flush_records(self, records):
+        with self.dispatch_lock:
+            for record in records:
+                self.dispatch(record)
+
+    def dispatch(self, record):
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def emit(self, record):
+        group = self.groups.get(threading.current_thread().ident)
+        if group is None or getattr(record, 'live', False):
+            with self.dispatch_lock:
+                self.dispatch(record)
+        else:
+            group.append(record)
+            if len(group) >= self.max_records:
+                self.flush_records(group[:])
+                del group[:]
@@ -1,3 +1,4 @@
 from . import mon # noqa
 from . import osd # noqa
 from . import gpg # noqa
+from . import local # noqa
@@ -0,0 +1,73 @@
+"""
+Paths on the admin node (the one running ceph-deploy) where ceph-deploy keeps
+its own state, based on ``constants.local_path``.
+All functions return a string representation of the absolute path
+construction.
+"""
+from os.path import expanduser, join
+
+from ceph_deploy.util import constants
+
+
+def base():
+    """
+    Example usage::
+
+        >>> from ceph_deploy.util.paths import local
+        >>> local.base()
+        /home/user/.cephdeploy
+    """
+    return expanduser(constants.local_path)
+
+
+def ssh_control():
+    """
+    Directory for the OpenSSH ControlMaster sockets shared by connections to
+    the same host.
+
+    Example usage::
+
+        >>> from ceph_deploy.util.paths import local
+        >>> local.ssh_control()
+        /home/user/.cephdeploy/ssh
+    """
+    return join(base(), 'ssh')
+
+
+def facts(hostname):
+    """
+    The file where the facts gathered from ``hostname`` are cached.
+
+    Example usage::
+
+        >>> from ceph_deploy.util.paths import local
+        >>> local.facts('node1')
+        /home/user/.cephdeploy/facts/node1.json
+    """
+    return join(base(), 'facts', '%s.json' % hostname.replace('/', '_'))
+
+
+def inventory(hostname):
+    """
+    The file where the disk inventory of ``hostname`` is cached.
+
+    Example usage::
+
+        >>> from ceph_deploy.util.paths import local
+        >>> local.inventory('node1')
+        /home/user/.cephdeploy/inventory/node1.json
+    """
+    return join(base(), 'inventory', '%s.json' % hostname.replace('/', '_'))
+
+
+def cache():
+    """
+    Directory for the packages and keys downloaded by ``install --cache``.
+
+    Example usage::
+
+        >>> from ceph_deploy.util.paths import local
+        >>> local.cache()
+        /home/user/.cephdeploy/cache
+    """
+    return join(base(), 'cache')
@@ -5,7 +5,7 @@ except ImportError:
     from urlparse import urlparse
 
 from ceph_deploy.lib import remoto
-from ceph_deploy.util import templates
+from ceph_deploy.util import stream, templates
 
 
 class PackageManager(object):
@@ -13,12 +13,21 @@ class PackageManager(object):
     Base class for all Package Managers
     """
 
+    # flags that make ``install`` only download packages into the cache
+    download_flags = []
+
     def __init__(self, remote_conn):
         self.remote_info = remote_conn
         self.remote_conn = remote_conn.conn
+        # when set, installs only download packages (see ``install --prefetch``)
+        self.download_only = False
+        # planned transactions, as [sets up repos, packages] pairs
+        self.transactions = []
+        # packages installed through the planner so far
+        self.planned_installs = set()
 
     def _run(self, cmd, **kw):
-        return remoto.process.run(
+        return stream.run(
             self.remote_conn,
             cmd,
             **kw
@@ -32,9 +41,53 @@ class PackageManager(object):
         )
 
     def install(self, packages, **kw):
-        """Install packages on remote node"""
+        """
+        Install packages on remote node, or only download them when
+        ``download_only`` (which defaults to :attr:`download_only`) is set
+        """
         raise NotImplementedError()
 
+    def plan(self, packages, repo=False):
+        """
+        Queue ``packages`` to be installed by :meth:`commit`, in the same
+        transaction as the packages planned before them whenever possible.
+
+        ``repo`` marks packages that set up repositories (or change how they
+        are used, like ``yum-plugin-priorities``) which the packages planned
+        after them may need: those go in a transaction of their own, after
+        this one. Packages already installed through the planner are left
+        out.
+        """
+        if isinstance(packages, str):
+            packages = [packages]
+        planned = set(self.planned_installs)
+        for _, transaction_packages in self.transactions:
+            planned.update(transaction_packages)
+        new_packages = []
+        for package in packages:
+            if package not in planned:
+                planned.add(package)
+                new_packages.append(package)
+        if not new_packages:
+            return
+        if not self.transactions or (self.transactions[-1][0] and not repo):
+            self.transactions.append([repo, []])
+        transaction = self.transactions[-1]
+        transaction[0] = transaction[0] or repo
+        transaction[1].extend(new_packages)
+
+    def commit(self, **kw):
+        """
+        Install everything planned so far, in as few transactions as the
+        packages that set up repositories allow.
+        """
+        transactions, self.transactions = self.transactions, []
+        for repo, packages in transactions:
+            # packages that set up repositories are installed even when only
+            # downloading, the rest of them could not be found otherwise
+            self.install(packages, download_only=self.download_only and not repo, **kw)
+            self.planned_installs.update(packages)
+
     def remove(self, packages, **kw):
         """Uninstall packages on remote node"""
         raise NotImplementedError()
@@ -63,6 +116,7 @@ class RPMManagerBase(PackageManager):
 
     executable = None
     name = None
+    download_flags = ['--downloadonly']
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -79,6 +133,8 @@ class RPMManagerBase(PackageManager):
                 extra_flags = [extra_flags]
             cmd.extend(extra_flags)
 
+        if kw.pop('download_only', self.download_only):
+            cmd.extend(self.download_flags)
         cmd.extend(packages)
         return self._run(cmd)
 
@@ -110,6 +166,29 @@ class RPMManagerBase(PackageManager):
 
         return self._run(cmd)
 
+    def repo_digest(self, filename='ceph.repo'):
+        """
+        Digest of a file in ``/etc/yum.repos.d``, ``None`` if there is none.
+        Taken before and after writing a repo file, to tell whether its
+        metadata needs to be expired.
+        """
+        path = os.path.join('/etc/yum.repos.d', filename)
+        return self.remote_conn.remote_module.file_digest(path)
+
+    def expire(self, repos):
+        """
+        Drop the cached metadata of ``repos`` (repo ids, globs allowed) and
+        nothing else, so that only those are downloaded again
+        """
+        cmd = [
+            self.executable,
+            'clean',
+            'metadata',
+            '--disablerepo=*',
+            '--enablerepo=%s' % ','.join(repos),
+        ]
+        return self._run(cmd)
+
     def add_repo_gpg_key(self, url):
         cmd = ['rpm', '--import', url]
         self._run(cmd)
@@ -196,6 +275,7 @@ class Apt(PackageManager):
         '-q',
     ]
     name = 'apt'
+    download_flags = ['--download-only']
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -211,6 +291,8 @@ class Apt(PackageManager):
             if isinstance(extra_flags, str):
                 extra_flags = [extra_flags]
             cmd.extend(extra_flags)
+        if kw.pop('download_only', self.download_only):
+            cmd.extend(self.download_flags)
         cmd.extend(packages)
         return self._run(cmd)
 
@@ -288,6 +370,7 @@ class Zypper(PackageManager):
         '--quiet'
     ]
     name = 'zypper'
+    download_flags = ['--download-only']
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -299,6 +382,8 @@ class Zypper(PackageManager):
             if isinstance(extra_flags, str):
                 extra_flags = [extra_flags]
             cmd.extend(extra_flags)
+        if kw.pop('download_only', self.download_only):
+            cmd.extend(self.download_flags)
         cmd.extend(packages)
         return self._run(cmd)
 
@@ -337,6 +422,7 @@ class Pacman(PackageManager):
         '--noconfirm',
     ]
     name = 'pacman'
+    download_flags = ['--downloadonly']
 
     def install(self, packages, **kw):
         if isinstance(packages, str):
@@ -351,6 +437,8 @@ class Pacman(PackageManager):
             if isinstance(extra_flags, str):
                 extra_flags = [extra_flags]
             cmd.extend(extra_flags)
+        if kw.pop('download_only', self.download_only):
+            cmd.extend(self.download_flags)
         cmd.extend(packages)
         return self._run(cmd)
 
@@ -0,0 +1,210 @@
+"""
+Run commands on a remote host and get their output while they run, one line
+at a time.
+
+``remoto.process.check`` only returns once the command is done, with all of
+its output held in memory, and when hosts are worked on concurrently the
+output logged by ``remoto.process.run`` is held back until the host is done.
+:class:`Stream` instead yields every line as soon as it arrives, and never
+keeps more than a few lines in flight: the remote end stops reading from the
+command until this end has caught up.
+
+:func:`run` logs the lines right away through the connection's logger, which
+is named after the host, so every line carries the host as a prefix even when
+the output of many hosts is interleaved.
+"""
+
+# Lines sent from the remote end before it waits for this end to catch up
+WINDOW = 64
+
+# Longest line sent as-is, longer ones are split
+MAX_LINE_LENGTH = 8192
+
+# A timeout that waits for output for as long as the command runs, like -1
+# does for ``remoto.process.run``
+FOREVER = -1
+
+
+def _remote_stream(channel, cmd, window, max_line_length, **kw):
+    # this function is sent over the wire and runs on the remote host, it
+    # cannot use anything that is not defined or imported here
+    import os
+    import subprocess
+    from select import select
+
+    env = os.environ.copy()
+    env['PATH'] = env.get('PATH', '') + ':/usr/local/bin:/bin:/usr/bin:/usr/local/sbin:/usr/sbin:/sbin'
+    env.update(kw.pop('env', None) or {})
+
+    process = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        stdin=open(os.devnull),
+        close_fds=True,
+        env=env,
+        **kw
+    )
+    sources = {
+        process.stdout.fileno(): 'stdout',
+        process.stderr.fileno(): 'stderr',
+    }
+    pending = dict((fd, b'') for fd in sources)
+    sent = 0
+    done = False
+
+    try:
+        while sources:
+            reads, _, _ = select(list(sources), [], [])
+            for fd in reads:
+                source = sources[fd]
+                data = os.read(fd, 65536)
+                if data:
+                    lines = (pending[fd] + data).split(b'\n')
+                    pending[fd] = lines.pop()
+                    if len(pending[fd]) > max_line_length:
+                        lines.append(pending[fd])
+                        pending[fd] = b''
+                else:
+                    lines = [pending[fd]] if pending[fd] else []
+                    del sources[fd]
+                for line in lines:
+                    # split long lines, but still send empty ones
+                    for start in range(0, len(line) or 1, max_line_length):
+                        channel.send((source, line[start:start + max_line_length]))
+                        sent += 1
+                        if sent % window == 0:
+                            # wait for the other end to catch up before
+                            # reading any more
+                            channel.receive()
+        done = True
+    finally:
+        # the other end might be gone, don't leave the command behind
+        if not done and process.poll() is None:
+            process.kill()
+
+    channel.send(('exit', process.wait()))
+
+
+class Stream(object):
+    """
+    Iterate over the output of ``command`` on the host of ``conn`` while it
+    runs, as ``(source, line)`` tuples where ``source`` is either ``'stdout'``
+    or ``'stderr'``. Once the iteration is over, ``returncode`` holds the exit
+    status of the command (``-1`` if it timed out, in which case
+    ``timed_out`` is true too)::
+
+        command = stream.Stream(conn, ['ceph-volume', 'lvm', 'list'])
+        for source, line in command:
+            print(line)
+        command.returncode
+
+    :param timeout: Seconds to wait for a line before giving up, defaults to
+                    the connection's ``global_timeout``. :data:`FOREVER` waits
+                    for as long as the command runs
+    :param env: Environment variables to add to the remote environment
+    """
+
+    def __init__(self, conn, command, timeout=None, window=WINDOW, **kw):
+        self.conn = conn
+        self.command = command
+        self.timeout = timeout or getattr(conn, 'global_timeout', None)
+        if self.timeout == FOREVER:
+            self.timeout = None
+        self.window = window
+        self.kw = kw
+        self.returncode = None
+        self.timed_out = False
+
+    def __iter__(self):
+        channel = self.conn.execute(
+            _remote_stream,
+            cmd=self.command,
+            window=self.window,
+            max_line_length=MAX_LINE_LENGTH,
+            **self.kw
+        )
+        received = 0
+        exited = False
+        try:
+            while True:
+                try:
+                    source, line = channel.receive(self.timeout)
+                except Exception as error:
+                    # execnet errors can't be caught by class here
+                    if error.__class__.__name__ == 'TimeoutError':
+                        self.conn.logger.warning(
+                            'No data was received after %s seconds, disconnecting...' % self.timeout
+                        )
+                        self.returncode = -1
+                        self.timed_out = True
+                        return
+                    raise RuntimeError(_remote_error(error))
+                if source == 'exit':
+                    self.returncode = line
+                    exited = True
+                    return
+                received += 1
+                if received % self.window == 0:
+                    channel.send(None)
+                if not isinstance(line, str):
+                    line = line.decode('utf-8', 'replace')
+                yield source, line.rstrip('\r')
+        finally:
+            # stopped early or timed out, the command might still be running
+            if not exited:
+                channel.close()
+
+
+def _remote_error(error):
+    """
+    Remote errors come as a full traceback, keep the last line that has the
+    actual exception.
+    """
+    for line in reversed(str(error).split('\n')):
+        if line.strip():
+            return line.strip()
+    return str(error)
+
+
+def command_line(conn, command):
+    """
+    How ``command`` would look on the remote host, for logging.
+    """
+    if getattr(conn, 'sudo', False):
+        command = ['sudo'] + list(command)
+    return ' '.join(command)
+
+
+def run(conn, command, timeout=None, stop_on_nonzero=True, **kw):
+    """
+    Run ``command`` on the host of ``conn`` logging its output as it comes,
+    stdout at debug level and stderr as warnings, like
+    ``remoto.process.run``. The lines are logged right away even when hosts
+    are being worked on concurrently.
+
+    Raises ``RuntimeError`` if the command fails, unless ``stop_on_nonzero``
+    is false. Returns the exit status of the command. Like
+    ``remoto.process.run``, a command that sends no output for ``timeout``
+    seconds is only warned about (and ``-1`` returned), pass :data:`FOREVER`
+    for commands that can be quiet for long.
+    """
+    logger = conn.logger
+    logger.info('Running command: %s' % command_line(conn, command))
+    live = {'live': True}
+    command_stream = Stream(conn, command, timeout=timeout, **kw)
+    for source, line in command_stream:
+        if source == 'stdout':
+            logger.debug(line, extra=live)
+        else:
+            logger.warning(line, extra=live)
+
+    returncode = command_stream.returncode
+    if command_stream.timed_out:
+        return returncode
+    if returncode != 0:
+        if stop_on_nonzero:
+            logger.error('command returned non-zero exit status: %s' % returncode)
+            raise RuntimeError('Failed to execute command: %s' % ' '.join(command))
+        logger.warning('command returned non-zero exit status: %s' % returncode)
+    return returncode
@@ -0,0 +1,255 @@
+"""
+Keep track of the time spent talking to remote hosts: opening connections,
+calling functions of remote modules and running commands.
+
+Every call is recorded for its host with how long it took and roughly how
+many bytes it sent and received. The totals per host and call are logged
+with :func:`report` at the end of a run, and with :func:`start` every single
+call is kept as well so that they can be written by :func:`write` as a trace
+in the Chrome trace format (the one ``chrome://tracing`` and Perfetto load).
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+LOG = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+# (host, name) -> [count, seconds, longest, bytes sent, bytes received]
+_totals = {}
+
+# every call, only kept when a trace was asked for
+_events = None
+
+# when the run started, traces count from here
+_started = time.time()
+
+
+def start(keep_events=False):
+    """
+    Forget everything recorded so far. With ``keep_events`` every call is
+    kept for :func:`write`, not only the totals.
+    """
+    global _events, _started
+    with _lock:
+        _totals.clear()
+        _events = [] if keep_events else None
+        _started = time.time()
+
+
+def record(host, category, name, started, sent=0, received=0, **details):
+    """
+    Record a call to ``host`` that started at ``started`` and is done now.
+    ``details`` only make it to the trace.
+    """
+    now = time.time()
+    elapsed = now - started
+    with _lock:
+        totals = _totals.setdefault((host, name), [0, 0.0, 0.0, 0, 0])
+        totals[0] += 1
+        totals[1] += elapsed
+        totals[2] = max(totals[2], elapsed)
+        totals[3] += sent
+        totals[4] += received
+        if _events is not None:
+            details.update(sent=sent, received=received)
+            _events.append({
+                'host': host,
+                'category': category,
+                'name': name,
+                'started': started,
+                'elapsed': elapsed,
+                'thread': threading.current_thread().name,
+                'details': details,
+            })
+
+
+def command_name(command, words=2):
+    """
+    A short name for a command, like ``ceph auth get`` for
+    ``['/usr/bin/ceph', '--cluster=ceph', 'auth', 'get', 'client.admin']``,
+    so that calls of the same kind add up together. Options, paths and
+    assignments are left out.
+    """
+    if not command:
+        return ''
+    name = [os.path.basename(str(command[0]))]
+    for argument in command[1:]:
+        if len(name) > words:
+            break
+        argument = str(argument)
+        if not argument.startswith('-') and '/' not in argument and '=' not in argument:
+            name.append(argument)
+    return ' '.join(name)
+
+
+def summary():
+    """
+    The totals for every host and call, busiest first, as dictionaries.
+    """
+    with _lock:
+        items = list(_totals.items())
+    rows = [
+        {
+            'host': host,
+            'name': name,
+            'count': count,
+            'seconds': seconds,
+            'longest': longest,
+            'sent': sent,
+            'received': received,
+        }
+        for (host, name), (count, seconds, longest, sent, received) in items
+    ]
+    rows.sort(key=lambda row: (-row['seconds'], row['host'], row['name']))
+    return rows
+
+
+def report(logger=None, level=logging.DEBUG):
+    """
+    Log the totals for every host and call as a table.
+    """
+    logger = logger or LOG
+    rows = summary()
+    if not rows:
+        return
+    line = '%-20s %-32.32s %6s %9s %9s %10s %10s'
+    logger.log(level, 'time spent on remote calls:')
+    logger.log(level, line % ('host', 'call', 'count', 'total (s)', 'max (s)', 'sent', 'received'))
+    for row in rows:
+        logger.log(level, line % (
+            row['host'],
+            row['name'],
+            row['count'],
+            '%.3f' % row['seconds'],
+            '%.3f' % row['longest'],
+            row['sent'],
+            row['received'],
+        ))
+
+
+def write(path):
+    """
+    Write every call recorded since :func:`start` to ``path`` in the Chrome
+    trace format, with a row per host.
+    """
+    with _lock:
+        events = list(_events or [])
+        started = _started
+
+    hosts = {}
+    trace = []
+    for event in events:
+        if event['host'] not in hosts:
+            hosts[event['host']] = len(hosts) + 1
+            trace.append({
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': 1,
+                'tid': hosts[event['host']],
+                'args': {'name': event['host']},
+            })
+        details = dict(event['details'], thread=event['thread'])
+        trace.append({
+            'name': event['name'],
+            'cat': event['category'],
+            'ph': 'X',
+            'pid': 1,
+            'tid': hosts[event['host']],
+            'ts': int((event['started'] - started) * 1000000),
+            'dur': int(event['elapsed'] * 1000000),
+            'args': details,
+        })
+
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+    LOG.info('wrote a trace of %d remote calls to %s', len(events), path)
+
+
+class TracedModule(object):
+    """
+    Wraps a remote module so that every call to its functions is recorded.
+    Anything else, like setting its ``logger``, goes to the wrapped module.
+    """
+
+    def __init__(self, module, host):
+        self.__dict__['_module'] = module
+        self.__dict__['_host'] = host
+
+    def __getattr__(self, name):
+        function = getattr(self._module, name)
+        if not callable(function) or name.startswith('_'):
+            return function
+        host = self._host
+
+        def traced(*args):
+            started = time.time()
+            result = None
+            try:
+                result = function(*args)
+                return result
+            finally:
+                record(
+                    host, 'remote_module', name, started,
+                    sent=len(name) + len(repr(args)),
+                    received=len(repr(result)),
+                )
+        return traced
+
+    def __setattr__(self, name, value):
+        setattr(self._module, name, value)
+
+
+class TracedChannel(object):
+    """
+    Wraps the channel of a command running remotely and records it once it
+    is done: when the other end is gone, the channel is closed, or its last
+    reply was received.
+    """
+
+    def __init__(self, channel, host, category, command, last_reply):
+        self.channel = channel
+        self.host = host
+        self.category = category
+        self.command = command
+        self.last_reply = last_reply
+        self.started = time.time()
+        self.sent = len(repr(command))
+        self.received = 0
+        self.done = False
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    def send(self, item):
+        self.sent += len(repr(item))
+        return self.channel.send(item)
+
+    def receive(self, *args, **kw):
+        try:
+            item = self.channel.receive(*args, **kw)
+        except Exception:
+            self.finish()
+            raise
+        self.received += len(repr(item))
+        if self.last_reply(item):
+            self.finish()
+        return item
+
+    def close(self, *args, **kw):
+        self.finish()
+        return self.channel.close(*args, **kw)
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+        record(
+            self.host, self.category, command_name(self.command), self.started,
+            sent=self.sent,
+            received=self.received,
+            command=' '.join(str(part) for part in self.command),
+        )
@@ -15,6 +15,11 @@ pyversion = sys.version_info[:2]
 if pyversion < (2, 7) or (3, 0) <= pyversion <= (3, 1):
     install_requires.append('argparse')
 
+# the asyncio modules (for --asyncio) use syntax older Pythons can't compile
+exclude_packages = []
+if pyversion < (3, 5):
+    exclude_packages.append('ceph_deploy.aio')
+
 #
 # Add libraries that are not part of install_requires but only if we really
 # want to, specified by the environment flag
@@ -31,7 +36,7 @@ else:
 setup(
     name='ceph-deploy',
     version=ceph_deploy.__version__,
-    packages=find_packages(),
+    packages=find_packages(exclude=exclude_packages),
 
     author='Inktank',
     author_email='ceph-devel@vger.kernel.org',